@@ -0,0 +1,277 @@
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple, Union
+
+# annotations whose first argument is a predicate, e.g. @bind("p", ...)
+PREDICATE_ANNOTATIONS = ("input", "output", "bind", "mapping")
+
+
+@dataclass(frozen=True)
+class Variable:
+    """A variable, e.g. X; each anonymous variable _ gets a unique name."""
+
+    name: str
+    is_anonymous: bool = False
+
+    def __str__(self) -> str:
+        return "_" if self.is_anonymous else self.name
+
+
+@dataclass(frozen=True)
+class Constant:
+    """A constant: strings are quoted, numbers and identifiers are not."""
+
+    value: str
+    is_string: bool = False
+
+    def __str__(self) -> str:
+        if not self.is_string:
+            return self.value
+        escaped = self.value.replace("\\", "\\\\").replace('"', '\\"')
+        return f'"{escaped}"'
+
+
+Term = Union[Variable, Constant]
+
+
+@dataclass(frozen=True)
+class Atom:
+    """An atom, e.g. p(X, "a")."""
+
+    predicate: str
+    terms: Tuple[Term, ...]
+
+    @property
+    def arity(self) -> int:
+        return len(self.terms)
+
+    @property
+    def variables(self) -> Tuple[Variable, ...]:
+        """Get the variables of the atom, in order of first occurrence."""
+        # keyed by name, which is faster to hash than the variable
+        by_name = {term.name: term for term in self.terms if isinstance(term, Variable)}
+        return tuple(by_name.values())
+
+    def __str__(self) -> str:
+        return f"{self.predicate}({','.join(map(str, self.terms))})"
+
+
+@dataclass(frozen=True)
+class Condition:
+    """
+    A body literal other than an atom, e.g. X > 3 or Z = (Y+1)*2, kept as
+    written: it is only re-emitted, and its variables are used by the analyses.
+    """
+
+    text: str
+    variables: Tuple[Variable, ...] = ()
+
+    def __str__(self) -> str:
+        return self.text
+
+
+@dataclass(frozen=True)
+class Rule:
+    """
+    A rule head :- body.
+
+    Head variables that do not occur in the body are existentially
+    quantified, as in Vadalog; the conditions of the body are emitted after
+    its atoms.
+    """
+
+    head: Atom
+    body: Tuple[Atom, ...]
+    conditions: Tuple[Condition, ...] = ()
+
+    @property
+    def body_variables(self) -> FrozenSet[Variable]:
+        return frozenset(
+            var
+            for literal in (*self.body, *self.conditions)
+            for var in literal.variables
+        )
+
+    @property
+    def existential_variables(self) -> Tuple[Variable, ...]:
+        """Get the existentially quantified variables, in order of occurrence."""
+        body_names = {
+            term.name
+            for atom in self.body
+            for term in atom.terms
+            if isinstance(term, Variable)
+        }
+        # e.g. the variables assigned by Z = Y+1
+        body_names.update(
+            var.name for condition in self.conditions for var in condition.variables
+        )
+        return tuple(var for var in self.head.variables if var.name not in body_names)
+
+    def __str__(self) -> str:
+        literals = ", ".join(map(str, (*self.body, *self.conditions)))
+        return f"{self.head} :- {literals}."
+
+
+@dataclass(frozen=True)
+class Annotation:
+    """An annotation, e.g. @output("q")."""
+
+    name: str
+    arguments: Tuple[Constant, ...]
+
+    def __str__(self) -> str:
+        return f"@{self.name}({','.join(map(str, self.arguments))})."
+
+
+@dataclass(frozen=True)
+class Query:
+    """
+    A query of DLV^E, e.g. #exists{X1}q(X0,X1)?.
+
+    The existential variables are projected out of the answers.
+    """
+
+    atom: Atom
+    existential_variables: Tuple[Variable, ...] = ()
+
+    def __str__(self) -> str:
+        prefix = ""
+        if self.existential_variables:
+            prefix = f"#exists{{{','.join(map(str, self.existential_variables))}}}"
+        return f"{prefix}{self.atom}?"
+
+
+@dataclass
+class Program:
+    """A Datalog program with existential rules."""
+
+    rules: List[Rule] = field(default_factory=list)
+    facts: List[Atom] = field(default_factory=list)
+    annotations: List[Annotation] = field(default_factory=list)
+    queries: List[Query] = field(default_factory=list)
+
+    @property
+    def outputs(self) -> List[str]:
+        """Get the output predicates, declared with @output or queried."""
+        outputs = [
+            annotation.arguments[0].value
+            for annotation in self.annotations
+            if annotation.name == "output"
+        ]
+        outputs += [query.atom.predicate for query in self.queries]
+        return list(dict.fromkeys(outputs))
+
+    @property
+    def idb_predicates(self) -> FrozenSet[str]:
+        """Get the predicates defined by rules."""
+        return frozenset(rule.head.predicate for rule in self.rules)
+
+    @property
+    def predicates(self) -> FrozenSet[str]:
+        """Get the predicates occurring in the facts, rules and queries."""
+        predicates = {fact.predicate for fact in self.facts}
+        for rule in self.rules:
+            predicates.add(rule.head.predicate)
+            predicates.update(atom.predicate for atom in rule.body)
+        predicates.update(query.atom.predicate for query in self.queries)
+        return frozenset(predicates)
+
+    def get_relevant_predicates(
+        self, outputs: Optional[Sequence[str]] = None
+    ) -> FrozenSet[str]:
+        """
+        Get the predicates the outputs depend on, through the rules.
+
+        :param outputs: the output predicates; by default, the program ones.
+        :return: the outputs and the predicates they depend on.
+        """
+        rules_by_head: Dict[str, List[Rule]] = {}
+        for rule in self.rules:
+            rules_by_head.setdefault(rule.head.predicate, []).append(rule)
+        relevant = set()
+        pending = list(self.outputs if outputs is None else outputs)
+        while pending:
+            predicate = pending.pop()
+            if predicate in relevant:
+                continue
+            relevant.add(predicate)
+            for rule in rules_by_head.get(predicate, []):
+                pending.extend(atom.predicate for atom in rule.body)
+        return frozenset(relevant)
+
+    def slice(self) -> "Program":
+        """
+        Get the program restricted to what its outputs depend on.
+
+        The rules and facts of the other predicates cannot change the answers,
+        so they are left out, with the annotations about them (e.g. @bind); a
+        program without outputs is kept whole.
+
+        :return: the sliced program.
+        """
+        if not self.outputs:
+            return self
+        relevant = self.get_relevant_predicates()
+
+        def is_relevant_annotation(annotation: Annotation) -> bool:
+            if annotation.name not in PREDICATE_ANNOTATIONS:
+                return True
+            return bool(annotation.arguments) and (
+                annotation.arguments[0].value in relevant
+            )
+
+        return Program(
+            rules=[rule for rule in self.rules if rule.head.predicate in relevant],
+            facts=[fact for fact in self.facts if fact.predicate in relevant],
+            annotations=list(filter(is_relevant_annotation, self.annotations)),
+            queries=list(self.queries),
+        )
+
+    def get_existential_positions(self, predicate: str) -> Tuple[int, ...]:
+        """
+        Get the positions of a predicate where some rule invents a labelled null.
+
+        :param predicate: the predicate.
+        :return: the sorted positions.
+        """
+        positions = set()
+        for rule in self.rules:
+            if rule.head.predicate != predicate:
+                continue
+            existentials = set(rule.existential_variables)
+            for position, term in enumerate(rule.head.terms):
+                if term in existentials:
+                    positions.add(position)
+        return tuple(sorted(positions))
+
+    def get_arity(self, predicate: str) -> Optional[int]:
+        """Get the arity of a predicate, from its first occurrence in the program."""
+        atoms = [*self.facts]
+        for rule in self.rules:
+            atoms += [rule.head, *rule.body]
+        return next((atom.arity for atom in atoms if atom.predicate == predicate), None)
+
+    def get_answer_positions(self, predicate: str) -> Tuple[int, ...]:
+        """
+        Get the positions of the certain answers of an output predicate.
+
+        The positions where a rule may invent a labelled null are projected
+        out, as in the queries #exists{...}p(...)? of DLV^E.
+
+        :param predicate: the output predicate.
+        :return: the sorted positions.
+        """
+        existential_positions = set(self.get_existential_positions(predicate))
+        return tuple(
+            position
+            for position in range(self.get_arity(predicate) or 0)
+            if position not in existential_positions
+        )
+
+    def __str__(self) -> str:
+        statements = [
+            *(f"{fact}." for fact in self.facts),
+            *map(str, self.rules),
+            *map(str, self.annotations),
+            *map(str, self.queries),
+        ]
+        return "\n".join(statements)
@@ -0,0 +1,99 @@
+from typing import Iterable, List
+
+from benchmark.datalog.ast import (
+    Annotation,
+    Atom,
+    Constant,
+    Program,
+    Query,
+    Rule,
+    Variable,
+)
+
+# annotations binding the input predicates to data sources, set by each run
+SOURCE_ANNOTATIONS = ("bind", "mapping", "input")
+
+
+def _emit_fact(fact: Atom) -> str:
+    return f"{fact}."
+
+
+def to_vadalog(
+    program: Program, drop_annotations: Iterable[str] = SOURCE_ANNOTATIONS
+) -> str:
+    """
+    Emit a program in Vadalog syntax.
+
+    Existential variables are implicit, and the queries become @output
+    annotations.
+
+    :param program: the program.
+    :param drop_annotations: the names of the annotations to leave out.
+    :return: the program text, one statement per line.
+    """
+    drop_annotations = set(drop_annotations)
+    annotations = [
+        annotation
+        for annotation in program.annotations
+        if annotation.name not in drop_annotations
+    ]
+    outputs = {
+        annotation.arguments[0].value
+        for annotation in annotations
+        if annotation.name == "output"
+    }
+    for query in program.queries:
+        if query.atom.predicate not in outputs:
+            outputs.add(query.atom.predicate)
+            output = Constant(query.atom.predicate, is_string=True)
+            annotations.append(Annotation("output", (output,)))
+    lines = [
+        *map(_emit_fact, program.facts),
+        *map(str, program.rules),
+        *map(str, annotations),
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def _emit_dlv_rule(rule: Rule) -> str:
+    existentials = rule.existential_variables
+    if not existentials:
+        return str(rule)
+    if any(variable.is_anonymous for variable in existentials):
+        raise ValueError(f"anonymous existential variables are not supported: {rule}")
+    names = sorted(variable.name for variable in existentials)
+    return f"#exists{{{','.join(names)}}}{rule}"
+
+
+def to_dlv(program: Program) -> str:
+    """
+    Emit a program in DLV^E syntax.
+
+    Existential variables are declared with #exists, and the output predicate
+    becomes the query, e.g. #exists{X1}q(X0,X1)?, where the positions at which
+    a rule may invent a labelled null are existentially quantified.
+
+    :param program: the program; annotations are left out.
+    :return: the program text, one statement per line.
+    :raises ValueError: if the program has more than one output predicate,
+      since DLV^E answers a single query, or if a rule has anonymous
+      existential variables, which cannot be declared.
+    """
+    lines: List[str] = [
+        *map(_emit_fact, program.facts),
+        *map(_emit_dlv_rule, program.rules),
+    ]
+    outputs = program.outputs
+    if len(outputs) > 1:
+        raise ValueError(f"DLV^E supports a single query, got outputs {outputs}")
+    if program.queries:
+        lines.append(str(program.queries[0]))
+    elif outputs:
+        predicate = outputs[0]
+        arity = program.get_arity(predicate) or 0
+        existential_positions = program.get_existential_positions(predicate)
+        variables = tuple(Variable(f"X{i}") for i in range(arity))
+        existentials = tuple(variables[i] for i in existential_positions)
+        query = Query(Atom(predicate, variables), existentials)
+        lines.append(str(query))
+    return "\n".join(lines)
@@ -0,0 +1,210 @@
+from collections import defaultdict
+from typing import Dict, FrozenSet, List, Set, Tuple
+
+from benchmark.datalog.ast import Atom, Constant, Program, Rule, Variable
+
+BOUND = "b"
+FREE = "f"
+MAGIC_PREFIX = "magic_"
+
+
+def _adorned_name(predicate: str, adornment: str) -> str:
+    # the predicates used without binding keep their name, e.g. the outputs
+    if BOUND not in adornment:
+        return predicate
+    return f"{predicate}_{adornment}"
+
+
+def _magic_atom(predicate: str, adornment: str, terms: Tuple) -> Atom:
+    bound_terms = tuple(
+        term for term, binding in zip(terms, adornment) if binding == BOUND
+    )
+    return Atom(MAGIC_PREFIX + _adorned_name(predicate, adornment), bound_terms)
+
+
+def _get_null_positions(program: Program) -> Dict[str, FrozenSet[int]]:
+    """
+    Get the positions of each predicate that may hold a labelled null: the
+    ones where a rule invents it, and the ones it is copied to, up to a
+    fixpoint.
+    """
+    null_positions: Dict[str, Set[int]] = defaultdict(set)
+    for predicate in program.idb_predicates:
+        null_positions[predicate].update(program.get_existential_positions(predicate))
+    changed = True
+    while changed:
+        changed = False
+        for rule in program.rules:
+            null_variables = {
+                term
+                for atom in rule.body
+                for position, term in enumerate(atom.terms)
+                if position in null_positions[atom.predicate]
+            }
+            # e.g. Z = X copies a null
+            for condition in rule.conditions:
+                if not null_variables.isdisjoint(condition.variables):
+                    null_variables.update(condition.variables)
+            head_positions = null_positions[rule.head.predicate]
+            for position, term in enumerate(rule.head.terms):
+                if position not in head_positions and term in null_variables:
+                    head_positions.add(position)
+                    changed = True
+    return {
+        predicate: frozenset(positions)
+        for predicate, positions in null_positions.items()
+    }
+
+
+def _joins_nulls(rule: Rule, null_positions: Dict[str, FrozenSet[int]]) -> bool:
+    """
+    Check whether a variable of a rule may hold a null in two body atoms, or
+    in a body atom and a condition.
+    """
+    atoms_by_variable: Dict[Variable, int] = defaultdict(int)
+    for atom in rule.body:
+        positions = null_positions.get(atom.predicate, frozenset())
+        for variable in {
+            term for position, term in enumerate(atom.terms) if position in positions
+        }:
+            atoms_by_variable[variable] += 1
+    for condition in rule.conditions:
+        for variable in condition.variables:
+            if variable in atoms_by_variable:
+                atoms_by_variable[variable] += 1
+    return any(count > 1 for count in atoms_by_variable.values())
+
+
+def _get_unbound_positions(program: Program) -> Dict[str, Set[int]]:
+    """
+    Get the positions of each predicate where a rule head has a variable
+    held by no body atom, i.e. invented or assigned by a condition, e.g.
+    Z = Y+1: the values cannot be looked up from a binding.
+    """
+    unbound_positions: Dict[str, Set[int]] = defaultdict(set)
+    for rule in program.rules:
+        body_variables = {var for atom in rule.body for var in atom.variables}
+        for position, term in enumerate(rule.head.terms):
+            if isinstance(term, Variable) and term not in body_variables:
+                unbound_positions[rule.head.predicate].add(position)
+    return unbound_positions
+
+
+def _adorn(
+    atom: Atom, bound_variables: Set[Variable], free_positions: FrozenSet[int]
+) -> str:
+    """
+    Get the binding pattern of an atom: a position is bound if it holds a
+    constant or a variable bound before. The positions that may hold a
+    labelled null or a value computed by a condition are never bound, since
+    such values cannot be looked up.
+    """
+    return "".join(
+        BOUND
+        if position not in free_positions
+        and (isinstance(term, Constant) or term in bound_variables)
+        else FREE
+        for position, term in enumerate(atom.terms)
+    )
+
+
+def magic_sets(program: Program) -> Program:
+    """
+    Rewrite a program with magic sets, so that the constants of the rules are
+    pushed down into the derivations of the predicates they select.
+
+    Each predicate defined by rules is specialized for each binding pattern
+    it is used with, e.g. targethospital_ffbff when its third position is
+    bound, from the outputs down, and information is passed sideways from
+    left to right in the bodies, through the atoms joined with the values
+    bound so far or holding constants. The rules of a specialized predicate
+    are guarded by a magic predicate holding the bound values, e.g.
+    magic_targethospital_ffbff("HH65795"), derived from the rules using it;
+    only the facts matching a binding are derived. Predicates used without
+    any binding, e.g. the outputs, keep their name.
+
+    Each specialized copy of a rule invents its own nulls, so the programs
+    joining two atoms on a value that may be a null are left as they are.
+
+    :param program: the program; the predicates with facts in it are left as
+      they are.
+    :return: the rewritten program, or the program itself if no binding is
+      ever passed, e.g. without constants, or if it joins nulls.
+    """
+    null_positions = _get_null_positions(program)
+    if any(_joins_nulls(rule, null_positions) for rule in program.rules):
+        return program
+    unbound_positions = _get_unbound_positions(program)
+    free_positions = {
+        predicate: positions | unbound_positions[predicate]
+        for predicate, positions in null_positions.items()
+    }
+    fact_predicates = {fact.predicate for fact in program.facts}
+    rules_by_head: Dict[str, List[Rule]] = {}
+    for rule in program.rules:
+        if rule.head.predicate not in fact_predicates:
+            rules_by_head.setdefault(rule.head.predicate, []).append(rule)
+
+    rules: List[Rule] = []
+    magic_facts: List[Atom] = []
+    pending = [
+        (output, FREE * (program.get_arity(output) or 0))
+        for output in program.outputs
+        if output in rules_by_head
+    ]
+    done: Set[Tuple[str, str]] = set()
+    while pending:
+        predicate, adornment = pending.pop()
+        if (predicate, adornment) in done:
+            continue
+        done.add((predicate, adornment))
+        for rule in rules_by_head[predicate]:
+            body: List[Atom] = []
+            # the atoms passing their bindings, i.e. the body of the magic rules
+            sips: List[Atom] = []
+            bound_variables = {
+                term
+                for term, binding in zip(rule.head.terms, adornment)
+                if binding == BOUND and isinstance(term, Variable)
+            }
+            if BOUND in adornment:
+                sips.append(_magic_atom(predicate, adornment, rule.head.terms))
+                body.append(sips[-1])
+            for atom in rule.body:
+                if atom.predicate in rules_by_head:
+                    atom_adornment = _adorn(
+                        atom, bound_variables, free_positions[atom.predicate]
+                    )
+                    if BOUND in atom_adornment:
+                        magic = _magic_atom(atom.predicate, atom_adornment, atom.terms)
+                        if sips:
+                            rules.append(Rule(magic, tuple(sips)))
+                        else:
+                            # only constants are bound
+                            magic_facts.append(magic)
+                    pending.append((atom.predicate, atom_adornment))
+                    atom = Atom(
+                        _adorned_name(atom.predicate, atom_adornment), atom.terms
+                    )
+                body.append(atom)
+                # an atom joined with none of the bound variables would only
+                # pass their cross product with its own
+                if (
+                    not sips
+                    or not bound_variables.isdisjoint(atom.variables)
+                    or any(isinstance(term, Constant) for term in atom.terms)
+                ):
+                    sips.append(atom)
+                    bound_variables.update(atom.variables)
+            head = Atom(_adorned_name(predicate, adornment), rule.head.terms)
+            rules.append(Rule(head, tuple(body), rule.conditions))
+
+    if not any(BOUND in adornment for _, adornment in done):
+        return program
+    # the rules of the predicates the outputs do not depend on are left out
+    return Program(
+        rules=rules,
+        facts=[*program.facts, *dict.fromkeys(magic_facts)],
+        annotations=list(program.annotations),
+        queries=list(program.queries),
+    )
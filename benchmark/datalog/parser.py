@@ -0,0 +1,337 @@
+import re
+from typing import Dict, List, Optional, Tuple, Union
+
+from benchmark.datalog.ast import (
+    Annotation,
+    Atom,
+    Condition,
+    Constant,
+    Program,
+    Query,
+    Rule,
+    Term,
+    Variable,
+)
+
+
+class ParseError(ValueError):
+    """The program is not well formed."""
+
+
+_STRING = r'"(?:[^"\\]|\\.)*"'
+_IDENT = r"[A-Za-z_][A-Za-z0-9_]*"
+
+# the statements are split in one pass over the characters that delimit
+# them; strings and comments are skipped whole, so that their parentheses,
+# commas and dots are ignored, and a dot ends a statement only outside
+# parentheses and numbers. No pattern nests quantifiers, so that a malformed
+# statement fails in linear time: the arguments of an atom are scanned up to
+# the next parenthesis at most.
+_TOKEN_REGEX = re.compile(
+    rf"""
+    (?P<atom>(?<!\w){_IDENT}\s*\((?:[^()"%]|{_STRING})*\))
+    |(?P<string>{_STRING})
+    |(?P<comment>%[^\n]*)
+    |(?P<open>[(\[{{])
+    |(?P<close>[)\]}}])
+    |(?P<comma>,)
+    |(?P<implies>:-)
+    |(?P<end>\.(?![0-9])|\?)
+    |(?P<quote>")
+    """,
+    re.VERBOSE,
+)
+# inside parentheses, only their nesting matters
+_NESTED_TOKEN_REGEX = re.compile(
+    rf"""
+    (?P<string>{_STRING})
+    |(?P<comment>%[^\n]*)
+    |(?P<open>[(\[{{])
+    |(?P<close>[)\]}}])
+    |(?P<quote>")
+    """,
+    re.VERBOSE,
+)
+_ANNOTATION_REGEX = re.compile(rf"@\s*({_IDENT})\s*(?:\((.*)\))?", re.DOTALL)
+_HEAD_REGEX = re.compile(
+    rf"(?:\#\s*exists\s*\{{([^{{}}]*)\}}\s*)?({_IDENT})\s*\((.*)\)", re.DOTALL
+)
+_ATOM_REGEX = re.compile(rf"({_IDENT})\s*\((.*)\)", re.DOTALL)
+_NEGATION_REGEX = re.compile(r"not\s")
+_CONDITION_VARIABLE_REGEX = re.compile(rf"{_STRING}|\b([A-Z_][A-Za-z0-9_]*)")
+_COMMENT_REGEX = re.compile(rf"({_STRING})|%[^\n]*")
+_SPACE_REGEX = re.compile(r"(?:\s|%[^\n]*)*")
+_TERM_REGEX = re.compile(rf"\s*(?:({_STRING})|([^\s,\"]+))\s*(,|$)")
+_NUMBER_REGEX = re.compile(r"-?[0-9]+(?:\.[0-9]+)?$")
+_IDENT_REGEX = re.compile(_IDENT + "$")
+_ANONYMOUS_REGEX = re.compile(r"(?:^|,)\s*_\s*(?:,|$)")
+
+
+def _strip_comments(text: str) -> str:
+    if "%" in text:
+        text = _COMMENT_REGEX.sub(lambda match: match.group(1) or "", text)
+    return text.strip()
+
+
+def _is_balanced(text: str) -> bool:
+    """Check that the parentheses of a text are balanced, outside strings."""
+    if "(" not in text and ")" not in text:
+        return True
+    depth = 0
+    for match in _TOKEN_REGEX.finditer(text):
+        kind = match.lastgroup
+        if kind == "open":
+            depth += 1
+        elif kind == "close":
+            depth -= 1
+            if depth < 0:
+                return False
+    return depth == 0
+
+
+class Parser:
+    """
+    A one-pass parser for programs in Vadalog or DLV^E syntax.
+
+    Statements are facts p(a,b)., rules p(X) :- q(X,Y)., annotations
+    @output("p"). and queries q(X)?. Rules and queries may declare their
+    existential variables, as in DLV^E: #exists{Z}p(X,Z) :- q(X). Identifiers
+    starting with an uppercase letter or an underscore are variables; the
+    anonymous variable _ gets a fresh name at each occurrence. The body
+    literals that are not atoms, e.g. X > 3 or Z = (Y+1)*2, are kept as
+    conditions.
+
+    The terms of each distinct atom text are parsed once, since the same
+    atoms tend to occur in many rules; atoms are immutable, so they are shared.
+    """
+
+    def __init__(self, text: str) -> None:
+        self._text = text
+        self._nb_anonymous = 0
+        self._terms_cache: Dict[str, Tuple[Term, ...]] = {}
+        self._atom_cache: Dict[Tuple[str, str], Atom] = {}
+
+    def parse(self) -> Program:
+        program = Program()
+        text = self._text
+        start = 0
+        depth = 0
+        # the position of the outermost open parenthesis, for the errors
+        open_position = 0
+        # the positions of the :- and of the commas separating body literals
+        implies: Optional[int] = None
+        commas: List[int] = []
+        search = _TOKEN_REGEX.search
+        nested_search = _NESTED_TOKEN_REGEX.search
+        position = 0
+        while True:
+            match = (nested_search if depth else search)(text, position)
+            if match is None:
+                break
+            position = match.end()
+            kind = match.lastgroup
+            if kind == "atom" or kind == "string" or kind == "comment":
+                # the atoms without nested parentheses are skipped whole
+                continue
+            if kind == "quote":
+                self._fail(match.start(), "unterminated string")
+            if kind == "open":
+                if depth == 0:
+                    open_position = match.start()
+                depth += 1
+            elif kind == "close":
+                depth -= 1
+                if depth < 0:
+                    self._fail(match.start(), "unbalanced closing parenthesis")
+            elif kind == "comma":
+                if implies is not None:
+                    commas.append(match.start())
+            elif kind == "implies":
+                if implies is not None:
+                    self._fail(match.start(), "more than one ':-' in a statement")
+                implies = match.start()
+            elif kind == "end":
+                self._statement(
+                    program, start, implies, commas, match.start(), match.group()
+                )
+                start = match.end()
+                implies = None
+                commas = []
+        if depth > 0:
+            self._fail(open_position, "unclosed parenthesis")
+        end = _SPACE_REGEX.match(text, start).end()
+        if end != len(text):
+            self._fail(end, f"missing '.' after {text[end:end + 40]!r}")
+        return program
+
+    def _statement(
+        self,
+        program: Program,
+        start: int,
+        implies: Optional[int],
+        commas: List[int],
+        end: int,
+        end_char: str,
+    ) -> None:
+        text = self._text
+        start = _SPACE_REGEX.match(text, start).end()
+        head_end = end if implies is None else implies
+        head_text = _strip_comments(text[start:head_end])
+        if head_text.startswith("@"):
+            match = _ANNOTATION_REGEX.fullmatch(head_text)
+            if match is None or implies is not None or end_char != ".":
+                self._fail(start, f"malformed annotation {head_text!r}")
+            arguments = self._constants(start, match.group(2))
+            program.annotations.append(Annotation(match.group(1), arguments))
+            return
+        match = _HEAD_REGEX.fullmatch(head_text)
+        if match is None or not _is_balanced(match.group(3)):
+            self._fail(start, f"cannot parse {head_text[:40]!r}")
+        existentials = self._existentials(start, match.group(1))
+        head = self._atom(start, match.group(2), match.group(3))
+        if implies is not None:
+            if end_char != ".":
+                self._fail(start, f"rule ending with {end_char!r}")
+            bounds = [implies + 1, *commas, end]
+            atoms = []
+            conditions = []
+            for literal_start, literal_end in zip(bounds, bounds[1:]):
+                literal = self._literal(
+                    start, _strip_comments(text[literal_start + 1 : literal_end])
+                )
+                if isinstance(literal, Atom):
+                    atoms.append(literal)
+                else:
+                    conditions.append(literal)
+            program.rules.append(
+                self._rule(start, head, tuple(atoms), tuple(conditions), existentials)
+            )
+        elif end_char == "?":
+            program.queries.append(Query(head, existentials))
+        elif head.variables or existentials:
+            self._fail(start, f"fact with variables: {head}")
+        else:
+            program.facts.append(head)
+
+    def _fail(self, position: int, message: str):
+        line = self._text.count("\n", 0, position) + 1
+        raise ParseError(f"line {line}: {message}")
+
+    def _rule(
+        self,
+        position: int,
+        head: Atom,
+        body: Tuple[Atom, ...],
+        conditions: Tuple[Condition, ...],
+        existentials: Tuple[Variable, ...],
+    ) -> Rule:
+        rule = Rule(head, body, conditions)
+        if existentials and set(existentials) != set(rule.existential_variables):
+            self._fail(
+                position,
+                "declared existential variables do not match the head variables"
+                f" missing from the body: {rule}",
+            )
+        return rule
+
+    def _literal(self, position: int, text: str) -> Union[Atom, Condition]:
+        if not text:
+            self._fail(position, "empty body literal")
+        match = _ATOM_REGEX.fullmatch(text)
+        if match is not None and _is_balanced(match.group(2)):
+            return self._atom(position, match.group(1), match.group(2))
+        if _NEGATION_REGEX.match(text) is not None:
+            self._fail(position, f"negation is not supported: {text!r}")
+        if not _is_balanced(text):
+            self._fail(position, f"malformed body literal {text!r}")
+        names = dict.fromkeys(
+            name
+            for name in _CONDITION_VARIABLE_REGEX.findall(text)
+            if name and name != "_"
+        )
+        return Condition(text, tuple(map(Variable, names)))
+
+    def _split(self, position: int, text: Optional[str]) -> List[Tuple[str, str]]:
+        """Split comma-separated terms into pairs (quoted string, other text)."""
+        if text is None or not text.strip():
+            return []
+        parts = []
+        offset = 0
+        while offset < len(text):
+            term_match = _TERM_REGEX.match(text, offset)
+            if term_match is None or (
+                term_match.group(3) == "," and term_match.end() == len(text)
+            ):
+                self._fail(position, f"malformed terms {text!r}")
+            parts.append(term_match.group(1, 2))
+            offset = term_match.end()
+        return parts
+
+    def _atom(self, position: int, predicate: str, text: str) -> Atom:
+        atom = self._atom_cache.get((predicate, text))
+        if atom is not None:
+            return atom
+        terms = self._terms_cache.get(text)
+        if terms is None:
+            terms = tuple(
+                self._term(position, string, other)
+                for string, other in self._split(position, text)
+            )
+        atom = Atom(predicate, terms)
+        # anonymous variables must be fresh at each occurrence
+        if _ANONYMOUS_REGEX.search(text) is None:
+            self._terms_cache[text] = terms
+            self._atom_cache[predicate, text] = atom
+        return atom
+
+    def _term(self, position: int, string: Optional[str], other: str) -> Term:
+        if string is not None:
+            return Constant(_unescape(string[1:-1]), is_string=True)
+        if other == "_":
+            self._nb_anonymous += 1
+            return Variable(f"_{self._nb_anonymous}", is_anonymous=True)
+        if other[0].isupper() or other[0] == "_":
+            if _IDENT_REGEX.match(other) is None:
+                self._fail(position, f"malformed variable {other!r}")
+            return Variable(other)
+        if _NUMBER_REGEX.match(other) is None and _IDENT_REGEX.match(other) is None:
+            self._fail(position, f"malformed constant {other!r}")
+        return Constant(other)
+
+    def _constants(self, position: int, text: Optional[str]) -> Tuple[Constant, ...]:
+        constants = []
+        for string, other in self._split(position, text):
+            term = self._term(position, string, other)
+            if not isinstance(term, Constant):
+                self._fail(position, f"expected a constant, found {term}")
+            constants.append(term)
+        return tuple(constants)
+
+    def _existentials(self, position: int, text: Optional[str]) -> Tuple[Variable, ...]:
+        if text is None:
+            return ()
+        variables = []
+        for string, other in self._split(position, text):
+            term = self._term(position, string, other)
+            if not isinstance(term, Variable):
+                self._fail(position, f"expected a variable, found {term}")
+            variables.append(term)
+        if not variables:
+            self._fail(position, "empty #exists declaration")
+        return tuple(variables)
+
+
+def _unescape(text: str) -> str:
+    if "\\" not in text:
+        return text
+    return re.sub(r"\\(.)", r"\1", text)
+
+
+def parse_program(text: str) -> Program:
+    """
+    Parse a program in Vadalog or DLV^E syntax.
+
+    :param text: the program.
+    :return: the program.
+    """
+    return Parser(text).parse()
@@ -0,0 +1,118 @@
+from collections import Counter
+from typing import Dict, Set, Tuple
+
+from benchmark.datalog.ast import Atom, Constant, Program, Query, Rule, Variable
+
+
+def get_needed_positions(program: Program) -> Dict[str, Tuple[int, ...]]:
+    """
+    Get the positions of each predicate the outputs of a program depend on.
+
+    All the positions of the outputs are needed. In a rule whose head is
+    needed, a position of a body atom is needed if it holds a constant, a
+    variable at a needed position of the head, a variable occurring more
+    than once in the body, e.g. a join, or in a condition; the analysis is iterated up to a
+    fixpoint, for recursive rules. The other positions can be projected out
+    without changing the answers.
+
+    :param program: the program.
+    :return: the sorted needed positions of each predicate the outputs
+      depend on; a predicate may need no position, e.g. when it is only
+      checked for existence.
+    """
+    relevant = program.get_relevant_predicates()
+    needed: Dict[str, Set[int]] = {predicate: set() for predicate in relevant}
+    for output in program.outputs:
+        needed[output] = set(range(program.get_arity(output) or 0))
+    rules = [rule for rule in program.rules if rule.head.predicate in relevant]
+    changed = True
+    while changed:
+        changed = False
+        for rule in rules:
+            head_positions = needed[rule.head.predicate]
+            needed_variables = {
+                term
+                for position, term in enumerate(rule.head.terms)
+                if position in head_positions and isinstance(term, Variable)
+            }
+            counts = Counter(
+                term
+                for atom in rule.body
+                for term in atom.terms
+                if isinstance(term, Variable)
+            )
+            needed_variables.update(
+                var for condition in rule.conditions for var in condition.variables
+            )
+            for atom in rule.body:
+                positions = needed[atom.predicate]
+                for position, term in enumerate(atom.terms):
+                    if position in positions:
+                        continue
+                    if (
+                        isinstance(term, Constant)
+                        or term in needed_variables
+                        or counts[term] > 1
+                    ):
+                        positions.add(position)
+                        changed = True
+    return {
+        predicate: tuple(sorted(positions)) for predicate, positions in needed.items()
+    }
+
+
+def get_projections(program: Program) -> Dict[str, Tuple[int, ...]]:
+    """
+    Get the projections of the predicates with positions the outputs do not
+    depend on; at least one position is kept, so that no atom is empty.
+
+    :param program: the program.
+    :return: the positions kept, for each predicate to project.
+    """
+    projections = {}
+    for predicate, positions in get_needed_positions(program).items():
+        arity = program.get_arity(predicate) or 0
+        if len(positions) < arity:
+            projections[predicate] = positions or (0,)
+    return projections
+
+
+def _project_atom(atom: Atom, projections: Dict[str, Tuple[int, ...]]) -> Atom:
+    positions = projections.get(atom.predicate)
+    if positions is None:
+        return atom
+    return Atom(atom.predicate, tuple(atom.terms[position] for position in positions))
+
+
+def project_program(
+    program: Program, projections: Dict[str, Tuple[int, ...]]
+) -> Program:
+    """
+    Rewrite the atoms of a program to the projections of their predicates,
+    e.g. treatment(ID,PATIENT,HOSPITAL,NPI,CONF1) to treatment(ID,NPI).
+
+    The rules of the predicates the outputs do not depend on are left out,
+    since their atoms may not match the projections anymore.
+
+    :param program: the program.
+    :param projections: the positions kept, for each predicate to project.
+    :return: the projected program.
+    """
+    sliced = program.slice()
+    rules = [
+        Rule(
+            _project_atom(rule.head, projections),
+            tuple(_project_atom(atom, projections) for atom in rule.body),
+            rule.conditions,
+        )
+        for rule in sliced.rules
+    ]
+    return Program(
+        rules=rules,
+        facts=[_project_atom(fact, projections) for fact in sliced.facts],
+        annotations=list(sliced.annotations),
+        queries=[
+            Query(_project_atom(query.atom, projections), query.existential_variables)
+            for query in sliced.queries
+        ],
+    )
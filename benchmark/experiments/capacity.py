@@ -0,0 +1,309 @@
+import logging
+import math
+import os
+import shutil
+from dataclasses import dataclass, fields
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from benchmark.experiments.scheduler import Cell
+from benchmark.tools.core import Result, Status
+from benchmark.utils.cache import make_key
+from benchmark.utils.scaling import ScalingFit, fit_scaling
+
+# the search stops when the largest size within the budget and the smallest
+# one beyond it are within this ratio
+DEFAULT_RESOLUTION = 0.1
+# the maximum number of runs on sliced partitions, for each (query, tool)
+DEFAULT_MAX_BISECTIONS = 4
+# the number of distinct sizes needed to fit the runtime
+MIN_FIT_SIZES = 2
+# where the sliced partitions are written, in the work directory of the
+# experiments
+SLICED_PARTITIONS_DIRNAME = "partitions"
+# the number of hex digits of the keys in the names of the slice directories
+KEY_LENGTH = 12
+CAPACITY_TSV_FILENAME = "capacity.tsv"
+
+
+@dataclass(frozen=True)
+class Partition:
+    """A partition of the dataset of a tool, with the program to run on it."""
+
+    name: str
+    size: int
+    dataset_dir: Path
+    program: Path
+
+
+def get_partitions(
+    tool_dataset_dir: Path, program_dir: Path, tool: str
+) -> List[Partition]:
+    """
+    Get the partitions of the dataset of a tool, by increasing size; the name
+    of a partition is its size, e.g. 0010000.
+    """
+    partitions = []
+    for dataset in tool_dataset_dir.iterdir():
+        program = program_dir / (tool + ".txt")
+        if not program.exists():
+            program = program_dir / dataset.name / (tool + ".txt")
+        partitions.append(Partition(dataset.name, int(dataset.name), dataset, program))
+    return sorted(partitions, key=lambda partition: partition.size)
+
+
+def get_slices_dir(work_dir: Path, partitions: Sequence[Partition]) -> Path:
+    """
+    Get the directory of the partitions sliced from existing ones, in the work
+    directory; it is keyed by the path, size and modification time of their
+    dataset files, so that regenerated partitions are sliced again.
+    """
+    material = []
+    for partition in partitions:
+        for dataset_file in sorted(partition.dataset_dir.iterdir()):
+            stat = dataset_file.stat()
+            material.append((dataset_file.absolute(), stat.st_size, stat.st_mtime_ns))
+    key = make_key({"dataset_files": material})[:KEY_LENGTH]
+    # e.g. doctors-dlv-<key>
+    tool_dataset_dir = partitions[0].dataset_dir.parent
+    name = f"{tool_dataset_dir.parent.name}-{tool_dataset_dir.name}-{key}"
+    return work_dir / SLICED_PARTITIONS_DIRNAME / name
+
+
+@lru_cache(maxsize=None)
+def _count_rows(dataset_file: Path) -> int:
+    with dataset_file.open("rb") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def _write_rows_prefix(source: Path, target: Path, nb_rows: int) -> None:
+    """Write the first rows of a dataset file; empty lines, e.g. the header
+    line of the CSV files, are kept and not counted."""
+    with source.open("rb") as fsrc, target.open("wb") as fdst:
+        for line in fsrc:
+            if line.strip():
+                if nb_rows == 0:
+                    break
+                nb_rows -= 1
+            fdst.write(line)
+
+
+def slice_partition(
+    partitions: Sequence[Partition], size: int, output_dir: Path
+) -> Partition:
+    """
+    Make a partition of a size between two existing ones, by cutting the
+    dataset files of the larger one.
+
+    The number of rows of each relation is interpolated between the two
+    partitions, so that the relations with the same rows in all of them (e.g.
+    the companies of psc) are kept whole; the program is the one of the larger
+    partition. The result only depends on the existing partitions, and it is
+    reused if already written.
+
+    :param partitions: the existing partitions, by increasing size.
+    :param size: the size, strictly between two partitions.
+    :param output_dir: where the partition is written, in a directory named
+      as the size, zero-padded as the others.
+    :return: the partition.
+    """
+    index = next(i for i, partition in enumerate(partitions) if partition.size > size)
+    if index == 0:
+        raise ValueError(f"cannot slice size {size} below the smallest partition")
+    lower, upper = partitions[index - 1], partitions[index]
+    name = f"{size:0{len(partitions[-1].name)}d}"
+    dataset_dir = output_dir / name
+    if not dataset_dir.exists():
+        # unique, in case another experiment slices the same size concurrently
+        tmp_dataset_dir = output_dir / f"{name}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_dataset_dir, ignore_errors=True)
+        tmp_dataset_dir.mkdir(parents=True)
+        ratio = (size - lower.size) / (upper.size - lower.size)
+        for dataset_file in sorted(upper.dataset_dir.iterdir()):
+            nb_upper_rows = _count_rows(dataset_file)
+            lower_file = lower.dataset_dir / dataset_file.name
+            nb_lower_rows = _count_rows(lower_file) if lower_file.exists() else 0
+            nb_rows = nb_lower_rows + round((nb_upper_rows - nb_lower_rows) * ratio)
+            target = tmp_dataset_dir / dataset_file.name
+            if nb_rows >= nb_upper_rows:
+                try:
+                    os.link(dataset_file, target)
+                except OSError:
+                    shutil.copyfile(dataset_file, target)
+            else:
+                _write_rows_prefix(dataset_file, target, nb_rows)
+        # a partition interrupted while being written is never reused
+        try:
+            tmp_dataset_dir.rename(dataset_dir)
+        except OSError:
+            if not dataset_dir.exists():
+                raise
+            shutil.rmtree(tmp_dataset_dir, ignore_errors=True)
+    return Partition(name, size, dataset_dir, upper.program)
+
+
+@dataclass
+class Capacity:
+    """
+    The largest dataset size a tool processes within the time budget, for a
+    query, bracketed by the smallest size that it does not process, or that
+    it is predicted not to.
+    """
+
+    query: str
+    tool: str
+    budget: float
+    # the largest size run successfully within the budget, if any
+    capacity: Optional[int] = None
+    capacity_time: Optional[float] = None
+    upper_bound: Optional[int] = None
+    # whether the upper bound was skipped on the prediction of the fit
+    upper_bound_predicted: bool = False
+    # the size at which the fitted runtime reaches the budget
+    predicted_capacity: Optional[int] = None
+    nb_runs: int = 0
+    nb_skipped: int = 0
+
+    @staticmethod
+    def headers() -> str:
+        return "\t".join(f.name for f in fields(Capacity))
+
+    def to_row(self) -> str:
+        values = [getattr(self, f.name) for f in fields(self)]
+        return "\t".join("" if value is None else str(value) for value in values)
+
+
+def save_capacities(capacities: List[Capacity], output: Path) -> None:
+    with output.open("w") as f:
+        f.write(Capacity.headers() + "\n")
+        for capacity in capacities:
+            f.write(capacity.to_row() + "\n")
+
+
+def search_capacity(
+    query: str,
+    tool: str,
+    partitions: Sequence[Partition],
+    make_cell: Callable[[Partition], Cell],
+    run: Callable[[Cell], Result],
+    budget: float,
+    slices_dir: Path,
+    resolution: float = DEFAULT_RESOLUTION,
+    max_bisections: int = DEFAULT_MAX_BISECTIONS,
+) -> Tuple[Capacity, List[Tuple[Cell, Result]]]:
+    """
+    Search the largest dataset size a tool processes within a time budget.
+
+    The partitions are run by increasing size. Once two sizes succeeded, the
+    runtime is fitted as in fit-scaling, and the sizes predicted to exceed the
+    budget are skipped instead of being run until the timeout. Then, the
+    search bisects between the largest size within the budget and the
+    smallest one beyond, on partitions sliced from the existing ones, starting
+    from the size where the fit reaches the budget; it stops when both sizes
+    are within the resolution, or after max_bisections runs.
+
+    :param query: the query.
+    :param tool: the tool.
+    :param partitions: the existing partitions, by increasing size.
+    :param make_cell: make the cell running a partition, with the budget as
+      timeout.
+    :param run: run a cell.
+    :param budget: the time budget, in seconds.
+    :param slices_dir: where the sliced partitions are written.
+    :param resolution: the relative precision of the capacity.
+    :param max_bisections: the maximum number of runs on sliced partitions.
+    :return: the capacity, and every run.
+    """
+    capacity = Capacity(query, tool, budget)
+    runs: List[Tuple[Cell, Result]] = []
+    successes: List[Tuple[int, float]] = []
+
+    def run_partition(partition: Partition) -> bool:
+        cell = make_cell(partition)
+        result = run(cell)
+        runs.append((cell, result))
+        capacity.nb_runs += 1
+        ok = (
+            result.status == Status.SUCCESS
+            and result.time_end2end is not None
+            and result.time_end2end <= budget
+        )
+        if ok:
+            successes.append((partition.size, result.time_end2end))
+        return ok
+
+    def fit() -> Optional[ScalingFit]:
+        if len({size for size, _ in successes}) < MIN_FIT_SIZES:
+            return None
+        return fit_scaling(*zip(*successes))
+
+    lower: Optional[Partition] = None
+    upper: Optional[Partition] = None
+    for index, partition in enumerate(partitions):
+        scaling = fit()
+        if scaling is not None:
+            predicted = scaling.extrapolate(partition.size).time
+            if predicted > budget:
+                logging.info(
+                    f"Skipping {query}/{tool}/{partition.name}: predicted time "
+                    f"{predicted:.2f}s beyond the budget {budget}s"
+                )
+                upper = partition
+                capacity.upper_bound_predicted = True
+                capacity.nb_skipped = len(partitions) - index
+                break
+        if run_partition(partition):
+            lower = partition
+        else:
+            upper = partition
+            capacity.nb_skipped = len(partitions) - index - 1
+            break
+
+    for _ in range(max_bisections):
+        if lower is None or upper is None:
+            break
+        if upper.size <= lower.size * (1 + resolution):
+            break
+        # the fitted size, kept in the middle half of the interval (in log
+        # scale) so that the interval shrinks even if the fit is wrong
+        log_lower, log_upper = math.log(lower.size), math.log(upper.size)
+        guess = None
+        scaling = fit()
+        if scaling is not None:
+            guess = scaling.size_for_time(budget)
+        log_size = (
+            (log_lower + log_upper) / 2 if guess is None else math.log(guess)
+        )
+        log_size = min(
+            max(log_size, log_lower + (log_upper - log_lower) / 4),
+            log_upper - (log_upper - log_lower) / 4,
+        )
+        size = round(math.exp(log_size))
+        partition = slice_partition(partitions, size, slices_dir)
+        logging.info(
+            f"Bisecting {query}/{tool} between {lower.size} and {upper.size}: "
+            f"running {size}"
+        )
+        if run_partition(partition):
+            lower = partition
+        else:
+            upper = partition
+            capacity.upper_bound_predicted = False
+
+    if lower is not None:
+        capacity.capacity = lower.size
+        capacity.capacity_time = dict(successes)[lower.size]
+    if upper is not None:
+        capacity.upper_bound = upper.size
+    scaling = fit()
+    if scaling is not None:
+        predicted_size = scaling.size_for_time(budget)
+        if predicted_size is not None:
+            capacity.predicted_capacity = round(predicted_size)
+    logging.info(
+        f"Capacity of {query}/{tool} within {budget}s: {capacity.capacity} "
+        f"(upper bound {capacity.upper_bound}, predicted "
+        f"{capacity.predicted_capacity})"
+    )
+    return capacity, runs
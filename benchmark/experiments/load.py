@@ -0,0 +1,244 @@
+import codecs
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
+from itertools import count
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+from benchmark.tools.core import Result, Status, Tool
+from benchmark.tools.vadalog import (
+    VadalogClient,
+    VadalogOutputParser,
+    VadalogTool,
+    build_program,
+    parse_bind_type,
+)
+from benchmark.utils.stats import percentile, summarize
+
+# the percentiles of the latency reported for each query
+LATENCY_PERCENTILES = (50, 95, 99)
+# the name of the summary over all the queries
+ALL_QUERIES = "all"
+
+
+@dataclass(frozen=True)
+class LoadQuery:
+    """A query of the mix sent to the engine during a load test."""
+
+    name: str
+    program: Path
+    datasets: Tuple[Path, ...]
+    run_config: Dict = field(default_factory=dict, hash=False, compare=False)
+
+
+# executes a request for a query, given the timeout, and returns its result
+RunQuery = Callable[[LoadQuery, float], Result]
+
+
+class _VadalogRequests:
+    """
+    Send the queries to the Vadalog server of a tool, with one client per
+    thread, so that the concurrent requests do not share a connection.
+    """
+
+    def __init__(self, tool: VadalogTool, queries: Sequence[LoadQuery]) -> None:
+        self.tool = tool
+        # the programs with their @bind annotations, built once per query
+        self._programs = {
+            query.name: build_program(
+                query.program.read_text(),
+                list(map(parse_bind_type, query.run_config["binds"])),
+            )
+            for query in queries
+        }
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._clients: List[VadalogClient] = []
+
+    def _get_client(self) -> VadalogClient:
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = VadalogClient(self.tool.client.url)
+            with self._lock:
+                self._clients.append(client)
+        return client
+
+    def __call__(self, query: LoadQuery, timeout: float) -> Result:
+        parser = VadalogOutputParser()
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        start = time.perf_counter()
+        evaluation = self._get_client().evaluate(
+            self._programs[query.name],
+            on_output=lambda chunk: parser.feed(decoder.decode(chunk)),
+            timeout=timeout,
+        )
+        total = time.perf_counter() - start
+        parser.feed(decoder.decode(b"", final=True))
+        result = parser.result()
+        result.name = query.name
+        result.command = self.tool.get_cli_args(
+            query.program, list(query.datasets), query.run_config
+        )
+        result.time_end2end = result.time_engine = total
+        result.time_wrapper = 0.0
+        if evaluation.timed_out:
+            result.status = Status.TIMEOUT
+        elif evaluation.error is not None:
+            logging.error(f"request for {query.name} failed: {evaluation.error}")
+            result.status = Status.ERROR
+        return result
+
+    def close(self) -> None:
+        for client in self._clients:
+            client.close()
+
+
+@contextmanager
+def query_runner(tool: Tool, queries: Sequence[LoadQuery]) -> Iterator[RunQuery]:
+    """
+    Get the function executing the requests of a load test with a tool, to be
+    called within the session of the tool.
+
+    With Vadalog in process, every request is sent to the server of the
+    session from this process; otherwise, every request is a run of the tool,
+    e.g. a DLV^E process.
+
+    :param tool: the tool.
+    :param queries: the queries of the load test.
+    :return: the function executing a request.
+    """
+    if isinstance(tool, VadalogTool) and tool.in_process:
+        requests = _VadalogRequests(tool, queries)
+        try:
+            yield requests
+        finally:
+            requests.close()
+        return
+
+    def run_query(query: LoadQuery, timeout: float) -> Result:
+        return tool.run(
+            query.program,
+            list(query.datasets),
+            query.run_config,
+            timeout=timeout,
+            name=query.name,
+        )
+
+    yield run_query
+
+
+def run_load(
+    queries: Sequence[LoadQuery],
+    run_query: RunQuery,
+    concurrency: int,
+    duration: float,
+    timeout: float,
+) -> List[Result]:
+    """
+    Send requests for a mix of queries from concurrent workers, for a given
+    duration.
+
+    Each worker sends its next request as soon as the previous one ends, and
+    the queries are taken in turn from the mix; the requests in flight at the
+    end of the duration are waited for. The throughput of a query is its
+    number of successful requests divided by the time from the first request
+    to the end of the last one.
+
+    :param queries: the queries, not empty.
+    :param run_query: the function executing a request, e.g. from query_runner.
+    :param concurrency: the number of workers.
+    :param duration: the time, in seconds, after which no request is sent.
+    :param timeout: the timeout of each request, in seconds.
+    :return: the summary of each query, then the one of all the queries; the
+      results of the single requests are the trials of each summary.
+    """
+    trials: Dict[str, List[Result]] = {query.name: [] for query in queries}
+    lock = threading.Lock()
+    turns = count()
+    start = time.perf_counter()
+    deadline = start + duration
+
+    def work() -> None:
+        while time.perf_counter() < deadline:
+            query = queries[next(turns) % len(queries)]
+            result = run_query(query, timeout)
+            with lock:
+                trials[query.name].append(result)
+
+    with ThreadPoolExecutor(concurrency, thread_name_prefix="load") as executor:
+        futures = [executor.submit(work) for _ in range(concurrency)]
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - start
+
+    results = []
+    for query in queries:
+        if not trials[query.name]:
+            logging.warning(f"no request sent for {query.name}, duration too short")
+            continue
+        results.append(
+            summarize_load(query.name, trials[query.name], elapsed, concurrency)
+        )
+    all_trials = [trial for query in queries for trial in trials[query.name]]
+    if all_trials:
+        summary = summarize_load(ALL_QUERIES, all_trials, elapsed, concurrency)
+        summary.command = [str(query.program) for query in queries]
+        results.append(summary)
+    return results
+
+
+def summarize_load(
+    name: str, trials: List[Result], elapsed: float, concurrency: int
+) -> Result:
+    """
+    Summarize the requests of a load test.
+
+    As for repeated runs, time_end2end is the mean latency and the summary
+    fields describe its distribution, over the successful requests; if a
+    request failed, the status is the one of the first failure. The stats
+    hold the throughput, the latency percentiles and the number of requests.
+
+    :param name: the name of the summary, e.g. the query.
+    :param trials: the results of the requests, not empty.
+    :param elapsed: the wall-clock time of the load test.
+    :param concurrency: the number of workers.
+    :return: the summary, holding the requests as trials.
+    """
+    succeeded = [trial for trial in trials if trial.status == Status.SUCCESS]
+    failed = [trial for trial in trials if trial.status != Status.SUCCESS]
+    result = Result(
+        name=name,
+        command=trials[0].command,
+        status=failed[0].status if failed else Status.SUCCESS,
+        nb_atoms=succeeded[-1].nb_atoms if succeeded else None,
+        nb_trials=len(succeeded),
+        trials=list(trials),
+    )
+    result.stats = {
+        "qps": len(succeeded) / elapsed,
+        "nb_requests": len(trials),
+        "nb_failures": len(failed),
+        "concurrency": concurrency,
+        "elapsed": elapsed,
+    }
+    if not succeeded:
+        return result
+
+    latencies = [trial.time_end2end for trial in succeeded]
+    summary = summarize(latencies)
+    result = replace(
+        result,
+        time_end2end=summary.mean,
+        time_median=summary.median,
+        time_stddev=summary.stddev,
+        time_min=summary.min,
+        time_ci_low=summary.ci_low,
+        time_ci_high=summary.ci_high,
+    )
+    for q in LATENCY_PERCENTILES:
+        result.stats[f"latency_p{q}"] = percentile(latencies, q)
+    return result
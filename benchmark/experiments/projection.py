@@ -0,0 +1,192 @@
+import csv
+import hashlib
+import io
+import logging
+import os
+import re
+import time
+from pathlib import Path
+from typing import Iterable, List, Sequence, Tuple
+
+from benchmark.datalog.emit import to_dlv, to_vadalog
+from benchmark.datalog.parser import ParseError, parse_program
+from benchmark.datalog.projection import get_projections, project_program
+from benchmark.tools import ToolID
+from benchmark.utils.cache import make_key
+
+# where the projected programs and dataset files are written, in the work
+# directory of the experiments
+PROJECTED_DIRNAME = "projected"
+# the number of hex digits of the keys in the names of the projected files
+KEY_LENGTH = 12
+
+_FACT_REGEX = re.compile(r"\s*([A-Za-z_]\w*)\s*\((.*)\)\s*\.\s*$")
+_FACT_VALUE_REGEX = re.compile(r'"(?:[^"\\]|\\.)*"|[^,]+')
+
+
+def _is_fact_file(dataset_file: Path) -> bool:
+    """Tell the files of facts of DLV^E, e.g. p("a","b"). from the CSV files."""
+    with dataset_file.open(encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if line.strip():
+                return _FACT_REGEX.match(line) is not None
+    return False
+
+
+def _project_facts(lines: Iterable[str], positions: Tuple[int, ...]) -> Iterable[str]:
+    for line in lines:
+        match = _FACT_REGEX.match(line)
+        if match is None:
+            continue
+        predicate, arguments = match.groups()
+        values = [value.strip() for value in _FACT_VALUE_REGEX.findall(arguments)]
+        projected = ",".join(values[position] for position in positions)
+        yield f"{predicate}({projected}).\n"
+
+
+def _format_csv_row(values: List[str]) -> str:
+    if not any("," in value or '"' in value for value in values):
+        return ",".join(values) + "\n"
+    output = io.StringIO()
+    csv.writer(output, lineterminator="\n").writerow(values)
+    return output.getvalue()
+
+
+def _project_csv(lines: Iterable[str], positions: Tuple[int, ...]) -> Iterable[str]:
+    for line in lines:
+        if not line.strip():
+            # e.g. the empty header line, kept as is
+            yield line
+            continue
+        line = line.rstrip("\r\n")
+        values = next(csv.reader([line])) if '"' in line else line.split(",")
+        yield _format_csv_row([values[position] for position in positions])
+
+
+def project_dataset_file(
+    source: Path, target: Path, positions: Tuple[int, ...]
+) -> Tuple[int, int]:
+    """
+    Write the projection of a dataset file, a file of facts or a CSV file,
+    without duplicates.
+
+    :param source: the dataset file.
+    :param target: the projected file, in the same format.
+    :param positions: the positions kept.
+    :return: the number of rows read and written.
+    """
+    project = _project_facts if _is_fact_file(source) else _project_csv
+    seen = set()
+    nb_read = nb_written = 0
+    with source.open(encoding="utf-8") as fsrc, target.open(
+        "w", encoding="utf-8"
+    ) as fdst:
+        for row in project(fsrc, positions):
+            if not row.strip():
+                fdst.write(row)
+                continue
+            nb_read += 1
+            if row in seen:
+                continue
+            seen.add(row)
+            fdst.write(row)
+            nb_written += 1
+    return nb_read, nb_written
+
+
+def _get_projected_dataset_file(
+    dataset_file: Path, positions: Tuple[int, ...], projected_dataset_dir: Path
+) -> Path:
+    """
+    Get the projection of a dataset file, written once for all the runs; it
+    is keyed by the path, size and modification time of the file, so that a
+    regenerated dataset is projected again.
+    """
+    stat = dataset_file.stat()
+    key = make_key(
+        {
+            "path": dataset_file.absolute(),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "positions": positions,
+        }
+    )[:KEY_LENGTH]
+    projection = "_".join(map(str, positions))
+    target_dir = projected_dataset_dir / f"{dataset_file.stem}-{projection}-{key}"
+    target = target_dir / dataset_file.name
+    if target.exists():
+        return target
+    target_dir.mkdir(parents=True, exist_ok=True)
+    # unique, in case another experiment projects the same file concurrently
+    tmp_target = target_dir / f"{dataset_file.name}.{os.getpid()}.tmp"
+    start = time.perf_counter()
+    nb_read, nb_written = project_dataset_file(dataset_file, tmp_target, positions)
+    tmp_target.rename(target)
+    logging.info(
+        f"Projected {dataset_file} on positions {positions}: {nb_read} rows, "
+        f"{nb_written} distinct, {dataset_file.stat().st_size} -> "
+        f"{target.stat().st_size} bytes in {time.perf_counter() - start:.2f}s"
+    )
+    return target
+
+
+def prepare_projected_run(
+    program: Path,
+    dataset_files: Sequence[Path],
+    tool: str,
+    projected_program: Path,
+    projected_dataset_dir: Path,
+) -> Tuple[Path, List[Path]]:
+    """
+    Prepare a run on the positions of the input relations its output depends
+    on: the program atoms and the dataset files are projected accordingly.
+
+    The projected dataset files are written in projected_dataset_dir, one
+    directory per dataset file and projection, and reused by the runs (and
+    experiments) with the same projection; the dataset files of relations
+    that keep all their positions are used as they are.
+
+    :param program: the program, in the syntax of the tool.
+    :param dataset_files: the dataset files, named after their relation.
+    :param tool: the tool.
+    :param projected_program: where the projected program is written; the
+      hash of its text is appended to the name, e.g. 0010000-<hash>.txt, so
+      that the experiments sharing the directory never overwrite the program
+      of another one.
+    :param projected_dataset_dir: where the projected dataset files are written.
+    :return: the program and the dataset files of the run; if the program
+      cannot be parsed, the original ones.
+    """
+    try:
+        parsed = parse_program(program.read_text())
+    except ParseError as e:
+        logging.warning(f"Not projecting, cannot parse {program}: {e}")
+        return program, list(dataset_files)
+    projections = get_projections(parsed)
+    projected = project_program(parsed, projections)
+    emit = to_dlv if ToolID(tool) == ToolID.DLV else to_vadalog
+    text = emit(projected)
+    key = hashlib.sha256(text.encode("utf-8")).hexdigest()[:KEY_LENGTH]
+    projected_program = projected_program.with_name(
+        f"{projected_program.stem}-{key}{projected_program.suffix}"
+    )
+    if not projected_program.exists():
+        projected_program.parent.mkdir(parents=True, exist_ok=True)
+        tmp_program = projected_program.with_name(
+            f"{projected_program.name}.{os.getpid()}.tmp"
+        )
+        tmp_program.write_text(text)
+        tmp_program.rename(projected_program)
+
+    projected_files = []
+    for dataset_file in dataset_files:
+        positions = projections.get(dataset_file.stem)
+        if positions is None:
+            projected_files.append(dataset_file)
+        else:
+            projected_file = _get_projected_dataset_file(
+                dataset_file, positions, projected_dataset_dir
+            )
+            projected_files.append(projected_file)
+    return projected_program, projected_files
+
@@ -2,12 +2,26 @@
 
 set -e
 
-/bin/rm -rf results
+# number of parallel runs, e.g. JOBS=8 ./benchmark/experiments/run-all-doctors.sh
+JOBS=${JOBS:-1}
+
+# to continue an interrupted sweep, reusing the cached results:
+# RESUME=1 ./benchmark/experiments/run-all-doctors.sh
+resume_args=()
+if [ -n "${RESUME}" ]; then
+  resume_args+=(--resume)
+else
+  /bin/rm -rf results
+fi
+program_dirs=()
 for doctor_program in programs/doctors-q*; do
-  python ./benchmark/experiments/run-scalability-experiment --timeout 300.0 \
-    --output-dir results/"$(basename "${doctor_program}")" \
-    --tool dlv \
-    --tool vadalog \
-    --dataset-dir datasets/doctors \
-    --program-dir "${doctor_program}"
+  program_dirs+=(--program-dir "${doctor_program}")
 done
+python ./benchmark/experiments/run-scalability-experiment --timeout 300.0 \
+  --output-dir results \
+  --tool dlv \
+  --tool vadalog \
+  --jobs "${JOBS}" \
+  "${resume_args[@]}" \
+  --dataset-dir datasets/doctors \
+  "${program_dirs[@]}"
@@ -0,0 +1,390 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from benchmark.datalog.parser import ParseError, parse_program
+from benchmark.tools import ToolID, tool_registry
+from benchmark.tools.core import Result, Status, Tool, aggregate_trials
+from benchmark.tools.engine import run_engine
+from benchmark.utils.base import configure_logging
+from benchmark.utils.cache import ResultCache, hash_file, make_key
+from benchmark.utils.stats import summarize
+
+# the minimum number of trials before stopping on a tight confidence interval
+MIN_TRIALS_FOR_EARLY_STOP = 3
+
+
+def get_vadalog_run_config(dataset_files: List[Path]):
+    return {
+        "binds": [
+            f"{dataset_file.stem}:csv:{dataset_file.absolute()}"
+            for dataset_file in dataset_files
+        ]
+    }
+
+
+# the run configuration of each tool, given the dataset files
+get_run_config: Dict[ToolID, Callable] = {
+    ToolID.DLV: lambda *_: {},
+    ToolID.VADALOG: get_vadalog_run_config,
+    ToolID.NATIVE: lambda *_: {},
+}
+
+
+def get_used_dataset_files(program: Path, dataset_files: List[Path]) -> List[Path]:
+    """
+    Keep the dataset files of the relations a program uses, e.g. physician.data
+    for the predicate physician, so that the other ones are neither loaded nor
+    bound; if the program cannot be parsed, all the files are kept.
+
+    :param program: the program, in the syntax of any tool.
+    :param dataset_files: the dataset files, named after their relation.
+    :return: the files used, in the same order.
+    """
+    try:
+        predicates = parse_program(program.read_text()).predicates
+    except ParseError as e:
+        logging.warning(f"Keeping all the dataset files, cannot parse {program}: {e}")
+        return dataset_files
+    return [
+        dataset_file
+        for dataset_file in dataset_files
+        if dataset_file.stem in predicates
+    ]
+
+
+@dataclass(frozen=True)
+class Cell:
+    """A single (query, tool, dataset size) run of the experiment matrix."""
+
+    query: str
+    tool: str
+    name: str
+    program: Path
+    datasets: Tuple[Path, ...]
+    working_dir: Path
+    timeout: float
+    run_config: Dict = field(default_factory=dict, hash=False, compare=False)
+    tool_config: Dict = field(default_factory=dict, hash=False, compare=False)
+    sampling_interval: Optional[float] = None
+    # maximum number of measured trials, and unmeasured runs before them
+    repetitions: int = 1
+    warmup: int = 0
+    # stop adding trials once the half width of the 95% confidence interval
+    # of the mean is within this fraction of the mean; None to always run all
+    ci_tolerance: Optional[float] = None
+
+
+@dataclass
+class Job:
+    """
+    A unit of work assigned to a single worker.
+
+    A job is made of chains of cells, executed one after the other. Within a
+    chain, cells are executed in order and, if stop_on_timeout is set, the
+    remaining cells of a chain are skipped after a failure.
+    """
+
+    chains: List[List[Cell]]
+    stop_on_timeout: bool = False
+    # where to store the results and, if resume is set, where to look them up
+    cache: Optional[ResultCache] = None
+    resume: bool = False
+
+
+def _run_once(cell: Cell, tool: Optional[Tool] = None) -> Result:
+    """Run a cell of the experiment once."""
+    return run_engine(
+        cell.name,
+        cell.program,
+        list(cell.datasets),
+        cell.timeout,
+        cell.tool,
+        tool_config=cell.tool_config,
+        run_config=cell.run_config,
+        working_dir=str(cell.working_dir),
+        force=True,
+        tool=tool,
+        sampling_interval=cell.sampling_interval,
+    )
+
+
+def run_cell(cell: Cell, tool: Optional[Tool] = None) -> Result:
+    """
+    Run a single cell of the experiment, possibly with an already open tool.
+
+    The warm-up runs are executed first and discarded; if one of them fails,
+    its result is returned without measuring any trial. Then, up to
+    cell.repetitions trials are measured, stopping at the first failure or, if
+    cell.ci_tolerance is set, as soon as the confidence interval of the mean
+    is tight enough. The output files in the working dir are the ones of the
+    last run.
+
+    :param cell: the cell to run.
+    :param tool: the tool instance to use; if None, a new one is made.
+    :return: the result aggregated over the trials.
+    """
+    logging.info("=" * 100)
+    logging.info(f"Processing dataset {cell.name} for query {cell.query}")
+    logging.info(f"Using program: {cell.program}")
+    logging.info(f"Working dir: {cell.working_dir}")
+    for index in range(cell.warmup):
+        logging.info(f"Warm-up run {index + 1}/{cell.warmup}")
+        result = _run_once(cell, tool)
+        if result.status != Status.SUCCESS:
+            logging.info(f"Warm-up run failed, status={result.status}")
+            result.nb_trials = 0
+            return result
+
+    trials: List[Result] = []
+    for index in range(cell.repetitions):
+        logging.info(f"Trial {index + 1}/{cell.repetitions}")
+        trial = _run_once(cell, tool)
+        trials.append(trial)
+        if trial.status != Status.SUCCESS:
+            break
+        if cell.ci_tolerance is None or len(trials) < MIN_TRIALS_FOR_EARLY_STOP:
+            continue
+        summary = summarize([trial.time_end2end for trial in trials])
+        if summary.is_precise(cell.ci_tolerance):
+            logging.info(
+                f"Confidence interval within {cell.ci_tolerance:.1%} of the mean "
+                f"after {len(trials)} trials"
+            )
+            break
+    result = aggregate_trials(trials)
+    logging.info(result.to_rows())
+    return result
+
+
+def get_cache_entry(cell: Cell) -> Tuple[str, Dict[str, Any]]:
+    """
+    Compute the cache key of a cell, from the content of its inputs.
+
+    The key depends on the program, the datasets (by name and content), the
+    engine files, the tool and run configurations, the timeout and the
+    repetition policy; it does not depend on the output paths.
+
+    :param cell: the cell.
+    :return: the key, and the material it is computed from.
+    """
+    spec = tool_registry.get_spec(cell.tool)
+    engine_files = spec.get_engine_files(**cell.tool_config)
+    material = {
+        "tool": cell.tool,
+        "tool_config": cell.tool_config,
+        "engine": {str(path): hash_file(path) for path in engine_files},
+        "program": hash_file(cell.program),
+        "datasets": {path.name: hash_file(path) for path in cell.datasets},
+        "run_config": cell.run_config,
+        "timeout": cell.timeout,
+        "repetitions": cell.repetitions,
+        "warmup": cell.warmup,
+        "ci_tolerance": cell.ci_tolerance,
+    }
+    return make_key(material), material
+
+
+def execute_cell(
+    cell: Cell,
+    tools: Dict[str, Tool],
+    stack: ExitStack,
+    cache: Optional[ResultCache] = None,
+    resume: bool = False,
+) -> Result:
+    """
+    Execute a cell, with the session of its tool, looking up and storing its
+    result in the cache.
+
+    :param cell: the cell.
+    :param tools: the open tool sessions, by tool; a session is opened on
+      stack the first time a tool is needed.
+    :param stack: the stack closing the sessions.
+    :param cache: where to store the results; results with status ERROR are
+      never cached, so that they are retried.
+    :param resume: whether to reuse the result already cached, if any.
+    :return: the result.
+    """
+    if cache is not None:
+        key, material = get_cache_entry(cell)
+        result = cache.get(key) if resume else None
+        if result is not None:
+            logging.info(
+                f"Using cached result for dataset {cell.name}, "
+                f"query {cell.query}, tool {cell.tool}: {key}"
+            )
+            result.name = cell.name
+            return result
+    if cell.tool not in tools:
+        tools[cell.tool] = stack.enter_context(
+            tool_registry.session(cell.tool, **cell.tool_config)
+        )
+    result = run_cell(cell, tools[cell.tool])
+    if cache is not None and result.status != Status.ERROR:
+        cache.put(key, result, material)
+    return result
+
+
+def run_job(job: Job) -> List[Tuple[Cell, Result]]:
+    """
+    Run the chains of a job.
+
+    A session is opened for each tool the first time it is needed, and it is
+    kept open until the end of the job, e.g. the same Vadalog server serves
+    all the runs.
+
+    If the job has a cache, the results are stored there; if resume is also
+    set, cells whose result is already cached are not executed. Results with
+    status ERROR are never cached, so that they are retried.
+    """
+    results = []
+    with ExitStack() as stack:
+        tools: Dict[str, Tool] = {}
+        for chain in job.chains:
+            for cell in chain:
+                result = execute_cell(cell, tools, stack, job.cache, job.resume)
+                results.append((cell, result))
+                if job.stop_on_timeout and result.status in {
+                    Status.ERROR,
+                    Status.TIMEOUT,
+                }:
+                    logging.info(f"Stop on timeout, status={result.status}")
+                    break
+    return results
+
+
+def make_jobs(
+    cells: Sequence[Cell],
+    stop_on_timeout: bool,
+    cache: Optional[ResultCache] = None,
+    resume: bool = False,
+) -> List[Job]:
+    """
+    Group the cells into jobs.
+
+    When stop_on_timeout is set, the cells of each (query, tool) pair form a
+    chain, so that larger sizes are skipped after a failure; otherwise every
+    cell is a chain on its own. Tools that cannot run concurrently (e.g. they
+    share a server) get all their chains in a single job.
+
+    :param cells: the cells, in the order they would be executed serially.
+    :param stop_on_timeout: whether to stop a (query, tool) chain on failure.
+    :param cache: the result cache, if any.
+    :param resume: whether to reuse the cached results.
+    :return: the list of jobs.
+    """
+    chains: Dict[Tuple[str, str], List[Cell]] = {}
+    ordered_chains: List[List[Cell]] = []
+    for cell in cells:
+        if stop_on_timeout:
+            key = (cell.query, cell.tool)
+            if key not in chains:
+                chains[key] = []
+                ordered_chains.append(chains[key])
+            chains[key].append(cell)
+        else:
+            ordered_chains.append([cell])
+
+    jobs: List[Job] = []
+    exclusive_jobs: Dict[str, Job] = {}
+    for chain in ordered_chains:
+        tool = chain[0].tool
+        if tool_registry.get_spec(tool).tool_cls.CONCURRENT:
+            jobs.append(Job([chain], stop_on_timeout, cache, resume))
+        elif tool in exclusive_jobs:
+            exclusive_jobs[tool].chains.append(chain)
+        else:
+            exclusive_jobs[tool] = Job([chain], stop_on_timeout, cache, resume)
+            jobs.append(exclusive_jobs[tool])
+    return jobs
+
+
+def split_cpus(nb_jobs: int, cpus_per_job: Optional[int] = None) -> List[Set[int]]:
+    """
+    Partition the CPUs available to this process into disjoint sets.
+
+    :param nb_jobs: the number of concurrent jobs.
+    :param cpus_per_job: the number of CPUs assigned to each job;
+      if None, the available CPUs are evenly split.
+    :return: one CPU set per concurrent job.
+    """
+    available = sorted(os.sched_getaffinity(0))
+    if cpus_per_job is None:
+        cpus_per_job = len(available) // nb_jobs
+    if cpus_per_job < 1 or cpus_per_job * nb_jobs > len(available):
+        raise ValueError(
+            f"cannot pin {nb_jobs} jobs with {cpus_per_job} CPUs each "
+            f"on {len(available)} available CPUs"
+        )
+    return [
+        set(available[i * cpus_per_job : (i + 1) * cpus_per_job])
+        for i in range(nb_jobs)
+    ]
+
+
+def _init_worker(cpu_queue, log_file: Optional[str]) -> None:
+    """Initialize a worker process: pin it to a CPU set and set up logging."""
+    cpus = cpu_queue.get()
+    os.sched_setaffinity(0, cpus)
+    configure_logging(log_file)
+    logging.info(f"Worker {os.getpid()} pinned to CPUs {sorted(cpus)}")
+
+
+def schedule(
+    jobs: List[Job],
+    nb_workers: int = 1,
+    cpus_per_job: Optional[int] = None,
+    log_file: Optional[str] = None,
+) -> Iterator[Tuple[Cell, Result]]:
+    """
+    Execute the jobs and yield the results as soon as they are available.
+
+    With one worker, jobs run in the current process, in order. Otherwise, they
+    are dispatched to a pool of worker processes, each one pinned to its own CPU
+    set; the engines spawned by a worker inherit its affinity.
+
+    :param jobs: the jobs to execute.
+    :param nb_workers: the number of worker processes.
+    :param cpus_per_job: the number of CPUs reserved to each worker.
+    :param log_file: the log file for the worker processes.
+    :return: an iterator over pairs (cell, result).
+    """
+    if nb_workers <= 1:
+        for job in jobs:
+            yield from run_job(job)
+        return
+
+    cpu_sets = split_cpus(nb_workers, cpus_per_job)
+    context = multiprocessing.get_context("fork")
+    cpu_queue = context.Queue()
+    for cpu_set in cpu_sets:
+        cpu_queue.put(cpu_set)
+    with ProcessPoolExecutor(
+        max_workers=nb_workers,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(cpu_queue, log_file),
+    ) as executor:
+        futures = [executor.submit(run_job, job) for job in jobs]
+        try:
+            for future in as_completed(futures):
+                yield from future.result()
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
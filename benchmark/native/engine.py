@@ -0,0 +1,435 @@
+import csv
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from operator import itemgetter
+from pathlib import Path
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from benchmark.datalog.ast import Atom, Constant, Program, Rule, Term, Variable
+
+Fact = Tuple[int, ...]
+Row = Tuple[int, ...]
+
+
+def _make_getter(sources: Sequence[Tuple[bool, int]]) -> Callable[[tuple], tuple]:
+    """
+    Make a function that builds a tuple from the values of another one.
+
+    :param sources: for each value of the result, a pair (True, index) to
+      take the value at that index, or (False, value) for a fixed value.
+    :return: the function.
+    """
+    if all(from_input for from_input, _ in sources):
+        indexes = [index for _, index in sources]
+        if len(indexes) == 0:
+            return lambda _: ()
+        if len(indexes) == 1:
+            index = indexes[0]
+            return lambda values: (values[index],)
+        return itemgetter(*indexes)
+    return lambda values: tuple(
+        values[source] if from_input else source for from_input, source in sources
+    )
+
+
+class Relation:
+    """
+    The facts of a predicate, with hash indexes on sets of positions.
+
+    Indexes are built on first use, and then kept up to date.
+    """
+
+    __slots__ = ("facts", "_indexes")
+
+    def __init__(self) -> None:
+        self.facts: Set[Fact] = set()
+        self._indexes: Dict[Tuple[int, ...], Tuple[Callable, Dict]] = {}
+
+    def __len__(self) -> int:
+        return len(self.facts)
+
+    def add_all(self, facts: Iterable[Fact]) -> List[Fact]:
+        """
+        Add facts to the relation.
+
+        :param facts: the facts.
+        :return: the facts that were not already in the relation.
+        """
+        new_facts = []
+        for fact in facts:
+            if fact not in self.facts:
+                self.facts.add(fact)
+                new_facts.append(fact)
+        for key, index in self._indexes.values():
+            for fact in new_facts:
+                index.setdefault(key(fact), []).append(fact)
+        return new_facts
+
+    def get_index(self, positions: Tuple[int, ...]) -> Dict[tuple, List[Fact]]:
+        """
+        Get the index on some positions.
+
+        :param positions: the positions, sorted.
+        :return: a dictionary from the values at those positions to the facts.
+        """
+        if positions not in self._indexes:
+            key = _make_getter([(True, position) for position in positions])
+            index: Dict[tuple, List[Fact]] = {}
+            for fact in self.facts:
+                index.setdefault(key(fact), []).append(fact)
+            self._indexes[positions] = (key, index)
+        return self._indexes[positions][1]
+
+
+@dataclass
+class _JoinStep:
+    """Join the current rows with the facts of an atom."""
+
+    predicate: str
+    # positions of the atom bound by a constant or by a variable of the row
+    key_positions: Tuple[int, ...]
+    # builds the index key from a row
+    key: Callable[[Row], tuple]
+    # values of the new variables, from a fact
+    extract: Callable[[Fact], tuple]
+    # pairs of positions of the atom with the same new variable
+    equalities: Tuple[Tuple[int, int], ...]
+    has_new_variables: bool
+
+
+@dataclass
+class _RulePlan:
+    """How to evaluate a rule when the facts of one body atom are new."""
+
+    rule: Rule
+    delta_predicate: str
+    # filter and variable values of the facts of the delta atom
+    delta_filter: Optional[Callable[[Fact], bool]]
+    delta_extract: Callable[[Fact], Row]
+    steps: List[_JoinStep]
+    # builds the head fact from a row; existential positions are set later
+    head: Callable[[Row], Fact]
+    # existential positions of the head, with the index of their variable
+    existential_positions: Tuple[Tuple[int, int], ...]
+    nb_existentials: int
+    # positions of the head that are not existential
+    frontier_positions: Tuple[int, ...]
+    # whether any fact with the same frontier values satisfies the head,
+    # i.e. each existential variable occurs once in the head
+    check_existing: bool
+
+
+@dataclass
+class ChaseStatistics:
+    """Statistics of a chase."""
+
+    nb_facts_loaded: int = 0
+    nb_facts_derived: int = 0
+    nb_nulls: int = 0
+    nb_iterations: int = 0
+    nb_rule_applications: int = 0
+    time_reasoning: float = 0.0
+
+
+class Chase:
+    """
+    A semi-naive chase engine for existential rules.
+
+    Constants are interned as non-negative integers, and labelled nulls are
+    negative integers. At each iteration, every rule is evaluated once for
+    each body atom whose predicate has new facts, joining those new facts
+    with all the facts of the other atoms through hash indexes.
+
+    An existential rule is applied only if its head is not already
+    satisfied by a fact with the same values at the frontier positions
+    (restricted chase), so labelled nulls are invented only when needed.
+    """
+
+    def __init__(self, program: Program) -> None:
+        """
+        Initialize the engine.
+
+        :param program: the program; its facts are loaded immediately.
+        :raises ValueError: if a rule has conditions, e.g. X > 3, which are
+          not evaluated.
+        """
+        for rule in program.rules:
+            if rule.conditions:
+                raise ValueError(f"conditions are not supported: {rule}")
+        self.program = program
+        self.statistics = ChaseStatistics()
+        self._symbols: List[str] = []
+        self._symbol_ids: Dict[str, int] = {}
+        self._relations: Dict[str, Relation] = defaultdict(Relation)
+        self._delta: Dict[str, List[Fact]] = defaultdict(list)
+        self._nb_nulls = 0
+        self._plans = [
+            self._compile(rule, position)
+            for rule in program.rules
+            for position in range(len(rule.body))
+        ]
+        for fact in program.facts:
+            self.load(fact.predicate, [[term.value for term in fact.terms]])
+
+    def intern(self, symbol: str) -> int:
+        """Get the id of a constant."""
+        symbol_id = self._symbol_ids.get(symbol)
+        if symbol_id is None:
+            symbol_id = self._symbol_ids[symbol] = len(self._symbols)
+            self._symbols.append(symbol)
+        return symbol_id
+
+    def load(self, predicate: str, rows: Iterable[Sequence[str]]) -> int:
+        """
+        Load facts into the database.
+
+        :param predicate: the predicate.
+        :param rows: the values of the facts.
+        :return: the number of new facts.
+        """
+        intern = self.intern
+        facts = (tuple(map(intern, row)) for row in rows)
+        new_facts = self._relations[predicate].add_all(facts)
+        self._delta[predicate] += new_facts
+        self.statistics.nb_facts_loaded += len(new_facts)
+        return len(new_facts)
+
+    def load_csv(self, path: Path, predicate: Optional[str] = None) -> int:
+        """
+        Load facts from a CSV file, e.g. a dataset file for Vadalog.
+
+        :param path: the file; empty lines are skipped.
+        :param predicate: the predicate; by default, the name of the file
+          without extension.
+        :return: the number of new facts.
+        """
+        predicate = predicate if predicate is not None else Path(path).stem
+        with open(path, newline="", encoding="utf-8") as f:
+            return self.load(predicate, filter(None, csv.reader(f)))
+
+    def run(self) -> ChaseStatistics:
+        """
+        Apply the rules until a fixpoint is reached.
+
+        :return: the statistics of the chase.
+        """
+        start = time.perf_counter()
+        while self._delta:
+            self.statistics.nb_iterations += 1
+            delta, self._delta = self._delta, defaultdict(list)
+            derived: Dict[str, List[Fact]] = defaultdict(list)
+            satisfied: Dict[int, Set[tuple]] = defaultdict(set)
+            for plan_id, plan in enumerate(self._plans):
+                delta_facts = delta.get(plan.delta_predicate)
+                if not delta_facts:
+                    continue
+                self.statistics.nb_rule_applications += 1
+                derived[plan.rule.head.predicate] += self._apply(
+                    plan, delta_facts, satisfied[id(plan.rule)]
+                )
+            for predicate, facts in derived.items():
+                new_facts = self._relations[predicate].add_all(facts)
+                if new_facts:
+                    self._delta[predicate] = new_facts
+                    self.statistics.nb_facts_derived += len(new_facts)
+        self.statistics.nb_nulls = self._nb_nulls
+        self.statistics.time_reasoning += time.perf_counter() - start
+        return self.statistics
+
+    def answers(
+        self, predicate: str, positions: Optional[Tuple[int, ...]] = None
+    ) -> Iterator[Tuple[str, ...]]:
+        """
+        Get the certain answers of a predicate.
+
+        :param predicate: the predicate.
+        :param positions: the positions to project on; by default, all.
+        :return: the distinct projected facts without labelled nulls.
+        """
+        facts = self._relations[predicate].facts
+        if positions is not None:
+            project = _make_getter([(True, position) for position in positions])
+            facts = set(map(project, facts))
+        symbols = self._symbols
+        for fact in facts:
+            if all(value >= 0 for value in fact):
+                yield tuple(symbols[value] for value in fact)
+
+    def _apply(
+        self, plan: _RulePlan, delta_facts: List[Fact], satisfied: Set[tuple]
+    ) -> List[Fact]:
+        """Evaluate a rule plan on the new facts of its delta atom."""
+        if plan.delta_filter is not None:
+            delta_facts = filter(plan.delta_filter, delta_facts)
+        rows = list(map(plan.delta_extract, delta_facts))
+        for step in plan.steps:
+            if not rows:
+                return []
+            rows = self._join(rows, step)
+        if not plan.nb_existentials:
+            return list(map(plan.head, rows))
+        return self._apply_existential(plan, rows, satisfied)
+
+    def _join(self, rows: List[Row], step: _JoinStep) -> List[Row]:
+        relation = self._relations[step.predicate]
+        key = step.key
+        if not step.key_positions:
+            matches = lambda _: relation.facts  # noqa: E731
+        else:
+            index_get = relation.get_index(step.key_positions).get
+            matches = lambda row: index_get(key(row), ())  # noqa: E731
+        if not step.has_new_variables:
+            # semi-join: the atom only filters the rows
+            return [row for row in rows if matches(row)]
+        extract = step.extract
+        if step.equalities:
+            equalities = step.equalities
+            return [
+                row + extract(fact)
+                for row in rows
+                for fact in matches(row)
+                if all(fact[i] == fact[j] for i, j in equalities)
+            ]
+        return [row + extract(fact) for row in rows for fact in matches(row)]
+
+    def _apply_existential(
+        self, plan: _RulePlan, rows: List[Row], satisfied: Set[tuple]
+    ) -> List[Fact]:
+        """Apply an existential rule, inventing labelled nulls where needed."""
+        existing: Dict[tuple, List[Fact]] = {}
+        if plan.check_existing:
+            head_relation = self._relations[plan.rule.head.predicate]
+            existing = head_relation.get_index(plan.frontier_positions)
+        frontier = _make_getter([(True, p) for p in plan.frontier_positions])
+        facts = []
+        for row in rows:
+            fact = plan.head(row)
+            frontier_values = frontier(fact)
+            if frontier_values in existing or frontier_values in satisfied:
+                continue
+            satisfied.add(frontier_values)
+            values = list(fact)
+            nulls: Dict[int, int] = {}
+            for position, variable_index in plan.existential_positions:
+                if variable_index not in nulls:
+                    self._nb_nulls += 1
+                    nulls[variable_index] = -self._nb_nulls
+                values[position] = nulls[variable_index]
+            facts.append(tuple(values))
+        return facts
+
+    def _compile(self, rule: Rule, delta_position: int) -> _RulePlan:
+        """Compile the evaluation of a rule, starting from one body atom."""
+        layout: Dict[Variable, int] = {}
+
+        delta_atom = rule.body[delta_position]
+        delta_filter, delta_extract = self._compile_first_atom(delta_atom, layout)
+
+        remaining = [atom for i, atom in enumerate(rule.body) if i != delta_position]
+        steps = []
+        while remaining:
+            # greedily join the atom with the most bound positions
+            atom = max(remaining, key=lambda a: _nb_bound_positions(a, layout))
+            remaining.remove(atom)
+            steps.append(self._compile_step(atom, layout))
+
+        existential_variables = rule.existential_variables
+        head_sources = []
+        existential_positions = []
+        for position, term in enumerate(rule.head.terms):
+            if term in existential_variables:
+                existential_positions.append(
+                    (position, existential_variables.index(term))
+                )
+                head_sources.append((False, -1))
+            else:
+                head_sources.append(self._source(term, layout))
+        frontier_positions = tuple(
+            position
+            for position in range(rule.head.arity)
+            if position not in dict(existential_positions)
+        )
+        return _RulePlan(
+            rule=rule,
+            delta_predicate=delta_atom.predicate,
+            delta_filter=delta_filter,
+            delta_extract=delta_extract,
+            steps=steps,
+            head=_make_getter(head_sources),
+            existential_positions=tuple(existential_positions),
+            nb_existentials=len(existential_variables),
+            frontier_positions=frontier_positions,
+            check_existing=len(existential_positions) == len(existential_variables),
+        )
+
+    def _source(self, term: Term, layout: Dict[Variable, int]) -> Tuple[bool, int]:
+        if isinstance(term, Constant):
+            return False, self.intern(term.value)
+        return True, layout[term]
+
+    def _compile_first_atom(
+        self, atom: Atom, layout: Dict[Variable, int]
+    ) -> Tuple[Optional[Callable[[Fact], bool]], Callable[[Fact], Row]]:
+        """Compile the atom the evaluation starts from; it sets the row layout."""
+        constants: List[Tuple[int, int]] = []
+        first_positions: Dict[Variable, int] = {}
+        equalities: List[Tuple[int, int]] = []
+        for position, term in enumerate(atom.terms):
+            if isinstance(term, Constant):
+                constants.append((position, self.intern(term.value)))
+            elif term in first_positions:
+                equalities.append((first_positions[term], position))
+            else:
+                first_positions[term] = position
+                layout[term] = len(layout)
+
+        def matches(fact: Fact) -> bool:
+            return all(fact[i] == value for i, value in constants) and all(
+                fact[i] == fact[j] for i, j in equalities
+            )
+
+        delta_filter = matches if constants or equalities else None
+        extract = _make_getter([(True, p) for p in first_positions.values()])
+        return delta_filter, extract
+
+    def _compile_step(self, atom: Atom, layout: Dict[Variable, int]) -> _JoinStep:
+        """Compile the join with an atom; the new variables are added to the layout."""
+        key_positions = []
+        key_sources = []
+        new_positions: Dict[Variable, int] = {}
+        equalities = []
+        for position, term in enumerate(atom.terms):
+            if isinstance(term, Constant) or term in layout:
+                key_positions.append(position)
+                key_sources.append(self._source(term, layout))
+            elif term in new_positions:
+                equalities.append((new_positions[term], position))
+            else:
+                new_positions[term] = position
+        for variable in new_positions:
+            layout[variable] = len(layout)
+        return _JoinStep(
+            predicate=atom.predicate,
+            key_positions=tuple(key_positions),
+            key=_make_getter(key_sources),
+            extract=_make_getter([(True, p) for p in new_positions.values()]),
+            equalities=tuple(equalities),
+            has_new_variables=bool(new_positions),
+        )
+
+
+def _nb_bound_positions(atom: Atom, layout: Dict[Variable, int]) -> int:
+    return sum(
+        1 for term in atom.terms if isinstance(term, Constant) or term in layout
+    )
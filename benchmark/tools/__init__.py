@@ -1,5 +1,6 @@
 from benchmark.tools.core import ToolID, ToolRegistry
 from benchmark.tools.dlv import DLV_WRAPPER_PATH, DlvTool
+from benchmark.tools.native import NATIVE_WRAPPER_PATH, NativeTool
 from benchmark.tools.vadalog import VADALOG_WRAPPER_PATH, VadalogTool
 
 tool_registry = ToolRegistry()
@@ -14,3 +15,8 @@ tool_registry.register(
     tool_cls=DlvTool,
     binary_path=DLV_WRAPPER_PATH,
 )
+tool_registry.register(
+    ToolID.NATIVE,
+    tool_cls=NativeTool,
+    binary_path=NATIVE_WRAPPER_PATH,
+)
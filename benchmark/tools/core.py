@@ -1,23 +1,44 @@
+import codecs
 import logging
 import os
 import signal
 import subprocess
+import threading
 import time
 from abc import ABC, abstractmethod
-from contextlib import suppress
-from dataclasses import dataclass
+from contextlib import ExitStack, contextmanager, suppress
+from dataclasses import dataclass, field, replace
 from enum import Enum
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Type, Union
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+)
 
 from benchmark.utils.base import ensure_dict
+from benchmark.utils.resources import (
+    ResourceMonitor,
+    ResourceUsage,
+    save_memory_trace,
+)
+from benchmark.utils.stats import summarize
 
 SHUTDOWN_TIMEOUT = 10.0
+CHUNK_SIZE = 1 << 16
 
 
 class ToolID(Enum):
     VADALOG = "vadalog"
     DLV = "dlv"
+    NATIVE = "native"
 
 
 class Status(Enum):
@@ -27,6 +48,59 @@ class Status(Enum):
     ERROR = "error"
 
 
+RESOURCE_FIELDS = (
+    "peak_rss",
+    "cpu_user",
+    "cpu_sys",
+    "ctx_switches",
+    "io_read_bytes",
+    "io_write_bytes",
+)
+# summary of the end-to-end time over repeated trials; the mean is time_end2end
+SUMMARY_FIELDS = (
+    "time_median",
+    "time_stddev",
+    "time_min",
+    "time_ci_low",
+    "time_ci_high",
+)
+FLOAT_FIELDS = {
+    "time_end2end",
+    *SUMMARY_FIELDS,
+    "time_reasoning",
+    "time_query",
+    "time_overhead",
+    "time_engine",
+    "time_wrapper",
+    "cpu_user",
+    "cpu_sys",
+}
+# the columns of the result files, in order; the command is always the last one
+COLUMNS = (
+    "name",
+    "status",
+    "time_end2end",
+    "nb_atoms",
+    "nb_trials",
+    *SUMMARY_FIELDS,
+    "time_reasoning",
+    "time_query",
+    "time_overhead",
+    "time_engine",
+    "time_wrapper",
+    *RESOURCE_FIELDS,
+    "command",
+)
+# the statistic, printed by the wrappers, of the time spent running the engine
+ENGINE_TIME_KEY = "engine_time"
+STATS_TSV_FILENAME = "stats.tsv"
+TRIALS_TSV_FILENAME = "trials.tsv"
+
+
+def _format_float(value: Optional[float]) -> str:
+    return f"{value:10.6f}" if value is not None else "None"
+
+
 @dataclass()  # frozen=True
 class Result:
     name: Optional[str] = None
@@ -34,43 +108,85 @@ class Result:
     time_end2end: Optional[float] = None
     status: Optional[Status] = None
     nb_atoms: Optional[int] = None
+    # number of measured trials and summary of their end-to-end times
+    nb_trials: Optional[int] = None
+    time_median: Optional[float] = None
+    time_stddev: Optional[float] = None
+    time_min: Optional[float] = None
+    time_ci_low: Optional[float] = None
+    time_ci_high: Optional[float] = None
+    # breakdown of the end-to-end time, when reported by the engine:
+    # reasoning (e.g. the chase), query answering, and the rest
+    # (wrapper, process startup, parsing of the output, ...)
+    time_reasoning: Optional[float] = None
+    time_query: Optional[float] = None
+    time_overhead: Optional[float] = None
+    # another breakdown of the end-to-end time: the engine (the engine process,
+    # or the request to the server) and the wrapper around it (interpreter
+    # startup, imports, copies, ...), zero when the engine is launched directly
+    time_engine: Optional[float] = None
+    time_wrapper: Optional[float] = None
+    # resources used by the whole process tree; memory and I/O in bytes
+    peak_rss: Optional[int] = None
+    cpu_user: Optional[float] = None
+    cpu_sys: Optional[float] = None
+    ctx_switches: Optional[int] = None
+    io_read_bytes: Optional[int] = None
+    io_write_bytes: Optional[int] = None
+    # all the numeric statistics reported by the engine
+    stats: Dict[str, Union[int, float]] = field(default_factory=dict)
+    # the results of the single trials, if the run has been repeated
+    trials: List["Result"] = field(default_factory=list, repr=False)
 
     @staticmethod
     def headers() -> str:
-        return "name\t" "status\t" "time_end2end\t" "nb_atoms\t" "command"
+        return "\t".join(COLUMNS)
+
+    def _get_value(self, column: str) -> Any:
+        if column == "status":
+            return self.status.value
+        if column == "command":
+            return " ".join(map(str, self.command))
+        return getattr(self, column)
 
     def json(self) -> Dict[str, Any]:
         """To json."""
-        return dict(
-            name=self.name,
-            status=self.status.value,
-            time_end2end=self.time_end2end,
-            nb_atoms=self.nb_atoms,
-            command=" ".join(self.command),
-        )
+        result = {column: self._get_value(column) for column in COLUMNS}
+        result["stats"] = self.stats
+        result["trials"] = [trial.json() for trial in self.trials]
+        return result
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "Result":
+        """From json, as returned by json()."""
+        kwargs = {column: data.get(column) for column in COLUMNS}
+        kwargs["status"] = Status(data["status"])
+        kwargs["command"] = data["command"].split(" ")
+        kwargs["stats"] = data.get("stats", {})
+        kwargs["trials"] = list(map(cls.from_json, data.get("trials", [])))
+        return cls(**kwargs)
+
+    def set_resource_usage(self, usage: ResourceUsage) -> None:
+        """Set the resource usage fields."""
+        for field_name in RESOURCE_FIELDS:
+            setattr(self, field_name, getattr(usage, field_name))
 
     def __str__(self):
         """To string."""
-        time_end2end_str = (
-            f"{self.time_end2end:10.6f}" if self.time_end2end is not None else "None"
-        )
-        return (
-            f"{self.name}\t"
-            f"{self.status.value}\t"
-            f"{time_end2end_str}\t"
-            f"{self.nb_atoms}\t"
-            f"{' '.join(map(str, self.command))}"
+        return "\t".join(
+            _format_float(self._get_value(column))
+            if column in FLOAT_FIELDS
+            else str(self._get_value(column))
+            for column in COLUMNS
         )
 
     def to_rows(self) -> str:
         """Print results by rows."""
-        return (
-            f"name={self.name}\n"
-            f"status={self.status}\n"
-            f"time_end2end={self.time_end2end}\n"
-            f"nb_atoms={self.nb_atoms}\n"
-            f"command={' '.join(map(str, self.command))}"
-        )
+        rows = []
+        for column in COLUMNS:
+            value = self.status if column == "status" else self._get_value(column)
+            rows.append(f"{column}={value}")
+        return "\n".join(rows)
 
 
 def save_data(data: List[Result], output: Path) -> None:
@@ -82,36 +198,232 @@ def save_data(data: List[Result], output: Path) -> None:
     output.write_text(content)
 
 
-def run_tool(args, cwd, timeout):
+def save_stats(data: List[Result], output: Path) -> None:
+    """Save the statistics reported by the engine, one column per statistic."""
+    keys: Dict[str, None] = {}
+    for result in data:
+        keys.update(dict.fromkeys(result.stats))
+    content = "\t".join(["name", *keys]) + "\n"
+    for result in data:
+        values = [str(result.stats.get(key)) for key in keys]
+        content += "\t".join([str(result.name), *values]) + "\n"
+    output.write_text(content)
+
+
+def save_trials(data: List[Result], output: Path) -> None:
+    """Save the results of every trial, numbered from 1 for each run."""
+    content = "trial\t" + Result.headers() + "\n"
+    for result in data:
+        for index, trial in enumerate(result.trials, start=1):
+            content += f"{index}\t{trial}\n"
+    output.write_text(content)
+
+
+# fields averaged over the trials of a run, besides the end-to-end time
+AVERAGED_FIELDS = (
+    "time_reasoning",
+    "time_query",
+    "time_overhead",
+    "time_engine",
+    "time_wrapper",
+    "cpu_user",
+    "cpu_sys",
+)
+
+
+def _set_mean(result: Result, trials: List[Result], field_name: str) -> None:
+    """Set a field of the result to its mean over the trials, if always set."""
+    values = [getattr(trial, field_name) for trial in trials]
+    if None not in values:
+        setattr(result, field_name, sum(values) / len(values))
+
+
+def aggregate_trials(trials: List[Result]) -> Result:
+    """
+    Aggregate the results of repeated trials of the same run.
+
+    If all the trials succeeded, time_end2end is the mean of their end-to-end
+    times, and the summary fields describe their distribution; the other times
+    and the CPU usage are averaged too, while the peak memory is the maximum.
+    Otherwise, the result is the one of the first unsuccessful trial.
+
+    :param trials: the results of the trials, in order; not empty.
+    :return: the aggregated result, holding the trials.
+    """
+    failed = [trial for trial in trials if trial.status != Status.SUCCESS]
+    result = replace(failed[0] if failed else trials[-1], trials=list(trials))
+    result.nb_trials = len(trials)
+    if failed:
+        return result
+
+    summary = summarize([trial.time_end2end for trial in trials])
+    result.time_end2end = summary.mean
+    result.time_median = summary.median
+    result.time_stddev = summary.stddev
+    result.time_min = summary.min
+    result.time_ci_low = summary.ci_low
+    result.time_ci_high = summary.ci_high
+    for field_name in AVERAGED_FIELDS:
+        _set_mean(result, trials, field_name)
+    peak_rss_values = [trial.peak_rss for trial in trials if trial.peak_rss is not None]
+    if peak_rss_values:
+        result.peak_rss = max(peak_rss_values)
+    return result
+
+
+class OutputParser(ABC):
+    """Incremental parser of the output of a tool."""
+
+    @abstractmethod
+    def feed(self, data: str) -> None:
+        """
+        Process a chunk of the output.
+
+        :param data: the next chunk of the output.
+        """
+
+    @abstractmethod
+    def result(self) -> Result:
+        """
+        Get the statistics collected so far; to be called at the end of the output.
+
+        :return: statistics
+        """
+
+
+class LineOutputParser(OutputParser, ABC):
+    """Incremental parser that processes the output line by line."""
+
+    def __init__(self) -> None:
+        """Initialize the parser."""
+        self._partial_line = ""
+
+    def feed(self, data: str) -> None:
+        lines = (self._partial_line + data).split("\n")
+        self._partial_line = lines.pop()
+        for line in lines:
+            self.feed_line(line)
+
+    def result(self) -> Result:
+        if self._partial_line:
+            self.feed_line(self._partial_line)
+            self._partial_line = ""
+        return self.get_result()
+
+    @abstractmethod
+    def feed_line(self, line: str) -> None:
+        """
+        Process a line of the output.
+
+        :param line: the line, without the line terminator.
+        """
+
+    @abstractmethod
+    def get_result(self) -> Result:
+        """Get the statistics collected from the processed lines."""
+
+
+def _pump(
+    source: IO[bytes], sink: IO[bytes], on_output: Optional[Callable[[bytes], None]]
+) -> None:
+    """Copy the source stream to the sink, chunk by chunk."""
+    for chunk in iter(lambda: source.read1(CHUNK_SIZE), b""):
+        sink.write(chunk)
+        if on_output is not None:
+            on_output(chunk)
+
+
+class _Waiter(threading.Thread):
+    """Wait for a process to exit, collecting its resource usage."""
+
+    def __init__(self, proc: subprocess.Popen) -> None:
+        super().__init__(daemon=True)
+        self.proc = proc
+        self.rusage = None
+
+    def run(self) -> None:
+        _pid, status, self.rusage = os.wait4(self.proc.pid, 0)
+        if os.WIFSIGNALED(status):
+            self.proc.returncode = -os.WTERMSIG(status)
+        else:
+            self.proc.returncode = os.WEXITSTATUS(status)
+
+
+def _terminate_process_group(proc: subprocess.Popen, waiter: _Waiter) -> None:
+    """Terminate the process group of the process, killing what does not exit."""
+    with suppress(ProcessLookupError):
+        os.killpg(proc.pid, signal.SIGTERM)
+    waiter.join(timeout=SHUTDOWN_TIMEOUT)
+    with suppress(ProcessLookupError):
+        os.killpg(proc.pid, signal.SIGKILL)
+    waiter.join()
+
+
+def run_tool(
+    args,
+    cwd,
+    timeout,
+    stdout_file: IO[bytes],
+    stderr_file: IO[bytes],
+    on_output: Optional[Callable[[bytes], None]] = None,
+    monitor: Optional[ResourceMonitor] = None,
+):
+    """
+    Run a tool, streaming its output to files.
+
+    The standard output is copied to stdout_file as it is produced, and each
+    chunk is passed to on_output; the standard error goes to stderr_file.
+    Hence, the memory used is constant in the size of the output.
+
+    :param args: the command line.
+    :param cwd: the current working directory.
+    :param timeout: the timeout in seconds.
+    :param stdout_file: the binary file where to write the standard output.
+    :param stderr_file: the binary file where to write the standard error.
+    :param on_output: a callback for each chunk of the standard output.
+    :param monitor: the resource monitor; by default, a non-sampling one.
+    :return: the return code, the elapsed time, whether the run timed out,
+      and the resources used.
+    """
+    monitor = monitor if monitor is not None else ResourceMonitor()
     start = time.perf_counter()
     timed_out = False
     proc = subprocess.Popen(
         args,
         stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
+        stderr=stderr_file,
         cwd=cwd,
         preexec_fn=os.setsid,
     )
-    stdout, stderr = b"", b""
+    monitor.start(proc.pid)
+    waiter = _Waiter(proc)
+    waiter.start()
+    reader = threading.Thread(
+        target=_pump, args=(proc.stdout, stdout_file, on_output), daemon=True
+    )
+    reader.start()
     try:
-        stdout, stderr = proc.communicate(timeout=timeout)
-        end = time.perf_counter()
-    except subprocess.TimeoutExpired:
-        end = time.perf_counter()
-        proc.terminate()
-        with suppress(subprocess.TimeoutExpired):
-            stdout, stderr = proc.communicate(timeout=SHUTDOWN_TIMEOUT)
-        if proc.poll() is None:
-            os.kill(proc.pid, signal.SIGKILL)
-            stdout, stderr = proc.communicate(timeout=timeout)
-        timed_out = True
+        waiter.join(timeout=timeout)
+        if waiter.is_alive():
+            end = time.perf_counter()
+            _terminate_process_group(proc, waiter)
+            timed_out = True
+        reader.join()
+        if not timed_out:
+            end = time.perf_counter()
+    finally:
+        proc.stdout.close()
+    usage = monitor.stop(waiter.rusage)
     total = end - start
-    return proc.returncode, stdout, stderr, total, timed_out
+    return proc.returncode, total, timed_out, usage
 
 
 class Tool(ABC):
     """Interface for tools."""
 
+    # whether several runs of the tool can be executed at the same time
+    CONCURRENT: bool = True
+
     def __init__(self, binary_path: str):
         """
         Initialize the tool.
@@ -119,12 +431,47 @@ class Tool(ABC):
         :param binary_path: the binary path
         """
         self._binary_path = binary_path
+        self._in_session = False
 
     @property
     def binary_path(self) -> str:
         """Get the binary path."""
         return self._binary_path
 
+    @property
+    def is_wrapped(self) -> bool:
+        """
+        Check whether a run goes through a wrapper, which then reports the
+        time of the engine; otherwise, the engine is launched directly.
+        """
+        return True
+
+    @property
+    def in_session(self) -> bool:
+        """Check whether a session is held open across runs."""
+        return self._in_session
+
+    @contextmanager
+    def session(self) -> Iterator["Tool"]:
+        """
+        Keep a session open across several runs.
+
+        Within the context, run() does not start and end a session for every
+        execution; instead, check_session() is called before each run.
+
+        :return: the tool itself.
+        """
+        if self._in_session:
+            yield self
+            return
+        self.start_session()
+        self._in_session = True
+        try:
+            yield self
+        finally:
+            self._in_session = False
+            self.end_session()
+
     def run(
         self,
         program: Path,
@@ -134,6 +481,7 @@ class Tool(ABC):
         cwd: Optional[str] = None,
         name: Optional[str] = None,
         working_dir: Optional[str] = None,
+        sampling_interval: Optional[float] = None,
     ) -> Result:
         """
         Apply the tool to a file.
@@ -145,29 +493,71 @@ class Tool(ABC):
         :param cwd: the current working directory
         :param name: the experiment name
         :param working_dir: the working dir
+        :param sampling_interval: if set, sample the memory of the process tree
+          every sampling_interval seconds, and save the trace in the working dir
         :return: the planning result
         """
         run_config = ensure_dict(run_config)
-        self.start_session()
+        if self._in_session:
+            self.check_session()
+        else:
+            self.start_session()
         args = self.get_cli_args(program, datasets, run_config, working_dir)
         print("Running command: ", " ".join(map(str, args)))
-        returncode, stdout, stderr, total, timed_out = run_tool(args, cwd, timeout)
-        self.end_session()
-
-        stdout = stdout.decode("utf-8")
-        stderr = stderr.decode("utf-8")
-
-        if working_dir is not None:
-            (Path(working_dir) / "stdout.txt").write_text(stdout)
-            (Path(working_dir) / "stderr.txt").write_text(stderr)
-
-        result = self.collect_statistics(stdout)
+        parser = self.get_output_parser()
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        with ExitStack() as stack:
+            stdout_file = stack.enter_context(
+                self._open_output_file(working_dir, "stdout.txt")
+            )
+            stderr_file = stack.enter_context(
+                self._open_output_file(working_dir, "stderr.txt")
+            )
+            monitor = ResourceMonitor(self.get_monitored_pids(), sampling_interval)
+            returncode, total, timed_out, usage = self.execute(
+                args,
+                program,
+                datasets,
+                run_config,
+                working_dir,
+                cwd,
+                timeout,
+                stdout_file,
+                stderr_file,
+                lambda chunk: parser.feed(decoder.decode(chunk)),
+                monitor,
+            )
+        parser.feed(decoder.decode(b"", final=True))
+        if not self._in_session:
+            self.end_session()
+        elif timed_out:
+            # the engine may still be busy with the interrupted run
+            self.end_session()
+            self.start_session()
+
+        result = parser.result()
         result.name = name
         result.command = args
+        result.set_resource_usage(usage)
+        if working_dir is not None and sampling_interval is not None:
+            save_memory_trace(usage.memory_trace, Path(working_dir) / "memory.tsv")
 
         # in case time end2end not set by the tool, set from command
         if result.time_end2end is None:
             result.time_end2end = total
+        if result.time_engine is None and not self.is_wrapped:
+            result.time_engine = total
+        if result.time_engine is not None:
+            result.time_wrapper = result.time_end2end - result.time_engine
+        if result.time_reasoning is not None or result.time_query is not None:
+            # the engine timers are not measured by the same clock as the
+            # end-to-end time, hence the overhead is clamped to zero
+            result.time_overhead = max(
+                result.time_end2end
+                - (result.time_reasoning or 0.0)
+                - (result.time_query or 0.0),
+                0.0,
+            )
 
         if timed_out:
             result.status = Status.TIMEOUT
@@ -176,7 +566,56 @@ class Tool(ABC):
 
         return result
 
+    def execute(
+        self,
+        args: List[str],
+        program: Path,
+        datasets: List[Path],
+        run_config: Dict,
+        working_dir: Optional[str],
+        cwd: Optional[str],
+        timeout: float,
+        stdout_file: IO[bytes],
+        stderr_file: IO[bytes],
+        on_output: Callable[[bytes], None],
+        monitor: ResourceMonitor,
+    ) -> Tuple[int, float, bool, ResourceUsage]:
+        """
+        Execute a run: by default, launch the command line of the wrapper.
+
+        :param args: the command line, from get_cli_args.
+        :param program: the program.
+        :param datasets: the datasets.
+        :param run_config: the configuration of the run.
+        :param working_dir: the working dir.
+        :param cwd: the current working directory.
+        :param timeout: the timeout in seconds.
+        :param stdout_file: the binary file where to write the output.
+        :param stderr_file: the binary file where to write the errors.
+        :param on_output: a callback for each chunk of the output.
+        :param monitor: the resource monitor, not started yet.
+        :return: the return code, the elapsed time, whether the run timed out,
+          and the resources used.
+        """
+        return run_tool(
+            args, cwd, timeout, stdout_file, stderr_file, on_output, monitor
+        )
+
+    @staticmethod
+    def _open_output_file(working_dir: Optional[str], filename: str) -> IO[bytes]:
+        """Open an output file in the working dir; if not set, discard the output."""
+        if working_dir is None:
+            return open(os.devnull, "wb")
+        return (Path(working_dir) / filename).open("wb")
+
     @abstractmethod
+    def get_output_parser(self) -> OutputParser:
+        """
+        Get a new incremental parser for the output of a run.
+
+        :return: the output parser.
+        """
+
     def collect_statistics(self, output: str) -> Result:
         """
         Collect statistics.
@@ -184,6 +623,9 @@ class Tool(ABC):
         :param output: the output from where to extract statistics.
         :return: statistics
         """
+        parser = self.get_output_parser()
+        parser.feed(output)
+        return parser.result()
 
     @abstractmethod
     def get_cli_args(
@@ -195,9 +637,33 @@ class Tool(ABC):
     ) -> List[str]:
         """Get CLI arguments."""
 
+    @classmethod
+    def get_engine_files(cls, binary_path: str) -> List[Path]:
+        """
+        Get the files that identify the engine, e.g. to detect a new version:
+        by default, the binary path only.
+
+        It is a class method, so that no tool (nor its client) is created only
+        to identify the engine.
+
+        :param binary_path: the binary path of the tool.
+        :return: the engine files.
+        """
+        return [Path(binary_path)]
+
+    def get_monitored_pids(self) -> List[int]:
+        """
+        Get the ids of the processes, outside the process tree of a run, whose
+        resources are accounted to the run (e.g. a server).
+        """
+        return []
+
     def start_session(self) -> None:
         """Start session."""
 
+    def check_session(self) -> None:
+        """Check the session is healthy between two runs, and recover if not."""
+
     def end_session(self) -> None:
         """End session."""
 
@@ -234,6 +700,17 @@ class ToolSpec:
         tool = self.tool_cls(**_kwargs)
         return tool
 
+    def get_engine_files(self, **kwargs: Any) -> List[Path]:
+        """
+        Get the files that identify the engine of the tool, without making it.
+
+        :param kwargs: the key word arguments
+        :return: the engine files
+        """
+        _kwargs = self.kwargs.copy()
+        _kwargs.update(kwargs)
+        return self.tool_cls.get_engine_files(str(_kwargs["binary_path"]))
+
 
 class ToolRegistry:
     """Tool registry."""
@@ -249,6 +726,18 @@ class ToolRegistry:
         tool_id = ToolID(tool_id)
         self._specs[tool_id] = ToolSpec(tool_id, tool_cls, **kwargs)
 
+    def get_spec(self, tool_id: Union[str, ToolID]) -> ToolSpec:
+        """
+        Get the specification of a tool.
+
+        :param tool_id: the tool ID
+        :return: the tool specification
+        """
+        tool_id = ToolID(tool_id)
+        if tool_id not in self._specs:
+            raise ValueError(f"tool id '{tool_id}' not configured")
+        return self._specs[tool_id]
+
     def make(self, tool_id: Union[str, ToolID], **kwargs) -> Tool:
         """
         Make the tool.
@@ -257,8 +746,17 @@ class ToolRegistry:
         :param kwargs: the overrides for keyword arguments
         :return: the tool instance
         """
-        tool_id = ToolID(tool_id)
-        if tool_id not in self._specs:
-            raise ValueError(f"tool id '{tool_id}' not configured")
-        tool_spec = self._specs[ToolID(tool_id)]
-        return tool_spec.make(**kwargs)
+        return self.get_spec(tool_id).make(**kwargs)
+
+    @contextmanager
+    def session(self, tool_id: Union[str, ToolID], **kwargs) -> Iterator[Tool]:
+        """
+        Make the tool and keep its session open for the duration of the context.
+
+        :param tool_id: the tool ID
+        :param kwargs: the overrides for keyword arguments
+        :return: the tool instance
+        """
+        tool = self.make(tool_id, **kwargs)
+        with tool.session():
+            yield tool
@@ -1,36 +1,199 @@
 import re
+import shutil
+import subprocess
+import tempfile
+from contextlib import ExitStack
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import IO, Callable, Dict, List, Optional, Sequence, Tuple, Union
 
 from benchmark import ROOT_DIR
-from benchmark.tools.core import Result, Status, Tool
+from benchmark.tools.core import (
+    ENGINE_TIME_KEY,
+    LineOutputParser,
+    Result,
+    Status,
+    Tool,
+    run_tool,
+)
+from benchmark.utils.resources import ResourceMonitor, ResourceUsage
+from benchmark.utils.streaming import (
+    FactPipes,
+    FactSource,
+    get_fifo_path,
+    get_sources,
+)
 
 DEFAULT_DLV_ROOT = ROOT_DIR / "third_party" / "TOCL_dlvEx"
 DLV_WRAPPER_PATH = ROOT_DIR / "bin" / "dlv-wrapper"
 DEFAULT_DLV_BINARY_PATH = DEFAULT_DLV_ROOT / "dlvExists"
+# DLV^E only loads the data files relevant to the query if the program is a
+# .rul file, hence the program is copied to the working dir with this name
+PROGRAM_FILENAME = "program.rul"
+DLV_OPTIONS = ("-cautious", "-stats++")
+
+
+STATS_END_MARKER = "for further information.)"
+QUERY_ANSWERING_MARKER = "Query Answering Time"
+STAT_REGEX = re.compile(r"^( *)([^:]*[^\s:]) *: *(-?[0-9]+(?:\.[0-9]+)?) *(?:s|sec)?$")
+ATOMS_GENERATED_REGEX = re.compile(
+    r"^([0-9]+) atoms generated \( *([0-9]+) in the last level\)\.$"
+)
+# the timers of DLV^E: the time for all answer sets covers the whole evaluation,
+# i.e. parsing, instantiation, model generation and query answering, and the
+# query answering time covers only the last phase, so the reasoning time is the
+# difference of the two
+QUERY_ANSWERING_KEY = "query_answering_time"
+ALL_ANSWER_SETS_KEY = "time_for_all_answer_sets"
+
+
+def to_stat_key(label: str) -> str:
+    """Normalize a statistic label, e.g. '|Residual Herbrand Univ.|' -> 'residual_herbrand_univ'."""
+    return re.sub("[^a-z0-9]+", "_", label.lower()).strip("_")
+
+
+def parse_stat_value(value: str) -> Union[int, float]:
+    return float(value) if "." in value else int(value)
+
+
+def get_dlv_command(program: Path, inputs: Sequence[Path]) -> List[str]:
+    """
+    Get the command line of DLV^E, answering the query of a program.
+
+    The paths are absolute, as DLV^E runs in the working dir, where the
+    profile (gmon.out) written by its instrumented binary is left.
+    """
+    paths = [Path(program), *map(Path, inputs)]
+    return [
+        str(DEFAULT_DLV_BINARY_PATH),
+        *(str(path.absolute()) for path in paths),
+        *DLV_OPTIONS,
+    ]
+
+
+class DlvStatistics:
+    """
+    Extractor of the statistics printed by DLV^E with -stats++.
+
+    Each line of the form 'Label : number' becomes a typed entry, keyed by the
+    normalized label. Indented lines refine the closest less indented one,
+    e.g. ' full grounding' under 'Rules (IDB)' becomes 'rules_idb.full_grounding'.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the extractor."""
+        self.stats: Dict[str, Union[int, float]] = {}
+        self._parents: List[Tuple[int, str]] = []
+
+    def feed_line(self, line: str) -> None:
+        """Extract the statistics from a line, if any."""
+        match = ATOMS_GENERATED_REGEX.match(line)
+        if match is not None:
+            self.stats["atoms_generated_total"] = int(match.group(1))
+            self.stats["atoms_generated_last_level"] = int(match.group(2))
+            return
+        match = STAT_REGEX.match(line)
+        if match is None:
+            return
+        indent, label, value = len(match.group(1)), match.group(2), match.group(3)
+        while self._parents and self._parents[-1][0] >= indent:
+            self._parents.pop()
+        key = to_stat_key(label)
+        if self._parents:
+            key = self._parents[-1][1] + "." + key
+        self._parents.append((indent, key))
+        self.stats[key] = parse_stat_value(value)
+
+
+class DlvOutputParser(LineOutputParser):
+    """
+    Incremental parser of the DLV^E output.
+
+    The answers are the lines between the end of the statistics block
+    (printed by -stats++) and the query answering time; the statistics of the
+    streamed facts, if any, follow.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the parser."""
+        super().__init__()
+        self._statistics = DlvStatistics()
+        self._in_answers = False
+        self._nb_answers = 0
+        self._answers_completed = False
+        self._query_answered = False
+
+    def feed_line(self, line: str) -> None:
+        if line.startswith(QUERY_ANSWERING_MARKER):
+            self._statistics.feed_line(line)
+            self._query_answered = True
+            if self._in_answers:
+                self._in_answers = False
+                self._answers_completed = True
+        elif self._in_answers:
+            if line:
+                self._nb_answers += 1
+        elif not self._answers_completed and line.endswith(STATS_END_MARKER):
+            self._in_answers = True
+        else:
+            # the statistics of DLV^E, and the ones the wrapper prints after them
+            self._statistics.feed_line(line)
+
+    def get_result(self) -> Result:
+        status = Status.SUCCESS if self._query_answered else Status.ERROR
+        nb_atoms = self._nb_answers if self._answers_completed else None
+        stats = self._statistics.stats
+        time_reasoning = stats.get(ALL_ANSWER_SETS_KEY)
+        time_query = stats.get(QUERY_ANSWERING_KEY)
+        if time_reasoning is not None and time_query is not None:
+            time_reasoning = max(time_reasoning - time_query, 0.0)
+        return Result(
+            status=status,
+            nb_atoms=nb_atoms,
+            time_reasoning=time_reasoning,
+            time_query=time_query,
+            time_engine=stats.get(ENGINE_TIME_KEY),
+            stats=stats,
+        )
 
 
 class DlvTool(Tool):
-    """Implement the DLV tool wrapper."""
+    """
+    Implement the DLV tool wrapper.
+
+    By default, the datasets are files of facts. With the run configuration
+    {"stream": true}, they are CSV files (e.g. the dataset files for Vadalog)
+    that the wrapper converts into facts on the fly, through named pipes;
+    with {"stream_store": <store dir>, "partition": <name>}, the facts are
+    streamed from a columnar store. "stream_workers" sets the number of
+    writer threads.
+
+    With direct=True, the tool launches DLV^E itself instead of the wrapper,
+    saving the startup of a Python interpreter for each run; the facts are
+    then streamed by this process.
+    """
 
     NAME = "DLV^E"
 
-    def collect_statistics(self, output: str) -> Result:
-        qa_time = re.search("Query Answering Time", output)
-        status = Status.SUCCESS if qa_time else Status.ERROR
+    def __init__(self, binary_path: str, direct: bool = False) -> None:
+        """
+        Initialize the tool.
 
-        result = re.search(
-            "for further information\.\)\n(.*)\nQuery Answering",
-            output,
-            re.DOTALL | re.MULTILINE,
-        )
-        if result is not None:
-            atoms_string = result.group(1)
-            atoms = atoms_string.splitlines()
-            nb_atoms = len(atoms)
-        else:
-            nb_atoms = None
-        return Result(status=status, nb_atoms=nb_atoms)
+        :param binary_path: the binary path
+        :param direct: launch DLV^E directly, rather than through the wrapper.
+        """
+        super().__init__(binary_path)
+        self.direct = direct
+
+    @property
+    def is_wrapped(self) -> bool:
+        return not self.direct
+
+    def get_output_parser(self) -> DlvOutputParser:
+        return DlvOutputParser()
+
+    @classmethod
+    def get_engine_files(cls, binary_path: str) -> List[Path]:
+        return [*super().get_engine_files(binary_path), DEFAULT_DLV_BINARY_PATH]
 
     def get_cli_args(
         self,
@@ -39,9 +202,109 @@ class DlvTool(Tool):
         run_config: Dict,
         working_dir: Optional[str] = None,
     ) -> List[str]:
+        if self.direct:
+            return self._get_direct_args(program, datasets, run_config, working_dir)
         args = [self.binary_path, "--program", program]
-        assert len(datasets) > 0
-        args += ["--dataset", *map(str, datasets)]
+        if run_config.get("stream_store") is not None:
+            args += ["--stream-store", str(run_config["stream_store"])]
+            args += ["--partition", run_config["partition"]]
+        else:
+            assert len(datasets) > 0
+        if datasets:
+            option = "--stream" if run_config.get("stream", False) else "--dataset"
+            args += [option, *map(str, datasets)]
+        if run_config.get("stream_workers") is not None:
+            args += ["--stream-workers", str(run_config["stream_workers"])]
         if working_dir is not None:
             args += ["--working-dir", str(Path(working_dir).absolute())]
         return args
+
+    def _get_sources(self, datasets: List[Path], run_config: Dict) -> List[FactSource]:
+        """Get the sources of the facts streamed to DLV^E, if any."""
+        return get_sources(
+            datasets if run_config.get("stream", False) else [],
+            run_config.get("stream_store"),
+            run_config.get("partition"),
+        )
+
+    def _get_direct_args(
+        self,
+        program: Path,
+        datasets: List[Path],
+        run_config: Dict,
+        working_dir: Optional[str],
+    ) -> List[str]:
+        """
+        Get the command of DLV^E on the copy of the program in the working dir;
+        without a working dir, execute rebuilds it for the temporary one it
+        creates.
+        """
+        sources = self._get_sources(datasets, run_config)
+        working_dir_path = Path(working_dir).absolute() if working_dir else Path()
+        inputs = [get_fifo_path(working_dir_path, source) for source in sources]
+        if not run_config.get("stream", False):
+            inputs = [*datasets, *inputs]
+        return get_dlv_command(working_dir_path / PROGRAM_FILENAME, inputs)
+
+    def execute(
+        self,
+        args: List[str],
+        program: Path,
+        datasets: List[Path],
+        run_config: Dict,
+        working_dir: Optional[str],
+        cwd: Optional[str],
+        timeout: float,
+        stdout_file: IO[bytes],
+        stderr_file: IO[bytes],
+        on_output: Callable[[bytes], None],
+        monitor: ResourceMonitor,
+    ) -> Tuple[int, float, bool, ResourceUsage]:
+        if not self.direct:
+            return super().execute(
+                args,
+                program,
+                datasets,
+                run_config,
+                working_dir,
+                cwd,
+                timeout,
+                stdout_file,
+                stderr_file,
+                on_output,
+                monitor,
+            )
+        sources = self._get_sources(datasets, run_config)
+        with ExitStack() as stack:
+            if working_dir is None:
+                # as the wrapper, so that DLV^E always runs on a .rul file; the
+                # args are updated in place, so that the result records them
+                working_dir = stack.enter_context(tempfile.TemporaryDirectory())
+                args[:] = self._get_direct_args(
+                    program, datasets, run_config, working_dir
+                )
+            shutil.copyfile(program, Path(working_dir) / PROGRAM_FILENAME)
+            pipes = None
+            if sources:
+                pipes = stack.enter_context(
+                    FactPipes(
+                        Path(working_dir), sources, run_config.get("stream_workers")
+                    )
+                )
+            # DLV^E prints its statistics on the standard error, and the parser
+            # reads them with the answers, as the wrapper merges the two
+            outcome = run_tool(
+                args,
+                working_dir,
+                timeout,
+                stdout_file,
+                subprocess.STDOUT,
+                on_output,
+                monitor,
+            )
+        if pipes is not None:
+            # the same statistics as the ones printed by the wrapper
+            data = "".join(line + "\n" for line in pipes.statistics.lines()).encode()
+            stdout_file.write(data)
+            on_output(data)
+        return outcome
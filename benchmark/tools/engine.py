@@ -3,7 +3,7 @@ from pathlib import Path
 from typing import Dict, List, Optional
 
 from benchmark.tools import tool_registry
-from benchmark.tools.core import Result
+from benchmark.tools.core import Result, Tool
 from benchmark.utils.base import ensure_dict, remove_dir_or_fail
 
 
@@ -17,14 +17,23 @@ def run_engine(
     run_config: Optional[Dict] = None,
     working_dir: Optional[str] = None,
     force: bool = False,
+    tool: Optional[Tool] = None,
+    sampling_interval: Optional[float] = None,
 ) -> Result:
+    """
+    Run an engine on a program and a set of datasets.
+
+    If a tool instance is provided (e.g. one whose session is kept open by
+    the caller), it is used instead of making a new one from tool_config.
+    """
     tool_config = ensure_dict(tool_config)
     run_config = ensure_dict(run_config)
     if working_dir is not None:
         remove_dir_or_fail(Path(working_dir), force)
         Path(working_dir).mkdir(parents=True)
 
-    tool = tool_registry.make(tool_id, **tool_config)
+    if tool is None:
+        tool = tool_registry.make(tool_id, **tool_config)
     logging.debug(f"name={name}")
     logging.debug(f"program={program}")
     logging.debug(f"datasets={datasets}")
@@ -33,6 +42,7 @@ def run_engine(
     logging.debug(f"tool_config={tool_config}")
     logging.debug(f"run_config={run_config}")
     logging.debug(f"working_dir={working_dir}")
+    logging.debug(f"sampling_interval={sampling_interval}")
 
     try:
         result = tool.run(
@@ -42,6 +52,7 @@ def run_engine(
             timeout=timeout,
             name=name,
             working_dir=working_dir,
+            sampling_interval=sampling_interval,
         )
         return result
     except KeyboardInterrupt:
@@ -0,0 +1,90 @@
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from benchmark import ROOT_DIR
+from benchmark.tools.core import (
+    ENGINE_TIME_KEY,
+    LineOutputParser,
+    Result,
+    Status,
+    Tool,
+)
+from benchmark.tools.dlv import STAT_REGEX, parse_stat_value, to_stat_key
+
+NATIVE_WRAPPER_PATH = ROOT_DIR / "bin" / "native-wrapper"
+NATIVE_ENGINE_DIR = ROOT_DIR / "benchmark" / "native"
+NATIVE_DATALOG_DIR = ROOT_DIR / "benchmark" / "datalog"
+
+ANSWERS_KEY = "answers"
+REASONING_KEY = "reasoning_time"
+QUERY_ANSWERING_KEY = "query_answering_time"
+
+
+class NativeOutputParser(LineOutputParser):
+    """
+    Incremental parser of the native engine output.
+
+    The answers come first, one per line, until an empty line; then the
+    statistics, one 'Label: number' per line, ending with the number of
+    answers.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the parser."""
+        super().__init__()
+        self._in_answers = True
+        self._nb_answers = 0
+        self._stats: Dict[str, Union[int, float]] = {}
+
+    def feed_line(self, line: str) -> None:
+        if self._in_answers:
+            if line:
+                self._nb_answers += 1
+            else:
+                self._in_answers = False
+            return
+        match = STAT_REGEX.match(line)
+        if match is not None:
+            self._stats[to_stat_key(match.group(2))] = parse_stat_value(match.group(3))
+
+    def get_result(self) -> Result:
+        answered = ANSWERS_KEY in self._stats
+        return Result(
+            status=Status.SUCCESS if answered else Status.ERROR,
+            nb_atoms=self._nb_answers if answered else None,
+            time_reasoning=self._stats.get(REASONING_KEY),
+            time_query=self._stats.get(QUERY_ANSWERING_KEY),
+            time_engine=self._stats.get(ENGINE_TIME_KEY),
+            stats=self._stats,
+        )
+
+
+class NativeTool(Tool):
+    """Implement the tool wrapper of the native chase engine."""
+
+    NAME = "Native"
+
+    def get_output_parser(self) -> NativeOutputParser:
+        return NativeOutputParser()
+
+    @classmethod
+    def get_engine_files(cls, binary_path: str) -> List[Path]:
+        return [
+            *super().get_engine_files(binary_path),
+            *sorted(NATIVE_ENGINE_DIR.glob("*.py")),
+            *sorted(NATIVE_DATALOG_DIR.glob("*.py")),
+        ]
+
+    def get_cli_args(
+        self,
+        program: Path,
+        datasets: List[Path],
+        run_config: Dict,
+        working_dir: Optional[str] = None,
+    ) -> List[str]:
+        args = [self.binary_path, "--program", program]
+        assert len(datasets) > 0
+        args += ["--dataset", *map(str, datasets)]
+        if working_dir is not None:
+            args += ["--working-dir", str(Path(working_dir).absolute())]
+        return args
@@ -3,17 +3,19 @@ import dataclasses
 import json
 import logging
 import os
+import re
 import signal
 import subprocess
 import time
 from json import JSONDecodeError
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import IO, Any, Callable, Dict, List, Optional, Tuple
 
 import requests
 
 from benchmark import ROOT_DIR
-from benchmark.tools.core import Result, Status, Tool
+from benchmark.tools.core import CHUNK_SIZE, OutputParser, Result, Status, Tool
+from benchmark.utils.resources import ResourceMonitor, ResourceUsage
 
 DEFAULT_JAVA_HOME = (
     Path(os.getenv("HOME")) / ".sdkman" / "candidates" / "java" / "current"
@@ -21,30 +23,343 @@ DEFAULT_JAVA_HOME = (
 DEFAULT_VADALOG_ROOT = ROOT_DIR / "third_party" / "vadalog-engine-bankitalia"
 DEFAULT_VADALOG_URL = "http://localhost:8080"
 VADALOG_WRAPPER_PATH = ROOT_DIR / "bin" / "vadalog-wrapper"
+VADALOG_JAR_PATH = Path("target") / "VadaEngine-1.10.6.jar"
+DEFAULT_STARTUP_TIMEOUT = 30.0
+DEFAULT_POLLING_INTERVAL = 0.1
+HEALTH_CHECK_TIMEOUT = 5.0
+WARMUP_PROGRAM = """
+edge(1, 2). edge(2, 3). edge(3, 4). edge(4, 5).
+path(X, Y) :- edge(X, Y).
+path(X, Z) :- path(X, Y), edge(Y, Z).
+witness(X, W) :- path(X, Y).
+@output("witness").
+"""
+
+
+_STRING = r'"(?:[^"\\]|\\.)*"'
+_TOKEN_REGEX = re.compile(
+    r"\s*(?:(" + _STRING + r")|([\[\]{}:,])|([^\s\[\]{}:,\"]+))"
+)
+_ROW_REGEX = re.compile(r"\s*,?\s*(\[(?:" + _STRING + r'|[^\[\]{}"])*\])')
+_RESULT_SET_KEY = "resultSet"
+# the root key of the status of the evaluation, 200 if it succeeded
+_STATUS_KEY = "status"
+_STATUS_OK = 200
+
+
+class ResultSetScanner:
+    """
+    Incremental scanner of a Vadalog JSON response.
+
+    It scans the response chunk by chunk, keeping in memory only the
+    unprocessed tail of the last chunk, and reports each row of the result set
+    to a callback as raw JSON text, e.g. '["a", "b"]'. Rows are expected to be
+    flat arrays of scalars, as returned by the Vadalog server. The root status
+    value, if any, is kept, since the server may report an error with a
+    result set.
+    """
+
+    def __init__(self, on_row: Optional[Callable[[str, str], None]] = None) -> None:
+        """
+        Initialize the scanner.
+
+        :param on_row: a callback taking the predicate name and the raw row.
+        """
+        self.on_row = on_row
+        self.counts: Dict[str, int] = {}
+        # the root status value, decoded, if it is a scalar
+        self.status: Any = None
+        self._buffer = ""
+        # the open containers ('{' or '['), and the current key for each of them
+        self._stack: List[str] = []
+        self._keys: List[Optional[str]] = []
+        self._root_keys = set()
+        self._expect_key = False
+        self._completed = False
+        self._error = False
+
+    @property
+    def is_valid(self) -> bool:
+        """Check whether a complete, well-formed response has been scanned."""
+        return self._completed and not self._error and not self._buffer.strip()
+
+    @property
+    def has_result_set(self) -> bool:
+        """Check whether the response is valid and contains a result set."""
+        return self.is_valid and _RESULT_SET_KEY in self._root_keys
+
+    @property
+    def has_error_status(self) -> bool:
+        """Check whether the response has a status other than 200."""
+        return _STATUS_KEY in self._root_keys and self.status != _STATUS_OK
+
+    def _in_rows(self) -> bool:
+        return (
+            self._stack == ["{", "{", "["]
+            and self._keys[0] == _RESULT_SET_KEY
+        )
+
+    def feed(self, data: str) -> None:
+        """Scan the next chunk of the response."""
+        if self._error:
+            return
+        buffer = self._buffer + data
+        pos = self._scan(buffer)
+        self._buffer = buffer[pos:]
+
+    def _scan(self, buffer: str) -> int:
+        pos = 0
+        while pos < len(buffer):
+            if self._in_rows():
+                pos = self._scan_rows(buffer, pos)
+                rest = buffer[pos:].lstrip()
+                rest = rest[1:].lstrip() if rest.startswith(",") else rest
+                if not rest or rest.startswith("["):
+                    # incomplete row: wait for more data
+                    return pos
+            match = _TOKEN_REGEX.match(buffer, pos)
+            if match is None:
+                # incomplete string, or only whitespace left: wait for more data
+                return pos
+            string, punctuation, literal = match.groups()
+            if literal is not None and match.end() == len(buffer):
+                # the literal might continue in the next chunk
+                return pos
+            if self._completed:
+                self._error = True
+                return pos
+            if punctuation is not None:
+                self._punctuation(punctuation)
+            elif string is not None:
+                self._value(string[1:-1])
+            else:
+                self._value(None, literal)
+            if self._error:
+                return pos
+            pos = match.end()
+        return pos
+
+    def _scan_rows(self, buffer: str, pos: int) -> int:
+        """Scan the complete rows of the result set starting at pos."""
+        predicate = self._keys[1]
+        on_row = self.on_row
+        nb_rows = 0
+        match = _ROW_REGEX.match(buffer, pos)
+        while match is not None:
+            nb_rows += 1
+            if on_row is not None:
+                on_row(predicate, match.group(1))
+            pos = match.end()
+            match = _ROW_REGEX.match(buffer, pos)
+        self.counts[predicate] += nb_rows
+        return pos
+
+    def _value(self, string: Optional[str], literal: Optional[str] = None) -> None:
+        if not self._stack:
+            self._error = True
+        elif (
+            len(self._stack) == 1
+            and not self._expect_key
+            and self._keys[0] == _STATUS_KEY
+        ):
+            if string is not None:
+                self.status = string
+            else:
+                try:
+                    self.status = json.loads(literal)
+                except ValueError:
+                    self.status = literal
+        elif self._stack[-1] == "{" and self._expect_key:
+            if string is None:
+                self._error = True
+                return
+            self._keys[-1] = string
+            if len(self._stack) == 1:
+                self._root_keys.add(string)
+            if len(self._stack) == 2 and self._keys[0] == _RESULT_SET_KEY:
+                self.counts.setdefault(string, 0)
+            self._expect_key = False
+
+    def _punctuation(self, char: str) -> None:
+        if char in "{[":
+            self._stack.append(char)
+            self._keys.append(None)
+            self._expect_key = char == "{"
+        elif char in "}]":
+            if not self._stack or self._stack[-1] != {"}": "{", "]": "["}[char]:
+                self._error = True
+                return
+            self._stack.pop()
+            self._keys.pop()
+            self._expect_key = False
+            if not self._stack:
+                self._completed = True
+        elif char == ",":
+            self._expect_key = bool(self._stack) and self._stack[-1] == "{"
+
+
+class VadalogOutputParser(OutputParser):
+    """Incremental parser of the Vadalog output; counts the rows of the result set."""
+
+    def __init__(self) -> None:
+        """Initialize the parser."""
+        self._scanner = ResultSetScanner()
+
+    def feed(self, data: str) -> None:
+        self._scanner.feed(data)
+
+    def result(self) -> Result:
+        if not self._scanner.has_result_set or self._scanner.has_error_status:
+            return Result(status=Status.ERROR)
+        counts = list(self._scanner.counts.values())
+        nb_values = counts[0] if len(counts) > 0 else 0
+        return Result(status=Status.SUCCESS, nb_atoms=nb_values)
+
+
+@dataclasses.dataclass(frozen=True)
+class Evaluation:
+    """The outcome of a program evaluation by the Vadalog server."""
+
+    status_code: int
+    nb_bytes: int
+    timed_out: bool = False
+    error: Optional[str] = None
+
+
+class VadalogClient:
+    """
+    Client of the Vadalog server, keeping its connection alive across requests.
+
+    The requests go through a single requests.Session, whose connection pool
+    is reused by the health checks, the warm-up queries and the evaluations.
+    The response of an evaluation is streamed chunk by chunk to a sink, e.g.
+    a file, and to a callback, e.g. an incremental parser; hence, the result
+    set is never held in memory.
+    """
+
+    def __init__(self, url: str = DEFAULT_VADALOG_URL) -> None:
+        """
+        Initialize the client.
+
+        :param url: the URL of the server.
+        """
+        self.url = str(url)
+        self._session = requests.Session()
+
+    def __enter__(self) -> "VadalogClient":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the connections of the pool."""
+        self._session.close()
+
+    def is_healthy(self, timeout: float = HEALTH_CHECK_TIMEOUT) -> bool:
+        """Check the server responds to requests."""
+        try:
+            self._session.get(self.url, timeout=timeout).json()
+            return True
+        except (requests.RequestException, JSONDecodeError):
+            return False
+
+    def evaluate(
+        self,
+        program: str,
+        sink: Optional[IO[bytes]] = None,
+        on_output: Optional[Callable[[bytes], None]] = None,
+        timeout: Optional[float] = None,
+    ) -> Evaluation:
+        """
+        Evaluate a program, streaming the response.
+
+        The timeout bounds the wait for each chunk of the response, and the
+        deadline is checked between chunks; hence, a run may exceed it by at
+        most the time to receive one chunk.
+
+        :param program: the program, with its @bind annotations.
+        :param sink: the binary file where to write the response.
+        :param on_output: a callback for each chunk of the response.
+        :param timeout: the timeout in seconds; None to wait indefinitely.
+        :return: the evaluation outcome.
+        """
+        deadline = time.perf_counter() + timeout if timeout is not None else None
+        nb_bytes = 0
+        try:
+            with self._session.post(
+                f"{self.url}/evaluate",
+                data=dict(program=program),
+                stream=True,
+                timeout=(HEALTH_CHECK_TIMEOUT, timeout),
+            ) as response:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    nb_bytes += len(chunk)
+                    if sink is not None:
+                        sink.write(chunk)
+                    if on_output is not None:
+                        on_output(chunk)
+                    if deadline is not None and time.perf_counter() > deadline:
+                        return Evaluation(response.status_code, nb_bytes, True)
+                error = None if response.ok else f"HTTP status {response.status_code}"
+                return Evaluation(response.status_code, nb_bytes, error=error)
+        except requests.Timeout:
+            return Evaluation(0, nb_bytes, True)
+        except requests.RequestException as e:
+            return Evaluation(0, nb_bytes, error=str(e))
 
 
 class VadalogTool(Tool):
-    """Implement the Vadalog tool wrapper."""
+    """
+    Implement the Vadalog tool wrapper.
+
+    By default, each run is an in-process request to the server, through a
+    client that keeps its connection alive for the whole session; the
+    response is spooled to stdout.txt in the working dir, and parsed as it
+    arrives. With in_process=False, each run launches the wrapper instead.
+    """
 
     NAME = "Vadalog"
+    # the server listens on a fixed port
+    CONCURRENT = False
+
+    def __init__(
+        self,
+        binary_path: str,
+        warmup_rounds: int = 0,
+        warmup_program: Optional[str] = None,
+        in_process: bool = True,
+    ) -> None:
+        """
+        Initialize the tool.
 
-    def __init__(self, binary_path: str) -> None:
+        :param binary_path: the binary path
+        :param warmup_rounds: number of queries sent to warm up the JVM
+          after the server starts
+        :param warmup_program: path to the program used for the warm-up;
+          by default, a small recursive program with an existential.
+        :param in_process: send the requests from this process, rather than
+          launching the wrapper for each run.
+        """
         super().__init__(binary_path)
 
-        self.vadalog_server = _VadalogServer()
+        self.client = VadalogClient()
+        self.vadalog_server = _VadalogServer(self.client)
+        self.in_process = in_process
+        self.warmup_rounds = warmup_rounds
+        self.warmup_program = (
+            Path(warmup_program).read_text() if warmup_program else WARMUP_PROGRAM
+        )
 
-    def collect_statistics(self, output: str) -> Result:
-        try:
-            json_output = json.loads(output)
-            result_set = json_output["resultSet"]
-            result_sets = list(result_set.items())
-            if len(result_sets) == 0:
-                nb_values = 0
-            else:
-                nb_values = len(result_sets[0][1])
-            return Result(status=Status.SUCCESS, nb_atoms=nb_values)
-        except json.JSONDecodeError:
-            return Result(status=Status.ERROR)
+    def get_output_parser(self) -> VadalogOutputParser:
+        return VadalogOutputParser()
+
+    @classmethod
+    def get_engine_files(cls, binary_path: str) -> List[Path]:
+        return [
+            *super().get_engine_files(binary_path),
+            DEFAULT_VADALOG_ROOT / VADALOG_JAR_PATH,
+        ]
 
     def get_cli_args(
         self,
@@ -54,18 +369,85 @@ class VadalogTool(Tool):
         working_dir: Optional[str] = None,
     ) -> List[str]:
         bind_parameters: List[str] = run_config["binds"]
-        args = [self.binary_path, "--program", program]
+        # in process, the command line is the one of the equivalent wrapper run,
+        # with the URL of the request in place of the wrapper
+        binary_path = (
+            f"{self.client.url}/evaluate" if self.in_process else self.binary_path
+        )
+        args = [binary_path, "--program", program]
         if len(bind_parameters) > 0:
             args += ["--bind", *bind_parameters]
         if working_dir is not None:
             args += ["--working-dir", working_dir]
         return args
 
+    def execute(
+        self,
+        args: List[str],
+        program: Path,
+        datasets: List[Path],
+        run_config: Dict,
+        working_dir: Optional[str],
+        cwd: Optional[str],
+        timeout: float,
+        stdout_file: IO[bytes],
+        stderr_file: IO[bytes],
+        on_output: Callable[[bytes], None],
+        monitor: ResourceMonitor,
+    ) -> Tuple[int, float, bool, ResourceUsage]:
+        if not self.in_process:
+            return super().execute(
+                args,
+                program,
+                datasets,
+                run_config,
+                working_dir,
+                cwd,
+                timeout,
+                stdout_file,
+                stderr_file,
+                on_output,
+                monitor,
+            )
+        binds = list(map(parse_bind_type, run_config["binds"]))
+        new_program = build_program(program.read_text(), binds)
+        if working_dir is not None:
+            (Path(working_dir) / "new_program.vada").write_text(new_program)
+        # only the server is monitored: the client is this process
+        monitor.start(None)
+        start = time.perf_counter()
+        evaluation = self.client.evaluate(
+            new_program, stdout_file, on_output, timeout=timeout
+        )
+        total = time.perf_counter() - start
+        usage = monitor.stop(None)
+        if evaluation.error is not None:
+            stderr_file.write(f"an error occurred: {evaluation.error}\n".encode())
+        returncode = 0 if evaluation.error is None else 1
+        return returncode, total, evaluation.timed_out, usage
+
+    @property
+    def is_wrapped(self) -> bool:
+        return not self.in_process
+
     def start_session(self) -> None:
         if self.vadalog_server.is_running:
             return
         print("Start Vadalog server")
         self.vadalog_server.start()
+        self.vadalog_server.warm_up(self.warmup_program, self.warmup_rounds)
+
+    def get_monitored_pids(self) -> List[int]:
+        if not self.vadalog_server.is_running:
+            return []
+        return [self.vadalog_server.vadalog_server.pid]
+
+    def check_session(self) -> None:
+        if self.vadalog_server.is_healthy():
+            return
+        logging.warning("Vadalog server is not healthy, restarting it")
+        self.vadalog_server.stop()
+        self.start_session()
 
     def end_session(self) -> None:
         if not self.vadalog_server.is_running:
@@ -77,9 +459,11 @@ class VadalogTool(Tool):
 class _VadalogServer:
     def __init__(
         self,
+        client: VadalogClient,
         java_home: Path = DEFAULT_JAVA_HOME,
         vadalog_root: Path = DEFAULT_VADALOG_ROOT,
     ):
+        self.client = client
         self.java_home = java_home
         self.vadalog_root = vadalog_root
         self.vadalog_server: Optional[subprocess.Popen] = None
@@ -93,12 +477,18 @@ class _VadalogServer:
     def is_running(self) -> bool:
         return self.vadalog_server is not None
 
+    def is_healthy(self) -> bool:
+        """Check the server process is alive and responds to requests."""
+        if not self.is_running or self.vadalog_server.poll() is not None:
+            return False
+        return self.client.is_healthy()
+
     def start(self):
         if self.is_running:
             return
         logging.info("Starting Vadalog engine server...")
         self.vadalog_server = subprocess.Popen(
-            [str(self.java_bin), "-jar", "target/VadaEngine-1.10.6.jar"],
+            [str(self.java_bin), "-jar", str(VADALOG_JAR_PATH)],
             cwd=str(self.vadalog_root),
             stdout=subprocess.DEVNULL,
             stderr=subprocess.DEVNULL,
@@ -125,17 +515,33 @@ class _VadalogServer:
                 os.kill(self.vadalog_server.pid, signal.SIGKILL)
         finally:
             self.vadalog_server = None
+            # the pooled connections are to the stopped server
+            self.client.close()
 
-    def wait_until_up(self, timeout: float = 1.0, attempts=10):
-        for i in range(attempts):
-            try:
-                response = requests.get(DEFAULT_VADALOG_URL)
-                response.json()
+    def wait_until_up(
+        self,
+        timeout: float = DEFAULT_STARTUP_TIMEOUT,
+        interval: float = DEFAULT_POLLING_INTERVAL,
+    ):
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            if self.vadalog_server.poll() is not None:
+                raise TimeoutError("Vadalog engine exited during startup")
+            if self.client.is_healthy():
                 return
-            except (requests.ConnectionError, JSONDecodeError):
-                time.sleep(timeout)
+            time.sleep(interval)
         raise TimeoutError("Vadalog engine does not respond")
 
+    def warm_up(self, program: str, rounds: int) -> None:
+        """Send a few queries to the server, so that the JVM gets warm."""
+        for i in range(rounds):
+            start = time.perf_counter()
+            evaluation = self.client.evaluate(program)
+            if evaluation.error is not None:
+                raise RuntimeError(f"warm-up query failed: {evaluation.error}")
+            end = time.perf_counter()
+            logging.info(f"Warm-up query {i + 1}/{rounds}: {end - start:.6f} s")
+
 
 @dataclasses.dataclass(frozen=True)
 class Bind:
@@ -150,6 +556,17 @@ class Bind:
         return f'@bind("{self.predicate_name}", "{self.dataset_format}", "{self.dataset_path.parent}", "{self.dataset_path.name}").'
 
 
+def build_bind_string(binds: List[Bind]) -> str:
+    input_statements = set(bind.to_input_statement() for bind in binds)
+    bind_statements = set(bind.to_vadalog_statement() for bind in binds)
+    return "\n".join(sorted(input_statements) + sorted(bind_statements))
+
+
+def build_program(program: str, binds: List[Bind]) -> str:
+    """Add to a program the annotations binding its inputs to the datasets."""
+    return program + "\n" + build_bind_string(binds)
+
+
 def parse_bind_type(arg: str) -> Bind:
     """
     Argparse validator for bind parameters.
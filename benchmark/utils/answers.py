@@ -0,0 +1,297 @@
+import codecs
+import heapq
+import json
+import re
+import tempfile
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from benchmark.datalog.parser import parse_program
+from benchmark.tools.core import CHUNK_SIZE, ToolID
+from benchmark.tools.dlv import QUERY_ANSWERING_MARKER, STATS_END_MARKER
+from benchmark.tools.vadalog import ResultSetScanner
+
+# the labelled nulls in the answers, e.g. _:z1 or z_1; a tuple with a null is
+# not a certain answer, hence it is dropped
+DEFAULT_NULL_PATTERN = r"_:\S*|z_\d+"
+# the number of answers sorted in memory before being spilled to a run file
+DEFAULT_RUN_SIZE = 1_000_000
+# the program written by the Vadalog runs in their working dir, with the binds
+VADALOG_PROGRAM_FILENAME = "new_program.vada"
+STDOUT_FILENAME = "stdout.txt"
+
+_DLV_VALUE_REGEX = re.compile(r'"((?:[^"\\]|\\.)*)"|([^\s",][^,]*)')
+
+# an answer, normalized as the JSON array of its values, so that answers
+# sort and compare as strings
+Answer = str
+
+
+def _read_dlv_values(line: str) -> List[str]:
+    """Read the values of an answer line, e.g. '"a", "b"'."""
+    return [
+        quoted if bare == "" else bare.strip()
+        for quoted, bare in _DLV_VALUE_REGEX.findall(line)
+    ]
+
+
+def read_dlv_answers(stdout_file: Path) -> Iterator[List[str]]:
+    """
+    Read lazily the answers in the output of DLV^E: the lines between the end
+    of the statistics block and the query answering time.
+    """
+    in_answers = False
+    with stdout_file.open(encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line.startswith(QUERY_ANSWERING_MARKER):
+                return
+            if in_answers:
+                if line:
+                    yield _read_dlv_values(line)
+            elif line.endswith(STATS_END_MARKER):
+                in_answers = True
+
+
+def read_native_answers(stdout_file: Path) -> Iterator[List[str]]:
+    """Read lazily the answers in the output of the native engine: the lines
+    before the first empty one, followed by the statistics."""
+    with stdout_file.open(encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line:
+                return
+            yield _read_dlv_values(line)
+
+
+def read_vadalog_answers(
+    stdout_file: Path, positions: Optional[Dict[str, Tuple[int, ...]]] = None
+) -> Iterator[List[str]]:
+    """
+    Read lazily the rows of the result set of a Vadalog response, chunk by
+    chunk, so that the response is never held in memory.
+
+    :param stdout_file: the response.
+    :param positions: for each output predicate, the positions of its certain
+      answers, on which the rows are projected; by default, all of them.
+    :return: the values of the rows.
+    """
+    rows: List[Tuple[str, str]] = []
+    scanner = ResultSetScanner(lambda predicate, row: rows.append((predicate, row)))
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    with stdout_file.open("rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            scanner.feed(decoder.decode(chunk))
+            yield from _project_rows(rows, positions)
+            rows.clear()
+    scanner.feed(decoder.decode(b"", final=True))
+    yield from _project_rows(rows, positions)
+    if not scanner.has_result_set:
+        raise ValueError(f"no valid result set in {stdout_file}")
+    if scanner.has_error_status:
+        raise ValueError(f"error status {scanner.status!r} in {stdout_file}")
+
+
+def _project_rows(
+    rows: List[Tuple[str, str]], positions: Optional[Dict[str, Tuple[int, ...]]]
+) -> Iterator[List[str]]:
+    for predicate, row in rows:
+        values = [
+            value if isinstance(value, str) else str(value)
+            for value in json.loads(row)
+        ]
+        if positions is not None and predicate in positions:
+            values = [values[position] for position in positions[predicate]]
+        yield values
+
+
+def get_answer_positions(program_file: Path) -> Dict[str, Tuple[int, ...]]:
+    """Get the positions of the certain answers of the outputs of a program."""
+    program = parse_program(program_file.read_text())
+    return {
+        predicate: program.get_answer_positions(predicate)
+        for predicate in program.outputs
+    }
+
+
+def normalize_answers(
+    answers: Iterable[Sequence[str]], null_pattern: str = DEFAULT_NULL_PATTERN
+) -> Iterator[Answer]:
+    """
+    Normalize the answers of an engine, dropping the ones with labelled nulls.
+
+    :param answers: the values of the answers, without quotes.
+    :param null_pattern: the regex matching a labelled null.
+    :return: the answers, as JSON arrays.
+    """
+    is_null: Callable = re.compile(null_pattern).fullmatch
+    for values in answers:
+        if not any(map(is_null, values)):
+            yield json.dumps(list(values), ensure_ascii=False)
+
+
+def sort_answers(
+    answers: Iterable[Answer], tmp_dir: Path, run_size: int = DEFAULT_RUN_SIZE
+) -> Iterator[Answer]:
+    """
+    Sort the answers and remove the duplicates, in bounded memory.
+
+    Runs of run_size answers are sorted in memory and written to files in
+    tmp_dir, then merged; with fewer answers, no file is written.
+
+    :param answers: the answers.
+    :param tmp_dir: the directory of the run files.
+    :param run_size: the number of answers sorted in memory.
+    :return: the sorted distinct answers.
+    """
+    run_files: List[Path] = []
+    run: List[Answer] = []
+    for answer in answers:
+        run.append(answer)
+        if len(run) >= run_size:
+            run_files.append(_write_run(sorted(set(run)), tmp_dir))
+            run = []
+    if not run_files:
+        yield from sorted(set(run))
+        return
+    if run:
+        run_files.append(_write_run(sorted(set(run)), tmp_dir))
+    with ExitStack() as stack:
+        files = [
+            stack.enter_context(run_file.open(encoding="utf-8"))
+            for run_file in run_files
+        ]
+        previous = None
+        for line in heapq.merge(*files):
+            answer = line.rstrip("\n")
+            if answer != previous:
+                yield answer
+                previous = answer
+    for run_file in run_files:
+        run_file.unlink()
+
+
+def _write_run(answers: List[Answer], tmp_dir: Path) -> Path:
+    with tempfile.NamedTemporaryFile(
+        "w", encoding="utf-8", dir=tmp_dir, suffix=".run", delete=False
+    ) as f:
+        for answer in answers:
+            # the answers are JSON, without newlines
+            f.write(answer + "\n")
+    return Path(f.name)
+
+
+@dataclass
+class AnswerDiff:
+    """The difference between two sets of answers."""
+
+    nb_left: int = 0
+    nb_right: int = 0
+    nb_only_left: int = 0
+    nb_only_right: int = 0
+    # the first answers found on a side only
+    only_left: List[Answer] = field(default_factory=list)
+    only_right: List[Answer] = field(default_factory=list)
+
+    @property
+    def is_equal(self) -> bool:
+        return self.nb_only_left == 0 and self.nb_only_right == 0
+
+
+def diff_answers(
+    left: Iterator[Answer],
+    right: Iterator[Answer],
+    max_examples: int = 10,
+    on_difference: Optional[Callable[[str, Answer], None]] = None,
+) -> AnswerDiff:
+    """
+    Compare two sets of answers by merging them.
+
+    :param left: the sorted distinct answers of the first engine.
+    :param right: the sorted distinct answers of the second engine.
+    :param max_examples: the number of answers of a side only kept in the diff.
+    :param on_difference: a callback for every answer of a side only, with
+      the side, '<' or '>'.
+    :return: the diff.
+    """
+    diff = AnswerDiff()
+
+    def only(side: str, answer: Answer) -> None:
+        if side == "<":
+            diff.nb_only_left += 1
+            examples = diff.only_left
+        else:
+            diff.nb_only_right += 1
+            examples = diff.only_right
+        if len(examples) < max_examples:
+            examples.append(answer)
+        if on_difference is not None:
+            on_difference(side, answer)
+
+    left_answer = next(left, None)
+    right_answer = next(right, None)
+    while left_answer is not None or right_answer is not None:
+        if right_answer is None or (
+            left_answer is not None and left_answer < right_answer
+        ):
+            diff.nb_left += 1
+            only("<", left_answer)
+            left_answer = next(left, None)
+        elif left_answer is None or right_answer < left_answer:
+            diff.nb_right += 1
+            only(">", right_answer)
+            right_answer = next(right, None)
+        else:
+            diff.nb_left += 1
+            diff.nb_right += 1
+            left_answer = next(left, None)
+            right_answer = next(right, None)
+    return diff
+
+
+def get_run_tool(run_dir: Path) -> ToolID:
+    """Infer the tool of a run from its path, e.g. results/q01/dlv/0010000."""
+    tool_names = [tool.value for tool in ToolID]
+    for part in reversed(run_dir.absolute().parts):
+        if part in tool_names:
+            return ToolID(part)
+    raise ValueError(f"cannot infer the tool of {run_dir}")
+
+
+def read_run_answers(
+    run_dir: Path, tool: ToolID, null_pattern: str = DEFAULT_NULL_PATTERN
+) -> Iterator[Answer]:
+    """
+    Read lazily the normalized answers of a run, from its working dir.
+
+    The Vadalog rows are projected on the positions of the certain answers,
+    as DLV^E and the native engine do, using the program in the working dir.
+
+    :param run_dir: the working dir of the run.
+    :param tool: the tool of the run.
+    :param null_pattern: the regex matching a labelled null.
+    :return: the answers, unsorted.
+    """
+    stdout_file = run_dir / STDOUT_FILENAME
+    if tool == ToolID.DLV:
+        answers = read_dlv_answers(stdout_file)
+    elif tool == ToolID.NATIVE:
+        answers = read_native_answers(stdout_file)
+    else:
+        program_file = run_dir / VADALOG_PROGRAM_FILENAME
+        positions = (
+            get_answer_positions(program_file) if program_file.exists() else None
+        )
+        answers = read_vadalog_answers(stdout_file, positions)
+    return normalize_answers(answers, null_pattern)
@@ -32,7 +32,9 @@ def is_valid_file(arg):
     return Path(arg).absolute()
 
 
-def get_argparser(description: str = "", use_dataset: bool = True):
+def get_argparser(
+    description: str = "", use_dataset: bool = True, require_dataset: bool = True
+):
     parser = argparse.ArgumentParser(description=description)
     parser.add_argument(
         "-p", "--program", dest="program_path", type=is_valid_file, required=True
@@ -44,7 +46,8 @@ def get_argparser(description: str = "", use_dataset: bool = True):
             dest="dataset_paths",
             type=is_valid_file,
             nargs="*",
-            required=True,
+            required=require_dataset,
+            default=[],
         )
     parser.add_argument(
         "-w", "--working-dir", dest="working_dir", type=str, default=None
@@ -72,13 +75,29 @@ def get_tools(benchmark_dir: Path, order: Optional[List[str]] = None):
             tool_dirs, key=lambda x: -1 if x.name not in order else order.index(x.name)
         )
     for tool_dir in tool_dirs:
-        tsv_files = list(tool_dir.glob("*.tsv"))
-        assert len(tsv_files) == 1
-        tsv_file = tsv_files[0]
+        tsv_file = tool_dir / TSV_FILENAME
+        assert tsv_file.is_file()
         tool_to_tsv[tool_dir.name] = tsv_file
     return tool_to_tsv
 
 
+def find_result_files(results_dir: Path) -> List[Tuple[str, str, Path]]:
+    """
+    Find the result files of a results directory, either <results>/<tool> for a
+    single query, or <results>/<query>/<tool> for several queries.
+
+    :param results_dir: the results directory.
+    :return: the query, the tool and the output.tsv file of each tool directory.
+    """
+    files = []
+    for tsv_file in sorted(results_dir.glob(f"*/{TSV_FILENAME}")):
+        files.append((results_dir.name, tsv_file.parent.name, tsv_file))
+    for tsv_file in sorted(results_dir.glob(f"*/*/{TSV_FILENAME}")):
+        tool_dir = tsv_file.parent
+        files.append((tool_dir.parent.name, tool_dir.name, tsv_file))
+    return files
+
+
 def configure_logging(filename: Optional[str] = None):
     console = logging.StreamHandler()
     handlers = [console]
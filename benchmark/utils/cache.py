@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from benchmark.tools.core import Result
+
+HASH_CHUNK_SIZE = 1 << 20
+MISSING_FILE_HASH = "missing"
+
+# file hashes, memoized by path, size and modification time
+_file_hashes: Dict[Tuple[str, int, int], str] = {}
+
+
+def hash_file(path: Path) -> str:
+    """
+    Compute the SHA-256 digest of the content of a file.
+
+    The digest is memoized until the size or the modification time of the
+    file change, so that large datasets are read only once per process.
+
+    :param path: the file path.
+    :return: the hex digest, or MISSING_FILE_HASH if the file does not exist.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return MISSING_FILE_HASH
+    memo_key = (str(Path(path).absolute()), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _file_hashes:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        _file_hashes[memo_key] = digest.hexdigest()
+    return _file_hashes[memo_key]
+
+
+def make_key(material: Dict[str, Any]) -> str:
+    """
+    Compute a content-addressed key.
+
+    :param material: everything the result depends on; it must be JSON
+      serializable (paths are converted to strings).
+    :return: the hex digest of the canonical JSON encoding of the material.
+    """
+    encoded = json.dumps(material, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    A local store of results, addressed by the key of the run.
+
+    Each result is saved as a JSON file, together with the material its key
+    was computed from, under <cache_dir>/<first two digits of the key>/.
+    """
+
+    def __init__(self, cache_dir: Path) -> None:
+        """
+        Initialize the cache.
+
+        :param cache_dir: the directory of the store; created if missing.
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Result]:
+        """
+        Get a cached result.
+
+        :param key: the key of the run.
+        :return: the result, or None if not cached (or unreadable).
+        """
+        try:
+            entry = json.loads(self._path(key).read_text())
+            return Result.from_json(entry["result"])
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+
+    def put(self, key: str, result: Result, material: Dict[str, Any]) -> None:
+        """
+        Store a result.
+
+        The file is written atomically, so that concurrent workers and
+        interrupted runs never leave partial entries.
+
+        :param key: the key of the run.
+        :param result: the result.
+        :param material: the material the key was computed from.
+        """
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        entry = {"key": key, "material": material, "result": result.json()}
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(entry, indent=2, default=str))
+        os.replace(tmp_path, path)
+
+    def invalidate(self, key: str) -> bool:
+        """
+        Remove a cached result.
+
+        :param key: the key of the run.
+        :return: True if the result was cached.
+        """
+        try:
+            self._path(key).unlink()
+            return True
+        except FileNotFoundError:
+            return False
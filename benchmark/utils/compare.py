@@ -0,0 +1,129 @@
+import statistics
+from dataclasses import asdict, dataclass
+from enum import Enum
+from typing import Any, Dict, List, Optional, Sequence
+
+from benchmark.tools.core import Status
+from benchmark.utils.stats import welch_t_test
+
+# the relative change of the mean end-to-end time reported by default
+DEFAULT_THRESHOLD = 0.10
+
+
+class Verdict(Enum):
+    REGRESSION = "regression"
+    SPEEDUP = "speedup"
+    UNCHANGED = "unchanged"
+    # a change above the threshold, but within the noise of the trials
+    NOT_SIGNIFICANT = "not significant"
+    # successful in the baseline, not in the new results
+    FAILED = "failed"
+    # not successful in the baseline, successful in the new results
+    FIXED = "fixed"
+    # a different number of answers
+    ANSWERS_CHANGED = "answers changed"
+    MISSING = "missing"
+    NEW = "new"
+
+
+# the verdicts that fail the comparison
+FAILING_VERDICTS = (Verdict.REGRESSION, Verdict.FAILED, Verdict.ANSWERS_CHANGED)
+
+
+@dataclass(frozen=True)
+class Run:
+    """The results of a (query, tool, dataset size) run, to compare."""
+
+    status: Status
+    nb_atoms: Optional[int]
+    # the end-to-end times of the successful trials, or the mean only if
+    # the trials were not saved
+    times: Sequence[float]
+
+
+@dataclass(frozen=True)
+class CellComparison:
+    """The comparison of a run between the baseline and the new results."""
+
+    query: str
+    tool: str
+    name: str
+    verdict: Verdict
+    baseline_time: Optional[float] = None
+    new_time: Optional[float] = None
+    # relative change of the mean time, e.g. 0.25 for 25% slower
+    change: Optional[float] = None
+    # Welch's t statistic; None without repeated trials on both sides
+    t: Optional[float] = None
+
+    def json(self) -> Dict[str, Any]:
+        """To json."""
+        result = asdict(self)
+        result["verdict"] = self.verdict.value
+        return result
+
+
+def compare_runs(
+    query: str,
+    tool: str,
+    name: str,
+    baseline: Optional[Run],
+    new: Optional[Run],
+    threshold: float = DEFAULT_THRESHOLD,
+) -> CellComparison:
+    """
+    Compare a run of the new results with the same run of the baseline.
+
+    A change of the mean time beyond the threshold is a regression or a
+    speedup; when both sides have repeated trials, it must also be significant
+    for Welch's t-test at 95%, otherwise it is only reported as not
+    significant. A single measurement per side is compared on the threshold
+    alone.
+
+    :param query: the query.
+    :param tool: the tool.
+    :param name: the name of the run, i.e. the dataset size.
+    :param baseline: the run in the baseline; None if missing.
+    :param new: the run in the new results; None if missing.
+    :param threshold: the relative change of the mean time, e.g. 0.1 for 10%.
+    :return: the comparison.
+    """
+    cell = dict(query=query, tool=tool, name=name)
+    if new is None:
+        return CellComparison(**cell, verdict=Verdict.MISSING)
+    if baseline is None:
+        return CellComparison(**cell, verdict=Verdict.NEW)
+    baseline_ok = baseline.status == Status.SUCCESS and len(baseline.times) > 0
+    new_ok = new.status == Status.SUCCESS and len(new.times) > 0
+    if not baseline_ok or not new_ok:
+        if baseline_ok:
+            return CellComparison(**cell, verdict=Verdict.FAILED)
+        return CellComparison(
+            **cell, verdict=Verdict.FIXED if new_ok else Verdict.UNCHANGED
+        )
+
+    baseline_time = statistics.mean(baseline.times)
+    new_time = statistics.mean(new.times)
+    change = new_time / baseline_time - 1.0
+    test = welch_t_test(baseline.times, new.times)
+    if baseline.nb_atoms != new.nb_atoms:
+        verdict = Verdict.ANSWERS_CHANGED
+    elif abs(change) <= threshold:
+        verdict = Verdict.UNCHANGED
+    elif test is not None and not test.is_significant:
+        verdict = Verdict.NOT_SIGNIFICANT
+    else:
+        verdict = Verdict.REGRESSION if change > 0 else Verdict.SPEEDUP
+    return CellComparison(
+        **cell,
+        verdict=verdict,
+        baseline_time=baseline_time,
+        new_time=new_time,
+        change=change,
+        t=test.t if test is not None else None,
+    )
+
+
+def has_failed(comparisons: List[CellComparison]) -> bool:
+    """Check whether a comparison is a regression, a failure or a change of answers."""
+    return any(comparison.verdict in FAILING_VERDICTS for comparison in comparisons)
@@ -0,0 +1,207 @@
+import os
+import resource
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+PROC_DIR = Path("/proc")
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+BLOCK_SIZE = 512
+
+
+@dataclass
+class ResourceUsage:
+    """Resources used by a run. Memory and I/O are in bytes, CPU times in seconds."""
+
+    peak_rss: Optional[int] = None
+    cpu_user: Optional[float] = None
+    cpu_sys: Optional[float] = None
+    ctx_switches: Optional[int] = None
+    io_read_bytes: Optional[int] = None
+    io_write_bytes: Optional[int] = None
+    # pairs (seconds since the start, resident memory of the process tree)
+    memory_trace: List[Tuple[float, int]] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class ProcessStats:
+    """Cumulative statistics of a live process, read from /proc."""
+
+    pgid: int
+    rss: int
+    cpu_user: float
+    cpu_sys: float
+    ctx_switches: int
+    io_read_bytes: int
+    io_write_bytes: int
+
+
+def _read_key_values(path: Path) -> Dict[str, str]:
+    result = {}
+    for line in path.read_text().splitlines():
+        key, _, value = line.partition(":")
+        result[key.strip()] = value.strip()
+    return result
+
+
+def read_process_stats(pid: int) -> Optional[ProcessStats]:
+    """
+    Read the statistics of a process from /proc.
+
+    :param pid: the process id.
+    :return: the statistics, or None if the process does not exist anymore.
+    """
+    proc_dir = PROC_DIR / str(pid)
+    try:
+        stat = (proc_dir / "stat").read_text()
+        status = _read_key_values(proc_dir / "status")
+        try:
+            io = _read_key_values(proc_dir / "io")
+        except PermissionError:
+            io = {}
+    except (FileNotFoundError, ProcessLookupError):
+        return None
+    # the command name might contain spaces: skip it
+    fields = stat[stat.rindex(")") + 2 :].split()
+    return ProcessStats(
+        pgid=int(fields[2]),
+        rss=int(fields[21]) * PAGE_SIZE,
+        cpu_user=int(fields[11]) / CLOCK_TICKS,
+        cpu_sys=int(fields[12]) / CLOCK_TICKS,
+        ctx_switches=int(status.get("voluntary_ctxt_switches", 0))
+        + int(status.get("nonvoluntary_ctxt_switches", 0)),
+        io_read_bytes=int(io.get("read_bytes", 0)),
+        io_write_bytes=int(io.get("write_bytes", 0)),
+    )
+
+
+def get_process_group_rss(pgid: int) -> int:
+    """Get the total resident memory of the live processes in a process group."""
+    total = 0
+    for proc_dir in PROC_DIR.iterdir():
+        if not proc_dir.name.isdigit():
+            continue
+        stats = read_process_stats(int(proc_dir.name))
+        if stats is not None and stats.pgid == pgid:
+            total += stats.rss
+    return total
+
+
+class ResourceMonitor:
+    """
+    Account the resources used by a process group during a run.
+
+    The usage of the process group is taken from the rusage of its leader,
+    which includes all the descendants it waited for. The usage of the
+    additional processes (e.g. a server which outlives the run) is the
+    difference between two snapshots taken at the start and at the end.
+
+    If a sampling interval is set, a background thread periodically samples
+    the resident memory of the process group and of the additional processes,
+    which gives the memory trace and the peak of the whole process tree.
+    """
+
+    def __init__(
+        self,
+        extra_pids: Sequence[int] = (),
+        sampling_interval: Optional[float] = None,
+    ) -> None:
+        """
+        Initialize the monitor.
+
+        :param extra_pids: the ids of other processes that take part to the run.
+        :param sampling_interval: the sampling interval in seconds; None to disable.
+        """
+        self.extra_pids = list(extra_pids)
+        self.sampling_interval = sampling_interval
+        self._pgid: Optional[int] = None
+        self._start_time = 0.0
+        self._start_stats: Dict[int, ProcessStats] = {}
+        self._trace: List[Tuple[float, int]] = []
+        self._stop_event = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    def start(self, pgid: Optional[int]) -> None:
+        """Start monitoring the process group, if any, and the other processes."""
+        self._pgid = pgid
+        self._start_time = time.perf_counter()
+        self._start_stats = self._snapshot_extra()
+        if self.sampling_interval is not None:
+            self._sampler = threading.Thread(target=self._sample_loop, daemon=True)
+            self._sampler.start()
+
+    def stop(self, rusage: Optional[resource.struct_rusage]) -> ResourceUsage:
+        """
+        Stop monitoring and compute the resource usage.
+
+        :param rusage: the rusage of the process group leader, as returned by wait4.
+        :return: the resource usage of the run.
+        """
+        if self._sampler is not None:
+            self._stop_event.set()
+            self._sampler.join()
+        end_stats = self._snapshot_extra()
+
+        usage = ResourceUsage(
+            peak_rss=0,
+            cpu_user=0.0,
+            cpu_sys=0.0,
+            ctx_switches=0,
+            io_read_bytes=0,
+            io_write_bytes=0,
+            memory_trace=self._trace,
+        )
+        if rusage is not None:
+            # ru_maxrss is in kilobytes on Linux
+            usage.peak_rss = rusage.ru_maxrss * 1024
+            usage.cpu_user = rusage.ru_utime
+            usage.cpu_sys = rusage.ru_stime
+            usage.ctx_switches = rusage.ru_nvcsw + rusage.ru_nivcsw
+            usage.io_read_bytes = rusage.ru_inblock * BLOCK_SIZE
+            usage.io_write_bytes = rusage.ru_oublock * BLOCK_SIZE
+        extra_rss = 0
+        for pid, end in end_stats.items():
+            start = self._start_stats.get(pid)
+            if start is None:
+                continue
+            extra_rss += max(start.rss, end.rss)
+            usage.cpu_user += end.cpu_user - start.cpu_user
+            usage.cpu_sys += end.cpu_sys - start.cpu_sys
+            usage.ctx_switches += end.ctx_switches - start.ctx_switches
+            usage.io_read_bytes += end.io_read_bytes - start.io_read_bytes
+            usage.io_write_bytes += end.io_write_bytes - start.io_write_bytes
+        usage.peak_rss += extra_rss
+        if self._trace:
+            usage.peak_rss = max(usage.peak_rss, max(rss for _, rss in self._trace))
+        return usage
+
+    def _snapshot_extra(self) -> Dict[int, ProcessStats]:
+        snapshot = {}
+        for pid in self.extra_pids:
+            stats = read_process_stats(pid)
+            if stats is not None:
+                snapshot[pid] = stats
+        return snapshot
+
+    def _sample(self) -> int:
+        rss = get_process_group_rss(self._pgid) if self._pgid is not None else 0
+        for stats in self._snapshot_extra().values():
+            rss += stats.rss
+        return rss
+
+    def _sample_loop(self) -> None:
+        while True:
+            self._trace.append((time.perf_counter() - self._start_time, self._sample()))
+            if self._stop_event.wait(self.sampling_interval):
+                return
+
+
+def save_memory_trace(trace: List[Tuple[float, int]], output: Path) -> None:
+    """Save a memory trace to a file."""
+    content = "time\trss\n"
+    for timestamp, rss in trace:
+        content += f"{timestamp:.6f}\t{rss}\n"
+    output.write_text(content)
@@ -0,0 +1,239 @@
+import math
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from benchmark.utils.stats import t_critical
+
+# the sizes, in rows, to which the runtimes are extrapolated by default
+DEFAULT_EXTRAPOLATION_SIZES = (10_000_000, 100_000_000)
+# an exponent above this is flagged as superlinear; a bit above 1, so that
+# the noise of a linear engine is not flagged
+SUPERLINEAR_THRESHOLD = 1.2
+# a breakpoint is kept only if it divides the residual sum of squares of the
+# single power law at least by this factor
+BREAKPOINT_MIN_GAIN = 4.0
+
+
+@dataclass(frozen=True)
+class Extrapolation:
+    """The runtime predicted at a size, with the 95% confidence band of the fit."""
+
+    size: int
+    time: float
+    # None when the fit has no degree of freedom left, e.g. with two sizes
+    time_low: Optional[float]
+    time_high: Optional[float]
+
+
+@dataclass(frozen=True)
+class _LogLinearModel:
+    """
+    A least-squares model of log(time) as a linear function of log(size),
+    with a change of slope at the hinge, if any.
+    """
+
+    coefficients: np.ndarray
+    # covariance of the coefficients; None without degrees of freedom
+    covariance: Optional[np.ndarray]
+    degrees_of_freedom: int
+    sse: float
+    hinge: Optional[float] = None
+
+    def features(self, log_size: float) -> np.ndarray:
+        row = [1.0, log_size]
+        if self.hinge is not None:
+            row.append(max(0.0, log_size - self.hinge))
+        return np.array(row)
+
+    def predict(self, size: int) -> Extrapolation:
+        x = self.features(math.log(size))
+        log_time = float(x @ self.coefficients)
+        if self.covariance is None:
+            return Extrapolation(size, math.exp(log_time), None, None)
+        half_width = t_critical(self.degrees_of_freedom) * math.sqrt(
+            float(x @ self.covariance @ x)
+        )
+        return Extrapolation(
+            size,
+            math.exp(log_time),
+            math.exp(log_time - half_width),
+            math.exp(log_time + half_width),
+        )
+
+
+def _fit_model(
+    log_sizes: np.ndarray, log_times: np.ndarray, hinge: Optional[float] = None
+) -> _LogLinearModel:
+    columns = [np.ones_like(log_sizes), log_sizes]
+    if hinge is not None:
+        columns.append(np.maximum(0.0, log_sizes - hinge))
+    design = np.column_stack(columns)
+    coefficients, *_ = np.linalg.lstsq(design, log_times, rcond=None)
+    residuals = log_times - design @ coefficients
+    sse = float(residuals @ residuals)
+    degrees_of_freedom = len(log_sizes) - design.shape[1]
+    covariance = None
+    if degrees_of_freedom > 0:
+        variance = sse / degrees_of_freedom
+        covariance = variance * np.linalg.pinv(design.T @ design)
+    return _LogLinearModel(coefficients, covariance, degrees_of_freedom, sse, hinge)
+
+
+@dataclass(frozen=True)
+class ScalingFit:
+    """
+    How the runtime of a query grows with the size of the dataset.
+
+    The runtime is fitted as a power law, time = constant * size^exponent,
+    i.e. a line in log-log scale. If the slope changes markedly at one of the
+    measured sizes, that size is the breakpoint, and exponent_after is the
+    exponent beyond it; the extrapolations then follow the last regime.
+    """
+
+    sizes: Tuple[int, ...]
+    times: Tuple[float, ...]
+    exponent: float
+    constant: float
+    r_squared: Optional[float]
+    breakpoint: Optional[int]
+    exponent_after: Optional[float]
+    # the exponent between each pair of consecutive sizes, e.g. 2.3 when the
+    # runtime grows 4.9 times from 500k to 1M rows
+    local_exponents: Tuple[float, ...]
+    _model: _LogLinearModel = field(repr=False, compare=False)
+
+    @property
+    def final_exponent(self) -> float:
+        """Get the exponent of the largest sizes, after the breakpoint if any."""
+        return self.exponent if self.exponent_after is None else self.exponent_after
+
+    def steepest_step(self) -> Tuple[int, int, float]:
+        """Get the consecutive sizes with the largest local exponent, and the latter."""
+        index = int(np.argmax(self.local_exponents))
+        return self.sizes[index], self.sizes[index + 1], self.local_exponents[index]
+
+    def is_superlinear(self, threshold: float = SUPERLINEAR_THRESHOLD) -> bool:
+        """
+        Check whether the runtime grows faster than linearly, either over the
+        largest sizes or between two consecutive sizes.
+
+        :param threshold: the exponent above which the growth is superlinear.
+        :return: True if superlinear.
+        """
+        return max(self.final_exponent, *self.local_exponents) > threshold
+
+    def extrapolate(self, size: int) -> Extrapolation:
+        """
+        Predict the runtime at a size, usually beyond the measured ones.
+
+        The band is the 95% confidence interval of the fitted line, mapped back
+        from log scale; it only accounts for the spread of the measured points
+        around the model, not for a change of regime beyond them.
+
+        :param size: the size, in rows.
+        :return: the prediction.
+        """
+        return self._model.predict(size)
+
+    def size_for_time(self, time: float) -> Optional[float]:
+        """
+        Get the size at which the fitted runtime reaches a time, e.g. the
+        largest dataset processed within a timeout.
+
+        :param time: the time, positive.
+        :return: the size, or None if the runtime does not grow with the size.
+        """
+        intercept, slope = map(float, self._model.coefficients[:2])
+        log_time = math.log(time)
+        hinge = self._model.hinge
+        if hinge is not None:
+            slope_after = slope + float(self._model.coefficients[2])
+            if slope_after > 0:
+                log_size = (
+                    log_time - intercept + (slope_after - slope) * hinge
+                ) / slope_after
+                if log_size >= hinge:
+                    return math.exp(log_size)
+        if slope <= 0:
+            return None
+        log_size = (log_time - intercept) / slope
+        if hinge is not None and log_size > hinge:
+            return None
+        return math.exp(log_size)
+
+
+def fit_scaling(sizes: Sequence[int], times: Sequence[float]) -> ScalingFit:
+    """
+    Fit the scaling model of a query on the runtimes measured at several sizes.
+
+    :param sizes: the sizes of the datasets, at least two distinct ones.
+    :param times: the runtimes, positive, in the order of the sizes.
+    :return: the fit.
+    :raises ValueError: if there are less than two sizes, or a runtime is not
+      positive.
+    """
+    if len(sizes) != len(times):
+        raise ValueError("there must be one runtime per size")
+    pairs = sorted(zip(sizes, times))
+    if len({size for size, _ in pairs}) < 2:
+        raise ValueError("at least two distinct sizes are needed to fit a scaling")
+    if any(size <= 0 or time <= 0 for size, time in pairs):
+        raise ValueError("the sizes and runtimes must be positive")
+    sorted_sizes = tuple(size for size, _ in pairs)
+    sorted_times = tuple(time for _, time in pairs)
+    log_sizes = np.log(np.array(sorted_sizes, dtype=float))
+    log_times = np.log(np.array(sorted_times, dtype=float))
+
+    model = _fit_model(log_sizes, log_times)
+    total = float(((log_times - log_times.mean()) ** 2).sum())
+    r_squared = 1.0 - model.sse / total if total > 0 else None
+    exponent = float(model.coefficients[1])
+    constant = math.exp(float(model.coefficients[0]))
+
+    breakpoint = exponent_after = None
+    segmented = _fit_breakpoint(log_sizes, log_times)
+    if segmented is not None and segmented.sse * BREAKPOINT_MIN_GAIN <= model.sse:
+        index = int(np.argmin(np.abs(log_sizes - segmented.hinge)))
+        breakpoint = sorted_sizes[index]
+        exponent_after = float(segmented.coefficients[1] + segmented.coefficients[2])
+        model = segmented
+
+    return ScalingFit(
+        sizes=sorted_sizes,
+        times=sorted_times,
+        exponent=exponent,
+        constant=constant,
+        r_squared=r_squared,
+        breakpoint=breakpoint,
+        exponent_after=exponent_after,
+        local_exponents=tuple(_local_exponents(log_sizes, log_times)),
+        _model=model,
+    )
+
+
+def _fit_breakpoint(
+    log_sizes: np.ndarray, log_times: np.ndarray
+) -> Optional[_LogLinearModel]:
+    """
+    Fit a continuous line with a change of slope at the measured size that
+    fits best; it needs a degree of freedom left, hence four sizes.
+    """
+    candidates = [
+        _fit_model(log_sizes, log_times, hinge)
+        for hinge in np.unique(log_sizes)[1:-1]
+    ]
+    candidates = [model for model in candidates if model.degrees_of_freedom > 0]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda model: model.sse)
+
+
+def _local_exponents(log_sizes: np.ndarray, log_times: np.ndarray) -> List[float]:
+    exponents = []
+    for i in range(len(log_sizes) - 1):
+        step = log_sizes[i + 1] - log_sizes[i]
+        if step > 0:
+            exponents.append(float((log_times[i + 1] - log_times[i]) / step))
+    return exponents
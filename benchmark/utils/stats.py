@@ -0,0 +1,203 @@
+import math
+import statistics
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+# two-sided critical values of the Student's t distribution at 95% confidence,
+# indexed by the degrees of freedom
+T_CRITICAL_95 = {
+    1: 12.706,
+    2: 4.303,
+    3: 3.182,
+    4: 2.776,
+    5: 2.571,
+    6: 2.447,
+    7: 2.365,
+    8: 2.306,
+    9: 2.262,
+    10: 2.228,
+    11: 2.201,
+    12: 2.179,
+    13: 2.160,
+    14: 2.145,
+    15: 2.131,
+    16: 2.120,
+    17: 2.110,
+    18: 2.101,
+    19: 2.093,
+    20: 2.086,
+    21: 2.080,
+    22: 2.074,
+    23: 2.069,
+    24: 2.064,
+    25: 2.060,
+    26: 2.056,
+    27: 2.052,
+    28: 2.048,
+    29: 2.045,
+    30: 2.042,
+    40: 2.021,
+    60: 2.000,
+    120: 1.980,
+}
+Z_CRITICAL_95 = 1.960
+
+# the statistics of the end-to-end time reported in the result files
+STATISTICS = ("mean", "median", "stddev", "min", "ci_low", "ci_high")
+
+
+def t_critical(degrees_of_freedom: int) -> float:
+    """
+    Get the critical value of the t distribution for a 95% confidence interval.
+
+    Between two entries of the table, the value of the smaller number of
+    degrees of freedom is taken, which gives a conservative interval.
+
+    :param degrees_of_freedom: the degrees of freedom, at least 1.
+    :return: the critical value.
+    """
+    if degrees_of_freedom < 1:
+        raise ValueError(
+            f"degrees of freedom must be positive, got {degrees_of_freedom}"
+        )
+    if degrees_of_freedom > max(T_CRITICAL_95):
+        return Z_CRITICAL_95
+    return T_CRITICAL_95[max(df for df in T_CRITICAL_95 if df <= degrees_of_freedom)]
+
+
+@dataclass(frozen=True)
+class Summary:
+    """Summary statistics of a sample of measurements."""
+
+    count: int
+    mean: float
+    median: float
+    stddev: Optional[float]
+    min: float
+    ci_low: Optional[float]
+    ci_high: Optional[float]
+
+    @property
+    def ci_half_width(self) -> Optional[float]:
+        """Get the half width of the 95% confidence interval of the mean."""
+        if self.ci_low is None or self.ci_high is None:
+            return None
+        return (self.ci_high - self.ci_low) / 2
+
+    def is_precise(self, tolerance: float) -> bool:
+        """
+        Check whether the confidence interval is tight enough.
+
+        :param tolerance: the maximum half width of the confidence interval,
+          relative to the mean (e.g. 0.05 for +-5%).
+        :return: True if the interval is within the tolerance.
+        """
+        half_width = self.ci_half_width
+        if half_width is None:
+            return False
+        return half_width <= tolerance * abs(self.mean)
+
+
+def summarize(values: Sequence[float]) -> Summary:
+    """
+    Compute the summary statistics of a sample.
+
+    The standard deviation is the sample one; the confidence interval of the
+    mean is computed with the t distribution. Both need at least two values.
+
+    :param values: the sample, not empty.
+    :return: the summary.
+    """
+    if not values:
+        raise ValueError("cannot summarize an empty sample")
+    mean = statistics.mean(values)
+    stddev = ci_low = ci_high = None
+    if len(values) > 1:
+        stddev = statistics.stdev(values)
+        half_width = t_critical(len(values) - 1) * stddev / math.sqrt(len(values))
+        ci_low, ci_high = mean - half_width, mean + half_width
+    return Summary(
+        count=len(values),
+        mean=mean,
+        median=statistics.median(values),
+        stddev=stddev,
+        min=min(values),
+        ci_low=ci_low,
+        ci_high=ci_high,
+    )
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """
+    Compute a percentile of a sample, interpolating between the closest ranks.
+
+    :param values: the sample, not empty.
+    :param q: the percentile, between 0 and 100.
+    :return: the value below which q% of the sample falls.
+    """
+    if not values:
+        raise ValueError("cannot compute a percentile of an empty sample")
+    if not 0.0 <= q <= 100.0:
+        raise ValueError(f"percentile must be between 0 and 100, got {q}")
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100.0
+    low = math.floor(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+@dataclass(frozen=True)
+class WelchTest:
+    """Welch's t-test of the difference between the means of two samples."""
+
+    t: float
+    degrees_of_freedom: float
+
+    @property
+    def is_significant(self) -> bool:
+        """Check whether the means differ at 95% confidence (two-sided)."""
+        return abs(self.t) > t_critical(max(1, math.floor(self.degrees_of_freedom)))
+
+
+def welch_t_test(
+    before: Sequence[float], after: Sequence[float]
+) -> Optional[WelchTest]:
+    """
+    Test whether two samples, e.g. the trials of a run before and after a
+    change, have different means, without assuming the same variance.
+
+    :param before: the first sample.
+    :param after: the second sample.
+    :return: the test, positive if the second mean is greater; None if a sample
+      has less than two values, or both have no variance.
+    """
+    if len(before) < 2 or len(after) < 2:
+        return None
+    se_before = statistics.variance(before) / len(before)
+    se_after = statistics.variance(after) / len(after)
+    se = se_before + se_after
+    if se == 0:
+        return None
+    t = (statistics.mean(after) - statistics.mean(before)) / math.sqrt(se)
+    # Welch-Satterthwaite approximation
+    degrees_of_freedom = se**2 / (
+        se_before**2 / (len(before) - 1) + se_after**2 / (len(after) - 1)
+    )
+    return WelchTest(t, degrees_of_freedom)
+
+
+def summary_column(statistic: str) -> str:
+    """
+    Get the column of the result files holding a statistic of the end-to-end time.
+
+    The mean is stored in time_end2end, so that files with a single trial per
+    run are read in the same way.
+
+    :param statistic: one of STATISTICS.
+    :return: the column name.
+    """
+    if statistic not in STATISTICS:
+        raise ValueError(
+            f"unknown statistic {statistic!r}, expected one of {STATISTICS}"
+        )
+    return "time_end2end" if statistic == "mean" else f"time_{statistic}"
@@ -0,0 +1,282 @@
+import json
+import os
+from contextlib import ExitStack
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# the store of a dataset is <dataset dir>/store/<relation>/
+STORE_DIR_NAME = "store"
+MANIFEST_FILENAME = "manifest.json"
+DICTIONARY_FILENAME = "dictionary.txt"
+CODE_DTYPE = "<i4"
+# number of rows encoded or decoded at a time
+ROWS_PER_CHUNK = 1 << 16
+
+
+def _column_filename(index: int) -> str:
+    return f"column_{index}.i32"
+
+
+class RelationWriter:
+    """
+    Write a relation to a columnar store, row by row.
+
+    Each value is dictionary-encoded: the relation is saved as one file of
+    int32 codes per column, plus the dictionary of the distinct values, one
+    per line (the rows are CSV lines, so values never contain a newline).
+    The rows of several sources can be appended one after the other; each
+    source, and each prefix of the rows, can be recorded as a partition,
+    i.e. a named range of rows.
+
+    Only the dictionary is kept in memory: the codes are written by chunks.
+    """
+
+    def __init__(self, relation_dir: Path, relation: str) -> None:
+        """
+        Initialize the writer.
+
+        :param relation_dir: the directory of the relation; created if missing.
+        :param relation: the name of the relation.
+        """
+        self.relation_dir = Path(relation_dir)
+        self.relation = relation
+        self.nb_rows = 0
+        self.partitions: Dict[str, Tuple[int, int]] = {}
+        self._nb_columns: Optional[int] = None
+        self._index: Dict[str, int] = {}
+        self._stack = ExitStack()
+        self._column_files: List = []
+
+    def __enter__(self) -> "RelationWriter":
+        self.relation_dir.mkdir(parents=True, exist_ok=True)
+        return self
+
+    def __exit__(self, exc_type, *_) -> None:
+        self._stack.close()
+        if exc_type is None:
+            self._save_dictionary_and_manifest()
+
+    def append(self, lines: Iterable[str], partition: Optional[str] = None) -> int:
+        """
+        Append rows.
+
+        :param lines: the rows, as CSV lines without quotes.
+        :param partition: if given, the name of the partition made of the rows.
+        :return: the number of rows appended.
+        """
+        start = self.nb_rows
+        lines = iter(lines)
+        encode = self._index.setdefault
+        index = self._index
+        while True:
+            chunk = list(islice(lines, ROWS_PER_CHUNK))
+            if not chunk:
+                break
+            rows = [line.split(",") for line in chunk]
+            if self._nb_columns is None:
+                self._open_columns(len(rows[0]))
+            if any(len(row) != self._nb_columns for row in rows):
+                raise ValueError(
+                    f"relation {self.relation}: expected {self._nb_columns} columns"
+                )
+            for column, column_file in zip(zip(*rows), self._column_files):
+                codes = [encode(value, len(index)) for value in column]
+                np.asarray(codes, dtype=CODE_DTYPE).tofile(column_file)
+            self.nb_rows += len(rows)
+        if partition is not None:
+            self.partitions[partition] = (start, self.nb_rows)
+        return self.nb_rows - start
+
+    def add_prefix(self, partition: str, nb_rows: Optional[int] = None) -> None:
+        """
+        Record the first rows as a partition.
+
+        :param partition: the name of the partition.
+        :param nb_rows: the number of rows; by default, all the rows, at the
+          time the writer is closed.
+        """
+        self.partitions[partition] = (0, -1 if nb_rows is None else nb_rows)
+
+    def _open_columns(self, nb_columns: int) -> None:
+        self._nb_columns = nb_columns
+        for index in range(nb_columns):
+            path = self.relation_dir / _column_filename(index)
+            self._column_files.append(self._stack.enter_context(path.open("wb")))
+
+    def _save_dictionary_and_manifest(self) -> None:
+        # codes are given in order of first occurrence, as dicts keep it
+        dictionary_file = self.relation_dir / DICTIONARY_FILENAME
+        dictionary_file.write_text("\n".join(self._index), encoding="utf-8")
+        partitions = {
+            name: (start, self.nb_rows if stop < 0 else min(stop, self.nb_rows))
+            for name, (start, stop) in self.partitions.items()
+        }
+        manifest = {
+            "relation": self.relation,
+            "nb_rows": self.nb_rows,
+            "nb_columns": self._nb_columns or 0,
+            "nb_values": len(self._index),
+            "dtype": CODE_DTYPE,
+            "columns": [_column_filename(i) for i in range(self._nb_columns or 0)],
+            "dictionary": DICTIONARY_FILENAME,
+            "partitions": dict(sorted(partitions.items())),
+        }
+        tmp_path = self.relation_dir / f"{MANIFEST_FILENAME}.{os.getpid()}.tmp"
+        tmp_path.write_text(json.dumps(manifest, indent=2))
+        os.replace(tmp_path, self.relation_dir / MANIFEST_FILENAME)
+
+
+class RelationStore:
+    """
+    Read a relation from a columnar store.
+
+    The codes are memory-mapped, so that a partition is loaded lazily as a
+    slice of the columns, without parsing any text.
+    """
+
+    def __init__(self, relation_dir: Path) -> None:
+        """
+        Open a relation.
+
+        :param relation_dir: the directory of the relation.
+        """
+        self.relation_dir = Path(relation_dir)
+        self.manifest = json.loads((self.relation_dir / MANIFEST_FILENAME).read_text())
+        self._dictionary: Optional[np.ndarray] = None
+
+    @property
+    def relation(self) -> str:
+        return self.manifest["relation"]
+
+    @property
+    def partitions(self) -> Dict[str, Tuple[int, int]]:
+        return {
+            name: (start, stop)
+            for name, (start, stop) in self.manifest["partitions"].items()
+        }
+
+    @property
+    def dictionary(self) -> np.ndarray:
+        """Get the distinct values, indexed by their code."""
+        if self._dictionary is None:
+            text = (self.relation_dir / self.manifest["dictionary"]).read_text(
+                encoding="utf-8"
+            )
+            values = text.split("\n") if self.manifest["nb_values"] > 0 else []
+            self._dictionary = np.array(values, dtype=object)
+        return self._dictionary
+
+    def get_range(self, partition: Optional[str] = None) -> Tuple[int, int]:
+        """
+        Get the range of rows of a partition.
+
+        :param partition: the partition; by default, all the rows.
+        :return: the first row and the row after the last one.
+        :raises KeyError: if the partition does not exist.
+        """
+        if partition is None:
+            return 0, self.manifest["nb_rows"]
+        return self.partitions[partition]
+
+    def codes(self, partition: Optional[str] = None) -> List[np.ndarray]:
+        """
+        Get the codes of the rows of a partition.
+
+        :param partition: the partition; by default, all the rows.
+        :return: one memory-mapped array of codes per column.
+        """
+        return self.codes_in_range(*self.get_range(partition))
+
+    def codes_in_range(self, start: int, stop: int) -> List[np.ndarray]:
+        """Get the codes of a range of rows, one memory-mapped array per column."""
+        columns = []
+        for filename in self.manifest["columns"]:
+            path = self.relation_dir / filename
+            if self.manifest["nb_rows"] == 0:
+                columns.append(np.empty(0, dtype=self.manifest["dtype"]))
+                continue
+            column = np.memmap(path, dtype=self.manifest["dtype"], mode="r")
+            columns.append(column[start:stop])
+        return columns
+
+    def columns(self, partition: Optional[str] = None) -> List[np.ndarray]:
+        """
+        Get the values of the rows of a partition.
+
+        :param partition: the partition; by default, all the rows.
+        :return: one array of strings per column.
+        """
+        dictionary = self.dictionary
+        return [dictionary[codes] for codes in self.codes(partition)]
+
+    def lines(self, partition: Optional[str] = None) -> Iterator[str]:
+        """
+        Get lazily the rows of a partition, as CSV lines without quotes.
+
+        :param partition: the partition; by default, all the rows.
+        :return: the lines, in the order the rows were written.
+        """
+        return self.lines_in_range(*self.get_range(partition))
+
+    def lines_in_range(self, start: int, stop: int) -> Iterator[str]:
+        """Get lazily a range of rows, as CSV lines without quotes."""
+        dictionary = self.dictionary
+        codes = self.codes_in_range(start, stop)
+        nb_rows = len(codes[0]) if codes else 0
+        for start in range(0, nb_rows, ROWS_PER_CHUNK):
+            stop = start + ROWS_PER_CHUNK
+            values = [dictionary[column[start:stop]] for column in codes]
+            yield from map(",".join, zip(*values))
+
+
+def get_relation_dirs(store_dir: Path) -> List[Path]:
+    """
+    Get the relations of a store.
+
+    :param store_dir: the directory of the store.
+    :return: the directories of the relations, sorted by name.
+    """
+    manifests = Path(store_dir).glob(f"*/{MANIFEST_FILENAME}")
+    return sorted(manifest.parent for manifest in manifests)
+
+
+def load_relation(
+    store_dir: Path, relation: str, partition: Optional[str] = None
+) -> List[np.ndarray]:
+    """
+    Load the values of a relation, e.g. to analyse a dataset.
+
+    :param store_dir: the directory of the store.
+    :param relation: the relation.
+    :param partition: the partition; by default, all the rows.
+    :return: one array of strings per column.
+    """
+    return RelationStore(Path(store_dir) / relation).columns(partition)
+
+
+def write_relation(
+    relation_dir: Path,
+    relation: str,
+    sources: Sequence[Tuple[Optional[str], Iterable[str]]],
+    prefixes: Sequence[Tuple[str, Optional[int]]] = (),
+) -> int:
+    """
+    Write a relation to a columnar store.
+
+    :param relation_dir: the directory of the relation.
+    :param relation: the name of the relation.
+    :param sources: pairs (partition, rows): the rows of each source are
+      appended, and recorded as a partition if its name is not None.
+    :param prefixes: pairs (partition, number of rows, None for all of them)
+      recorded as partitions made of the first rows.
+    :return: the number of rows.
+    """
+    with RelationWriter(relation_dir, relation) as writer:
+        for partition, lines in sources:
+            writer.append(lines, partition)
+        for partition, nb_rows in prefixes:
+            writer.add_prefix(partition, nb_rows)
+    return writer.nb_rows
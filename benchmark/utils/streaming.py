@@ -0,0 +1,241 @@
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import suppress
+from dataclasses import dataclass
+from functools import partial
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence
+
+# DLV^E only loads the files named after the predicates relevant to the query,
+# as in <predicate>.data, so the pipes are named the same way
+FIFO_SUFFIX = ".data"
+WRITE_BUFFER_SIZE = 1 << 20
+# number of facts joined before each write
+FACTS_PER_CHUNK = 1 << 12
+# how often the pipes not opened by the reader are released at exit
+RELEASE_INTERVAL = 0.05
+
+
+@dataclass(frozen=True)
+class FactSource:
+    """A relation whose rows, CSV lines without quotes, are read lazily."""
+
+    predicate: str
+    read_rows: Callable[[], Iterable[str]]
+
+
+def _read_csv_rows(path: Path) -> Iterator[str]:
+    with path.open(newline="", encoding="utf-8") as f:
+        for line in f:
+            yield line.rstrip("\r\n")
+
+
+def csv_source(path: Path, predicate: Optional[str] = None) -> FactSource:
+    """
+    Get a CSV file as a source of facts, e.g. a dataset file for Vadalog.
+
+    :param path: the file.
+    :param predicate: the predicate; by default, the name of the file
+      without extension.
+    :return: the source.
+    """
+    path = Path(path)
+    predicate = predicate if predicate is not None else path.stem
+    return FactSource(predicate, partial(_read_csv_rows, path))
+
+
+def store_sources(store_dir: Path, partition: str) -> List[FactSource]:
+    """
+    Get the relations of a columnar store as sources of facts.
+
+    :param store_dir: the directory of the store.
+    :param partition: the partition to read from each relation.
+    :return: one source per relation, sorted by name.
+    :raises ValueError: if the store is empty, or a relation does not have
+      the partition.
+    """
+    # imported here, as NumPy is slow to import and only needed for stores
+    from benchmark.utils.store import RelationStore, get_relation_dirs
+
+    sources = []
+    for relation_dir in get_relation_dirs(store_dir):
+        store = RelationStore(relation_dir)
+        if partition not in store.partitions:
+            raise ValueError(f"relation {store.relation} has no partition {partition}")
+        start, stop = store.get_range(partition)
+        read_rows = partial(store.lines_in_range, start, stop)
+        sources.append(FactSource(store.relation, read_rows))
+    if not sources:
+        raise ValueError(f"no relation found in store {store_dir}")
+    return sources
+
+
+def get_sources(
+    csv_paths: Sequence[Path] = (),
+    store_dir: Optional[Path] = None,
+    partition: Optional[str] = None,
+) -> List[FactSource]:
+    """
+    Get the sources of facts of a run.
+
+    :param csv_paths: CSV files, each one a relation named after the file.
+    :param store_dir: a columnar store, whose relations are added.
+    :param partition: the partition of the store; required with a store.
+    :return: the sources.
+    :raises ValueError: if the partition of the store cannot be read.
+    """
+    sources = list(map(csv_source, csv_paths))
+    if store_dir is not None:
+        if partition is None:
+            raise ValueError("a partition of the store is required")
+        sources += store_sources(store_dir, partition)
+    return sources
+
+
+def get_fifo_path(fifo_dir: Path, source: FactSource) -> Path:
+    """Get the path of the pipe of a source, e.g. <fifo_dir>/person.data."""
+    return Path(fifo_dir) / (source.predicate + FIFO_SUFFIX)
+
+
+def _quote(value: str) -> str:
+    # values already quoted are kept, as done when the fact files are written
+    if value[:1] == '"' and value[-1:] == '"' and len(value) > 1:
+        return value
+    return f'"{value}"'
+
+
+def to_facts(rows: Iterable[str], predicate: str) -> Iterator[str]:
+    """Transform CSV lines into facts, e.g. 'a,b' into 'p("a","b").'."""
+    prefix = predicate + "("
+    for row in rows:
+        if row:
+            yield prefix + ",".join(map(_quote, row.split(","))) + ")."
+
+
+@dataclass
+class StreamStatistics:
+    """What has been written to the pipes."""
+
+    nb_facts: int = 0
+    nb_bytes: int = 0
+    # time spent converting and writing, summed over the writers; it does not
+    # include the time waiting for the reader to open a pipe
+    time_writing: float = 0.0
+
+    def lines(self) -> List[str]:
+        """Format the statistics as 'Label: number' lines, as DLV^E prints them."""
+        return [
+            f"Streamed facts: {self.nb_facts}",
+            f"Streamed bytes: {self.nb_bytes}",
+            f"Stream writing time: {self.time_writing:.6f} sec",
+        ]
+
+
+class FactPipes:
+    """
+    Stream facts to another process through named pipes.
+
+    Within the context, each source has a FIFO in fifo_dir, which the reading
+    process (e.g. DLV^E) takes as an input file. A pool of writer threads
+    converts the rows of the sources into facts while the reader consumes
+    them, so that the facts are never written to disk. Each pipe is named
+    after its predicate, e.g. person.data.
+
+    A writer opens its pipe before reading its source: if the source fails,
+    the reader sees a truncated input and the error is raised when the
+    context exits. At exit, the pipes never opened by the reader (e.g. the
+    ones of the predicates DLV^E finds irrelevant to the query) are released,
+    so that no writer is left waiting for it.
+    """
+
+    def __init__(
+        self,
+        fifo_dir: Path,
+        sources: Sequence[FactSource],
+        workers: Optional[int] = None,
+    ) -> None:
+        """
+        Initialize the pipes.
+
+        :param fifo_dir: the directory where to create the FIFOs.
+        :param sources: the sources, one per predicate, in the order the
+          reader opens them.
+        :param workers: the number of writer threads; by default, one per
+          source, so that the reader can open the pipes in any order.
+        """
+        self.fifo_dir = Path(fifo_dir)
+        self.sources = list(sources)
+        self.paths = [get_fifo_path(self.fifo_dir, source) for source in self.sources]
+        if len(set(self.paths)) < len(self.paths):
+            raise ValueError("the sources must have distinct predicates")
+        self.statistics = StreamStatistics()
+        self._workers = workers or max(len(self.sources), 1)
+        self._lock = threading.Lock()
+        self._closing = threading.Event()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._futures: List[Future] = []
+
+    def __enter__(self) -> "FactPipes":
+        self.fifo_dir.mkdir(parents=True, exist_ok=True)
+        for path in self.paths:
+            with suppress(FileNotFoundError):
+                path.unlink()
+            os.mkfifo(path)
+        self._executor = ThreadPoolExecutor(
+            self._workers, thread_name_prefix="fact-writer"
+        )
+        self._futures = [
+            self._executor.submit(self._write, source, path)
+            for source, path in zip(self.sources, self.paths)
+        ]
+        return self
+
+    def __exit__(self, *_) -> None:
+        self._closing.set()
+        pending = set(self._futures)
+        while pending:
+            self._release()
+            _done, pending = wait(pending, timeout=RELEASE_INTERVAL)
+        self._executor.shutdown()
+        for path in self.paths:
+            with suppress(FileNotFoundError):
+                path.unlink()
+        for future in self._futures:
+            future.result()
+
+    def _release(self) -> None:
+        """Unblock the writers waiting for the reader to open their pipe."""
+        for path in self.paths:
+            with suppress(OSError):
+                os.close(os.open(path, os.O_RDONLY | os.O_NONBLOCK))
+
+    def _write(self, source: FactSource, path: Path) -> None:
+        nb_facts = nb_bytes = 0
+        start = None
+        try:
+            # blocks until the reader opens the pipe
+            with path.open("wb", buffering=WRITE_BUFFER_SIZE) as f:
+                if self._closing.is_set():
+                    return
+                start = time.perf_counter()
+                facts = to_facts(source.read_rows(), source.predicate)
+                while True:
+                    chunk = list(islice(facts, FACTS_PER_CHUNK))
+                    if not chunk:
+                        break
+                    data = ("\n".join(chunk) + "\n").encode("utf-8")
+                    f.write(data)
+                    nb_facts += len(chunk)
+                    nb_bytes += len(data)
+        except BrokenPipeError:
+            # the reader exited before reading the whole input
+            return
+        finally:
+            with self._lock:
+                self.statistics.nb_facts += nb_facts
+                self.statistics.nb_bytes += nb_bytes
+                if start is not None:
+                    self.statistics.time_writing += time.perf_counter() - start
@@ -1,14 +1,20 @@
 #!/usr/bin/env python3
+from collections import defaultdict
+from functools import partial
+from operator import itemgetter
 from pathlib import Path
-from typing import Callable, Dict
+from typing import Callable, Dict, List, Tuple
 
 from benchmark.tools import ToolID
 from benchmark.utils.base import remove_dir_or_fail
+from benchmark.utils.store import STORE_DIR_NAME
 from scripts import ROOT_DIR
+from scripts.dataset_generation.tasks import GenerationTask, StoreTask, run_tasks
 from scripts.utils.base import (
     from_str_to_int_with_label,
     get_nb_columns_from_csv,
     get_normalized_integer,
+    read_lines,
     transform_dataset_file_with_header,
     write_lines_for_vadalog,
 )
@@ -19,15 +25,23 @@ DOCTORS_DATASET_DIR = ROOT_DIR / Path("third_party/original_datasets/doctors")
 dataset_handlers: Dict[ToolID, Callable] = {
     ToolID.VADALOG: write_lines_for_vadalog,
     ToolID.DLV: transform_dataset_file_with_header,
+    ToolID.NATIVE: write_lines_for_vadalog,
 }
 
 
-def generate_doctors(input_dir: Path, output_dir: Path, force: bool):
+def get_doctors_tasks(
+    input_dir: Path, output_dir: Path, force: bool
+) -> List[GenerationTask]:
+    """
+    Prepare the output directories of the doctors dataset, and get the tasks
+    that write its files, one per tool, partition and relation.
+    """
     dataset_name = input_dir.name
     output_dataset_dir = output_dir / dataset_name
     remove_dir_or_fail(output_dataset_dir, force)
     output_dataset_dir.mkdir(parents=True)
 
+    tasks = []
     for tool in ToolID:
         dataset_handler = dataset_handlers[tool]
         tool_output_dataset_dir = output_dataset_dir / tool.value
@@ -51,9 +65,58 @@ def generate_doctors(input_dir: Path, output_dir: Path, force: bool):
                 output_dataset_file = output_dataset_subdir / (
                     dataset_file.stem + ".data"
                 )
-                dataset_handler(
-                    "",
-                    dataset_file.read_text().splitlines(keepends=False),
-                    output_dataset_file,
-                    dataset_file.stem,
+                tasks.append(
+                    GenerationTask(
+                        dataset_name,
+                        tool,
+                        normalized_partition_name,
+                        dataset_file.stem,
+                        partial(read_lines, dataset_file),
+                        dataset_handler,
+                        (output_dataset_file,),
+                    )
                 )
+    return tasks
+
+
+def get_doctors_store_tasks(
+    input_dir: Path, output_dir: Path, force: bool
+) -> List[StoreTask]:
+    """
+    Prepare the output directory of the doctors dataset, and get the tasks
+    that write its columnar store, one per relation.
+
+    The partitions of a relation are independent: they are appended one
+    after the other, each one as a range of rows.
+    """
+    dataset_name = input_dir.name
+    output_dataset_dir = output_dir / dataset_name
+    remove_dir_or_fail(output_dataset_dir, force)
+    store_dir = output_dataset_dir / STORE_DIR_NAME
+    store_dir.mkdir(parents=True)
+
+    sizes = map(lambda p: from_str_to_int_with_label(p.name), input_dir.iterdir())
+    max_nb_digits = len(str(max(sizes)))
+
+    sources: Dict[str, List[Tuple[str, Callable]]] = defaultdict(list)
+    for subdir in input_dir.iterdir():
+        partition_name = get_normalized_integer(
+            from_str_to_int_with_label(subdir.name), max_nb_digits
+        )
+        for dataset_file in subdir.iterdir():
+            sources[dataset_file.stem].append(
+                (partition_name, partial(read_lines, dataset_file))
+            )
+    return [
+        StoreTask(
+            dataset_name,
+            relation,
+            store_dir / relation,
+            tuple(sorted(relation_sources, key=itemgetter(0))),
+        )
+        for relation, relation_sources in sorted(sources.items())
+    ]
+
+
+def generate_doctors(input_dir: Path, output_dir: Path, force: bool, workers: int = 1):
+    run_tasks(get_doctors_tasks(input_dir, output_dir, force), workers)
@@ -0,0 +1,127 @@
+import shutil
+from collections import defaultdict
+from functools import partial
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from benchmark.tools import ToolID
+from benchmark.utils.store import STORE_DIR_NAME, RelationStore, get_relation_dirs
+from scripts.dataset_generation import doctors, psc
+from scripts.dataset_generation.tasks import COPY, GenerationTask
+
+# the handlers writing the engine-specific files of each dataset
+dataset_handlers: Dict[str, Dict[ToolID, Callable]] = {
+    "psc": psc.dataset_handlers,
+    "doctors": doctors.dataset_handlers,
+}
+
+
+def read_store_lines(relation_dir: Path, start: int, stop: int) -> Iterator[str]:
+    """Read lazily a range of rows of a relation store, as CSV lines."""
+    return RelationStore(relation_dir).lines_in_range(start, stop)
+
+
+def get_store_dataset_dirs(dataset_dir: Path) -> List[Path]:
+    """Get the directories of the datasets that have a columnar store."""
+    return sorted(path.parent for path in dataset_dir.glob(f"*/{STORE_DIR_NAME}"))
+
+
+def get_export_tasks(
+    dataset_dir: Path,
+    tools: Sequence[ToolID],
+    partitions: Optional[Sequence[str]] = None,
+    link_mode: str = COPY,
+) -> List[GenerationTask]:
+    """
+    Prepare the tool directories of a dataset, and get the tasks that export
+    its columnar store to the files of each tool.
+
+    The files are the same as the ones generate-datasets writes directly.
+    The partitions of a relation with the same range of rows are written
+    once, and copied or linked depending on link_mode; the partitions that
+    are prefixes of a larger one are cut from its file.
+
+    :param dataset_dir: the directory of the dataset, with its store.
+    :param tools: the tools to export the dataset for; their directories are
+      replaced.
+    :param partitions: the partitions to export; by default, all of them.
+    :param link_mode: one of LINK_MODES.
+    :return: the generation tasks.
+    """
+    dataset_name = dataset_dir.name
+    handlers = dataset_handlers.get(dataset_name, doctors.dataset_handlers)
+    stores = [
+        RelationStore(relation_dir)
+        for relation_dir in get_relation_dirs(dataset_dir / STORE_DIR_NAME)
+    ]
+    tasks = []
+    for tool in tools:
+        tool_dir = dataset_dir / tool.value
+        shutil.rmtree(tool_dir, ignore_errors=True)
+        for store in stores:
+            ranges = {
+                partition: rows
+                for partition, rows in store.partitions.items()
+                if partitions is None or partition in partitions
+            }
+            for partition in ranges:
+                (tool_dir / partition).mkdir(parents=True, exist_ok=True)
+            for start, group in _group_by_start(ranges).items():
+                tasks.append(
+                    _get_export_task(
+                        dataset_name,
+                        tool,
+                        handlers[tool],
+                        store,
+                        tool_dir,
+                        start,
+                        group,
+                        link_mode,
+                    )
+                )
+    return tasks
+
+
+def _group_by_start(
+    ranges: Dict[str, Tuple[int, int]]
+) -> Dict[int, List[Tuple[int, str]]]:
+    """Group the partitions by first row, sorted by decreasing last row."""
+    groups: Dict[int, List[Tuple[int, str]]] = defaultdict(list)
+    for partition, (start, stop) in sorted(ranges.items()):
+        groups[start].append((stop, partition))
+    for group in groups.values():
+        group.sort(key=lambda pair: -pair[0])
+    return groups
+
+
+def _get_export_task(
+    dataset_name: str,
+    tool: ToolID,
+    handler: Callable,
+    store: RelationStore,
+    tool_dir: Path,
+    start: int,
+    group: List[Tuple[int, str]],
+    link_mode: str,
+) -> GenerationTask:
+    relation = store.relation
+    stop, partition = group[0]
+    output_files = [tool_dir / partition / f"{relation}.data"]
+    prefixes = []
+    for other_stop, other_partition in group[1:]:
+        output_file = tool_dir / other_partition / f"{relation}.data"
+        if other_stop == stop:
+            output_files.append(output_file)
+        else:
+            prefixes.append((other_stop - start, output_file))
+    return GenerationTask(
+        dataset_name,
+        tool,
+        partition,
+        relation,
+        partial(read_store_lines, store.relation_dir, start, stop),
+        handler,
+        tuple(output_files),
+        link_mode,
+        tuple(sorted(prefixes)),
+    )
@@ -1,14 +1,19 @@
 #!/usr/bin/env python3
+from functools import partial
+from itertools import islice
 from pathlib import Path
-from typing import Callable, Dict
+from typing import Callable, Dict, Iterator, List
 
 from benchmark.tools import ToolID
 from benchmark.utils.base import remove_dir_or_fail
+from benchmark.utils.store import STORE_DIR_NAME
 from scripts import ROOT_DIR
+from scripts.dataset_generation.tasks import COPY, GenerationTask, StoreTask, run_tasks
 from scripts.utils.base import (
     get_normalized_integer,
     normalize,
     normalize_person_dataset,
+    read_lines,
     transform_dataset_file_with_header,
     write_lines_for_vadalog,
 )
@@ -23,71 +28,183 @@ COMPANIES_KP_DATASET_PATH = DBPEDIA_DATASET_DIR / "dbpedia_companies_kp.csv"
 CONTROL_DATASET_PATH = DBPEDIA_DATASET_DIR / "dbpedia_company_control.csv"
 
 SIZES = [1000, 10000, 100000, 500000, 1000000]
+# where the relations shared by all the partitions are written, if linked
+SHARED_DIR_NAME = ".shared"
 
 
 dataset_handlers: Dict[ToolID, Callable] = {
     ToolID.VADALOG: write_lines_for_vadalog,
     ToolID.DLV: transform_dataset_file_with_header,
+    ToolID.NATIVE: write_lines_for_vadalog,
 }
 
 
-def generate_psc(output_dir: Path, force: bool):
+def read_person_rows(size: int) -> Iterator[str]:
+    """Read lazily the first rows of the person dataset, normalized."""
+    # skip the header and the two lines of DBpedia metadata
+    rows = islice(read_lines(FULL_PERSON_DATASET_PATH), 3, None)
+    return islice(normalize_person_dataset(rows), size)
+
+
+def read_control_rows() -> Iterator[str]:
+    """Read lazily the rows of the control dataset, normalized."""
+    return normalize(read_lines(CONTROL_DATASET_PATH), nb_https=2)
+
+
+def read_kp_rows() -> Iterator[str]:
+    """Read lazily the rows of the key person dataset, normalized."""
+    # skip the header
+    return normalize(islice(read_lines(COMPANIES_KP_DATASET_PATH), 1, None), nb_https=2)
+
+
+def get_psc_tasks(
+    output_dir: Path, force: bool, link_mode: str = COPY
+) -> List[GenerationTask]:
+    """
+    Prepare the output directories of the psc dataset, and get the tasks
+    that write its files.
+
+    The datasets are streamed from the input files, so that the memory used
+    does not depend on their size; each person partition only reads its
+    prefix. The company datasets are the same for all the partitions: they
+    are transformed once per tool, then copied.
+
+    With a link mode other than copy, the company datasets are written once
+    per tool in the .shared directory, and linked in each partition; the
+    person dataset is written once per tool, in the largest partition, and
+    the smaller partitions are copies of its prefixes.
+
+    :param output_dir: the output directory.
+    :param force: force the removal of the output directory.
+    :param link_mode: one of LINK_MODES.
+    :return: the generation tasks.
+    """
     dataset_name = "psc"
     output_dataset_dir = output_dir / dataset_name
     remove_dir_or_fail(output_dataset_dir, force)
     output_dataset_dir.mkdir(parents=True)
 
     dataset_max_digits = len(str(SIZES[-1]))
-    person_dataset_lines = FULL_PERSON_DATASET_PATH.read_text().splitlines(
-        keepends=False
-    )
-    person_dataset_header, person_dataset_rows = (
-        person_dataset_lines[0],
-        person_dataset_lines[3:],
-    )
-    person_dataset_header = person_dataset_header.split(",")[0]
-    person_dataset_rows = normalize_person_dataset(person_dataset_rows)
-
-    control_lines = CONTROL_DATASET_PATH.read_text().splitlines(keepends=False)
-    control_header, control_rows = "company_1,company_2", normalize(
-        control_lines, nb_https=2
-    )
-    kp_lines = COMPANIES_KP_DATASET_PATH.read_text().splitlines(keepends=False)
-    kp_header, kp_rows = kp_lines[0], normalize(kp_lines[1:], nb_https=2)
+    deduplicate = link_mode != COPY
 
+    tasks = []
     for tool in ToolID:
         dataset_handler = dataset_handlers[tool]
         tool_output_dataset_dir = output_dataset_dir / tool.value
         tool_output_dataset_dir.mkdir()
 
+        partition_dirs = []
         for size in SIZES:
-            # copy persons
             normalized_partition_name = get_normalized_integer(size, dataset_max_digits)
             tool_output_partition_dir = (
                 tool_output_dataset_dir / normalized_partition_name
             )
             tool_output_partition_dir.mkdir()
+            partition_dirs.append(tool_output_partition_dir)
 
-            dataset_partition = person_dataset_rows[:size]
-            output_dataset_file = tool_output_partition_dir / "person.data"
-            dataset_handler(
-                "",
-                dataset_partition,
-                output_dataset_file,
-                "person",
+            # copy persons
+            if not deduplicate:
+                tasks.append(
+                    GenerationTask(
+                        dataset_name,
+                        tool,
+                        normalized_partition_name,
+                        "person",
+                        partial(read_person_rows, size),
+                        dataset_handler,
+                        (tool_output_partition_dir / "person.data",),
+                    )
+                )
+        if deduplicate:
+            # the smaller partitions are prefixes of the largest one
+            tasks.append(
+                GenerationTask(
+                    dataset_name,
+                    tool,
+                    partition_dirs[-1].name,
+                    "person",
+                    partial(read_person_rows, SIZES[-1]),
+                    dataset_handler,
+                    (partition_dirs[-1] / "person.data",),
+                    prefixes=tuple(
+                        (size, partition_dir / "person.data")
+                        for size, partition_dir in zip(SIZES[:-1], partition_dirs)
+                    ),
+                )
             )
 
-            # copy company_control
-            dataset_handler(
-                "",
-                control_rows,
-                tool_output_partition_dir / "control.data",
-                "control",
+        # copy company_control and companies_kp
+        shared_dir = output_dataset_dir / SHARED_DIR_NAME / tool.value
+        if deduplicate:
+            shared_dir.mkdir(parents=True)
+        company_readers = [("control", read_control_rows), ("keyPerson", read_kp_rows)]
+        for relation, reader in company_readers:
+            output_files = [
+                partition_dir / (relation + ".data") for partition_dir in partition_dirs
+            ]
+            if deduplicate:
+                output_files.insert(0, shared_dir / (relation + ".data"))
+            tasks.append(
+                GenerationTask(
+                    dataset_name,
+                    tool,
+                    "*",
+                    relation,
+                    reader,
+                    dataset_handler,
+                    tuple(output_files),
+                    link_mode,
+                )
             )
-            # copy companies_kp
-            dataset_handler(
-                "",
-                kp_rows,
-                tool_output_partition_dir / "keyPerson.data",
-                "keyPerson",
+    return tasks
+
+
+def get_psc_store_tasks(output_dir: Path, force: bool) -> List[StoreTask]:
+    """
+    Prepare the output directory of the psc dataset, and get the tasks that
+    write its columnar store, one per relation.
+
+    The person partitions are prefixes of the largest one, and the company
+    relations are the same for all the partitions.
+
+    :param output_dir: the output directory.
+    :param force: force the removal of the output directory.
+    :return: the store tasks.
+    """
+    dataset_name = "psc"
+    output_dataset_dir = output_dir / dataset_name
+    remove_dir_or_fail(output_dataset_dir, force)
+    store_dir = output_dataset_dir / STORE_DIR_NAME
+    store_dir.mkdir(parents=True)
+
+    dataset_max_digits = len(str(SIZES[-1]))
+    partition_names = [
+        get_normalized_integer(size, dataset_max_digits) for size in SIZES
+    ]
+    tasks = [
+        StoreTask(
+            dataset_name,
+            "person",
+            store_dir / "person",
+            ((partition_names[-1], partial(read_person_rows, SIZES[-1])),),
+            tuple(zip(partition_names[:-1], SIZES[:-1])),
+        )
+    ]
+    company_readers = [("control", read_control_rows), ("keyPerson", read_kp_rows)]
+    for relation, reader in company_readers:
+        tasks.append(
+            StoreTask(
+                dataset_name,
+                relation,
+                store_dir / relation,
+                ((None, reader),),
+                tuple((partition_name, None) for partition_name in partition_names),
             )
+        )
+    return tasks
+
+
+def generate_psc(
+    output_dir: Path, force: bool, workers: int = 1, link_mode: str = COPY
+):
+    run_tasks(get_psc_tasks(output_dir, force, link_mode), workers)
@@ -0,0 +1,421 @@
+import math
+import random
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+from benchmark.tools import ToolID
+from benchmark.utils.base import remove_dir_or_fail
+from benchmark.utils.store import STORE_DIR_NAME
+from scripts.dataset_generation import doctors, psc
+from scripts.dataset_generation.tasks import GenerationTask, StoreTask
+from scripts.utils.base import get_normalized_integer
+
+DATASETS = ("doctors", "psc")
+# the share of the doctors rows in the hospital relation, as in the shipped data
+HOSPITAL_SHARE = 0.01
+# the shares of the treatment and medprescription relations in the rows that
+# reference a physician, as in the shipped data (55k and 40k rows at 100k)
+TREATMENT_SHARE = 55 / 95
+# how many of the last rows a duplicate is drawn from
+DUPLICATE_WINDOW = 1 << 12
+RESOURCE_PREFIX = "http://dbpedia.org/resource/"
+# multipliers coprime with 26 and 10, so that the identifiers derived from a
+# key are a permutation of the key space: distinct keys get distinct names;
+# the first one is close to 26^10 divided by the golden ratio, so that
+# consecutive keys get unrelated names
+_NAME_MULTIPLIER = 87_246_063_199_851
+_CODE_MULTIPLIER = 104_729
+
+
+@dataclass(frozen=True)
+class SyntheticConfig:
+    """
+    The knobs of a synthetic dataset.
+
+    The fanout is the average number of rows referencing each join key, e.g.
+    the treatments and prescriptions of a physician; the key domains shrink
+    as it grows. The skews are the exponents of the Zipf distributions of
+    the join keys referenced (0 for uniform, 1 for the classic Zipf law): the
+    NPIs of the physicians and the persons of psc, and the hospitals. A share
+    duplicate_ratio of the rows of every relation repeats one of the rows
+    just before it.
+    """
+
+    fanout: float = 100.0
+    key_skew: float = 0.0
+    hospital_skew: float = 0.0
+    duplicate_ratio: float = 0.0
+    seed: int = 0
+
+    def __post_init__(self) -> None:
+        if self.fanout < 1:
+            raise ValueError(f"fanout must be at least 1, got {self.fanout}")
+        if self.key_skew < 0 or self.hospital_skew < 0:
+            raise ValueError("the skews must be non-negative")
+        if not 0 <= self.duplicate_ratio < 1:
+            raise ValueError(
+                f"duplicate ratio must be in [0, 1), got {self.duplicate_ratio}"
+            )
+
+
+class ZipfSampler:
+    """
+    Sample integers in [1, n] with probability proportional to 1 / k^s, in
+    constant time and memory, by rejection-inversion (Hormann and Derflinger,
+    1996); with s = 0, the integers are uniform.
+    """
+
+    def __init__(self, n: int, s: float, rng: random.Random) -> None:
+        if n < 1:
+            raise ValueError(f"the number of elements must be positive, got {n}")
+        self.n = n
+        self.s = s
+        self.rng = rng
+        if s > 0:
+            self._h_integral_x1 = self._h_integral(1.5) - 1.0
+            self._h_integral_n = self._h_integral(n + 0.5)
+            self._threshold = 2.0 - self._h_integral_inverse(
+                self._h_integral(2.5) - self._h(2.0)
+            )
+
+    def sample(self) -> int:
+        if self.s == 0:
+            return self.rng.randint(1, self.n)
+        while True:
+            u = self._h_integral_n + self.rng.random() * (
+                self._h_integral_x1 - self._h_integral_n
+            )
+            x = self._h_integral_inverse(u)
+            k = min(max(int(x + 0.5), 1), self.n)
+            if k - x <= self._threshold or u >= self._h_integral(k + 0.5) - self._h(k):
+                return k
+
+    def _h(self, x: float) -> float:
+        return math.exp(-self.s * math.log(x))
+
+    def _h_integral(self, x: float) -> float:
+        log_x = math.log(x)
+        return _expm1_ratio((1.0 - self.s) * log_x) * log_x
+
+    def _h_integral_inverse(self, x: float) -> float:
+        t = max(x * (1.0 - self.s), -1.0)
+        return math.exp(_log1p_ratio(t) * x)
+
+
+def _log1p_ratio(x: float) -> float:
+    """log(1 + x) / x, accurate near 0."""
+    if abs(x) > 1e-8:
+        return math.log1p(x) / x
+    return 1.0 - x * (0.5 - x * (1.0 / 3.0 - 0.25 * x))
+
+
+def _expm1_ratio(x: float) -> float:
+    """(exp(x) - 1) / x, accurate near 0."""
+    if abs(x) > 1e-8:
+        return math.expm1(x) / x
+    return 1.0 + x * 0.5 * (1.0 + x / 3.0 * (1.0 + 0.25 * x))
+
+
+def _rng(
+    config: SyntheticConfig, dataset: str, relation: str, size: int
+) -> random.Random:
+    # each relation has its own stream, so that they can be generated apart
+    return random.Random(f"{config.seed}/{dataset}/{relation}/{size}")
+
+
+def _letters(key: int, length: int) -> str:
+    value = (key * _NAME_MULTIPLIER) % 26**length
+    chars = []
+    for _ in range(length):
+        value, digit = divmod(value, 26)
+        chars.append(chr(ord("A") + digit))
+    return "".join(chars)
+
+
+def _code(key: int) -> str:
+    """A code like the shipped ones, e.g. Th8324, unique for up to 6.76M keys."""
+    value = (key * _CODE_MULTIPLIER) % (26 * 26 * 10_000)
+    letters, digits = divmod(value, 10_000)
+    first, second = divmod(letters, 26)
+    return f"{chr(ord('A') + first)}{chr(ord('a') + second)}{digits:04d}"
+
+
+def _with_duplicates(
+    rows: Iterator[str], nb_rows: int, ratio: float, rng: random.Random
+) -> Iterator[str]:
+    """Take nb_rows rows, a share ratio of them repeating a recent one."""
+    window: List[str] = []
+    for index in range(nb_rows):
+        if window and rng.random() < ratio:
+            yield rng.choice(window)
+            continue
+        row = next(rows)
+        if len(window) < DUPLICATE_WINDOW:
+            window.append(row)
+        else:
+            window[index % DUPLICATE_WINDOW] = row
+        yield row
+
+
+@dataclass(frozen=True)
+class DoctorsSizes:
+    """The number of rows of each doctors relation, and of keys of each domain."""
+
+    treatment: int
+    medprescription: int
+    physician: int
+    hospital: int
+    nb_hospitals: int
+
+    @classmethod
+    def from_size(cls, size: int, fanout: float) -> "DoctorsSizes":
+        """Split a total number of rows among the relations."""
+        hospital = max(1, round(size * HOSPITAL_SHARE))
+        remaining = max(size - hospital, 2)
+        # one physician for every fanout rows referencing one
+        physician = max(1, round(remaining / (fanout + 1)))
+        references = remaining - physician
+        treatment = round(references * TREATMENT_SHARE)
+        return cls(
+            treatment=treatment,
+            medprescription=references - treatment,
+            physician=physician,
+            hospital=hospital,
+            nb_hospitals=max(1, round(treatment / fanout)),
+        )
+
+
+def _doctor(npi: int) -> Tuple[str, str]:
+    """The name and the specialization of a physician, from its NPI."""
+    return _letters(npi, 10), _code(npi)
+
+
+def _hospital(key: int) -> str:
+    return f"HH{key:05d}"
+
+
+def _read_physician_rows(
+    sizes: DoctorsSizes, _config: SyntheticConfig, _random: random.Random
+) -> Iterator[str]:
+    for npi in range(1, sizes.physician + 1):
+        name, spec = _doctor(npi)
+        yield f"{npi},{name},{spec},0.5"
+
+
+def _read_treatment_rows(
+    sizes: DoctorsSizes, config: SyntheticConfig, rng: random.Random
+) -> Iterator[str]:
+    npis = ZipfSampler(sizes.physician, config.key_skew, rng)
+    hospitals = ZipfSampler(sizes.nb_hospitals, config.hospital_skew, rng)
+    for row_id in range(1, sizes.treatment + 1):
+        patient = _letters(rng.getrandbits(40), 10)
+        yield f"{row_id},{patient},{_hospital(hospitals.sample())},{npis.sample()},0.5"
+
+
+def _read_medprescription_rows(
+    sizes: DoctorsSizes, config: SyntheticConfig, rng: random.Random
+) -> Iterator[str]:
+    npis = ZipfSampler(sizes.physician, config.key_skew, rng)
+    for row_id in range(1, sizes.medprescription + 1):
+        npi = npis.sample()
+        name, spec = _doctor(npi)
+        patient = _letters(rng.getrandbits(40), 10)
+        yield f"{row_id},{patient},{npi},{name},{spec},0.7"
+
+
+def _read_hospital_rows(
+    sizes: DoctorsSizes, config: SyntheticConfig, rng: random.Random
+) -> Iterator[str]:
+    npis = ZipfSampler(sizes.physician, config.key_skew, rng)
+    hospitals = ZipfSampler(sizes.nb_hospitals, config.hospital_skew, rng)
+    while True:
+        npi = npis.sample()
+        name, spec = _doctor(npi)
+        yield f"{name},{spec},{_hospital(hospitals.sample())},{npi},1.0"
+
+
+def _person(key: int) -> str:
+    return f"{RESOURCE_PREFIX}Person_{key}"
+
+
+def _company(key: int) -> str:
+    return f"{RESOURCE_PREFIX}Company_{key}"
+
+
+def _read_person_rows(
+    size: int, _config: SyntheticConfig, _random: random.Random
+) -> Iterator[str]:
+    for key in range(1, size + 1):
+        yield _person(key)
+
+
+def _read_key_person_rows(
+    size: int, config: SyntheticConfig, rng: random.Random
+) -> Iterator[str]:
+    nb_companies = _nb_companies(size, config)
+    persons = ZipfSampler(size, config.key_skew, rng)
+    while True:
+        company = rng.randint(1, nb_companies)
+        yield f"{_company(company)},{_person(persons.sample())}"
+
+
+def _read_control_rows(
+    size: int, config: SyntheticConfig, rng: random.Random
+) -> Iterator[str]:
+    # every company is controlled by another one, the controllers being
+    # skewed as the key persons: a few holdings control many companies
+    nb_companies = _nb_companies(size, config)
+    controllers = ZipfSampler(nb_companies, config.key_skew, rng)
+    for company in range(1, nb_companies + 1):
+        controller = controllers.sample()
+        if controller == company:
+            controller = controller % nb_companies + 1
+        yield f"{_company(company)},{_company(controller)}"
+
+
+def _nb_companies(size: int, config: SyntheticConfig) -> int:
+    return max(2, round(size / config.fanout))
+
+
+# the functions making the rows of each relation, given the sizes of the
+# relations (doctors) or the size of the dataset (psc), the knobs and the
+# random generator; the rows of the relations of fixed size are not infinite
+_DOCTORS_ROWS: Dict[str, Callable[..., Iterator[str]]] = {
+    "hospital": _read_hospital_rows,
+    "medprescription": _read_medprescription_rows,
+    "physician": _read_physician_rows,
+    "treatment": _read_treatment_rows,
+}
+_PSC_ROWS: Dict[str, Callable[..., Iterator[str]]] = {
+    "control": _read_control_rows,
+    "keyPerson": _read_key_person_rows,
+    "person": _read_person_rows,
+}
+# the relations whose rows are keys, never duplicated
+_KEY_RELATIONS = ("physician", "person")
+
+
+def read_synthetic_rows(
+    dataset: str, relation: str, size: int, config: SyntheticConfig
+) -> Iterator[str]:
+    """
+    Generate lazily the rows of a relation of a synthetic dataset.
+
+    The rows are the same for the same arguments, whatever the other
+    relations generated; the memory used does not depend on the size.
+
+    :param dataset: one of DATASETS.
+    :param relation: the relation, e.g. treatment.
+    :param size: the size of the dataset: for doctors, the total number of
+      rows of its relations; for psc, the number of persons.
+    :param config: the knobs of the dataset.
+    :return: the rows, as CSV lines.
+    """
+    rng = _rng(config, dataset, relation, size)
+    if dataset == "doctors":
+        sizes = DoctorsSizes.from_size(size, config.fanout)
+        rows = _DOCTORS_ROWS[relation](sizes, config, rng)
+        nb_rows = getattr(sizes, relation)
+    else:
+        rows = _PSC_ROWS[relation](size, config, rng)
+        nb_rows = _nb_companies(size, config) if relation == "control" else size
+    ratio = 0.0 if relation in _KEY_RELATIONS else config.duplicate_ratio
+    return _with_duplicates(iter(rows), nb_rows, ratio, rng)
+
+
+def get_relations(dataset: str) -> List[str]:
+    """Get the relations of a synthetic dataset."""
+    return sorted(_DOCTORS_ROWS if dataset == "doctors" else _PSC_ROWS)
+
+
+# the handlers writing the files of each tool, the same as for the shipped data
+dataset_handlers: Dict[str, Dict[ToolID, Callable]] = {
+    "doctors": doctors.dataset_handlers,
+    "psc": psc.dataset_handlers,
+}
+
+
+def _get_partition_names(sizes: Sequence[int]) -> List[str]:
+    max_nb_digits = len(str(max(sizes)))
+    return [get_normalized_integer(size, max_nb_digits) for size in sizes]
+
+
+def get_synthetic_tasks(
+    dataset: str,
+    sizes: Sequence[int],
+    config: SyntheticConfig,
+    output_dataset_dir: Path,
+    force: bool,
+) -> List[GenerationTask]:
+    """
+    Prepare the output directories of a synthetic dataset, and get the tasks
+    that write its files, one per tool, partition and relation.
+
+    Unlike the shipped psc partitions, the partitions are independent of each
+    other, as the key domains depend on the size.
+
+    :param dataset: one of DATASETS.
+    :param sizes: the sizes of the partitions.
+    :param config: the knobs of the dataset.
+    :param output_dataset_dir: the directory of the dataset.
+    :param force: force the removal of the output directory.
+    :return: the generation tasks.
+    """
+    remove_dir_or_fail(output_dataset_dir, force)
+    tasks = []
+    for tool in ToolID:
+        for size, partition in zip(sizes, _get_partition_names(sizes)):
+            partition_dir = output_dataset_dir / tool.value / partition
+            partition_dir.mkdir(parents=True)
+            for relation in get_relations(dataset):
+                tasks.append(
+                    GenerationTask(
+                        output_dataset_dir.name,
+                        tool,
+                        partition,
+                        relation,
+                        partial(read_synthetic_rows, dataset, relation, size, config),
+                        dataset_handlers[dataset][tool],
+                        (partition_dir / (relation + ".data"),),
+                    )
+                )
+    return tasks
+
+
+def get_synthetic_store_tasks(
+    dataset: str,
+    sizes: Sequence[int],
+    config: SyntheticConfig,
+    output_dataset_dir: Path,
+    force: bool,
+) -> List[StoreTask]:
+    """
+    Prepare the output directory of a synthetic dataset, and get the tasks
+    that write its columnar store, one per relation, with a range of rows per
+    partition.
+
+    :param dataset: one of DATASETS.
+    :param sizes: the sizes of the partitions.
+    :param config: the knobs of the dataset.
+    :param output_dataset_dir: the directory of the dataset.
+    :param force: force the removal of the output directory.
+    :return: the store tasks.
+    """
+    remove_dir_or_fail(output_dataset_dir, force)
+    store_dir = output_dataset_dir / STORE_DIR_NAME
+    store_dir.mkdir(parents=True)
+    partitions = list(zip(_get_partition_names(sizes), sizes))
+    return [
+        StoreTask(
+            output_dataset_dir.name,
+            relation,
+            store_dir / relation,
+            tuple(
+                (partition, partial(read_synthetic_rows, dataset, relation, size, config))
+                for partition, size in partitions
+            ),
+        )
+        for relation in get_relations(dataset)
+    ]
@@ -0,0 +1,197 @@
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import suppress
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Tuple, Union
+
+from benchmark.tools import ToolID
+from benchmark.utils.store import write_relation
+
+COPY_CHUNK_SIZE = 1 << 24
+
+# how the files with the same content are materialized
+COPY = "copy"
+HARDLINK = "hardlink"
+SYMLINK = "symlink"
+LINK_MODES = (COPY, HARDLINK, SYMLINK)
+
+
+def link_file(source: Path, target: Path, link_mode: str) -> None:
+    """
+    Make target have the same content as source.
+
+    :param source: the existing file.
+    :param target: the file to create.
+    :param link_mode: copy the file, hard link it, or make a relative symlink.
+    """
+    if link_mode == COPY:
+        shutil.copyfile(source, target)
+    elif link_mode == HARDLINK:
+        os.link(source, target)
+    elif link_mode == SYMLINK:
+        os.symlink(os.path.relpath(source, target.parent), target)
+    else:
+        raise ValueError(
+            f"unknown link mode {link_mode!r}, expected one of {LINK_MODES}"
+        )
+
+
+def copy_prefix(source: Path, target: Path, nb_bytes: int) -> None:
+    """
+    Copy the first bytes of a file.
+
+    The copy is done in the kernel with copy_file_range, where available:
+    the data does not go through user space, and file systems supporting it
+    (e.g. Btrfs, XFS, NFS) share the blocks instead of duplicating them.
+
+    :param source: the source file.
+    :param target: the file to create.
+    :param nb_bytes: the number of bytes to copy.
+    """
+    with source.open("rb") as fsrc, target.open("wb") as fdst:
+        remaining = nb_bytes
+        if hasattr(os, "copy_file_range"):
+            with suppress(OSError):
+                while remaining > 0:
+                    copied = os.copy_file_range(
+                        fsrc.fileno(), fdst.fileno(), min(remaining, COPY_CHUNK_SIZE)
+                    )
+                    if copied == 0:
+                        break
+                    remaining -= copied
+        # fall back to a copy through user space, e.g. across file systems
+        fsrc.seek(nb_bytes - remaining)
+        fdst.seek(nb_bytes - remaining)
+        while remaining > 0:
+            data = fsrc.read(min(remaining, COPY_CHUNK_SIZE))
+            if not data:
+                break
+            fdst.write(data)
+            remaining -= len(data)
+
+
+@dataclass(frozen=True)
+class GenerationTask:
+    """
+    Write a relation of a dataset partition for a tool.
+
+    The rows are produced by reader and written by handler to the first
+    output file; the other output files (e.g. the same relation in other
+    partitions) are copies of it, or links to it, depending on link_mode.
+    Each of the prefixes, pairs (number of rows, output file), is made of the
+    first rows of the first output file; it is copied from it at the right
+    byte offset, without transforming the rows again.
+
+    Tasks are independent of each other, and they must be picklable to run
+    in a worker process: reader and handler must be module-level functions,
+    or partial applications of them.
+    """
+
+    dataset: str
+    tool: ToolID
+    partition: str
+    relation: str
+    reader: Callable[[], Iterable[str]]
+    handler: Callable
+    output_files: Tuple[Path, ...]
+    link_mode: str = COPY
+    prefixes: Tuple[Tuple[int, Path], ...] = ()
+
+    @property
+    def description(self) -> str:
+        description = "/".join(
+            [self.dataset, self.tool.value, self.partition, self.relation]
+        )
+        if self.prefixes:
+            description += f" (+{len(self.prefixes)} prefixes)"
+        return description
+
+    def run(self) -> float:
+        """
+        Run the task.
+
+        :return: the elapsed time in seconds.
+        """
+        start = time.perf_counter()
+        first_output_file, *other_output_files = self.output_files
+        line_counts = [nb_rows for nb_rows, _ in self.prefixes]
+        offsets = self.handler(
+            "", self.reader(), first_output_file, self.relation, line_counts
+        )
+        for output_file in other_output_files:
+            link_file(first_output_file, output_file, self.link_mode)
+        for (_, prefix_file), offset in zip(self.prefixes, offsets):
+            copy_prefix(first_output_file, prefix_file, offset)
+        return time.perf_counter() - start
+
+
+@dataclass(frozen=True)
+class StoreTask:
+    """
+    Write a relation of a dataset to its columnar store.
+
+    The rows of the sources, pairs (partition, reader), are appended one
+    after the other, each one recorded as a partition if it is named; the
+    prefixes, pairs (partition, number of rows or None for all of them), are
+    partitions made of the first rows. See benchmark.utils.store.
+
+    As for GenerationTask, the readers must be picklable.
+    """
+
+    dataset: str
+    relation: str
+    relation_dir: Path
+    sources: Tuple[Tuple[Optional[str], Callable[[], Iterable[str]]], ...]
+    prefixes: Tuple[Tuple[str, Optional[int]], ...] = ()
+
+    @property
+    def description(self) -> str:
+        nb_partitions = len(self.prefixes) + sum(
+            1 for partition, _ in self.sources if partition is not None
+        )
+        return f"{self.dataset}/store/{self.relation} ({nb_partitions} partitions)"
+
+    def run(self) -> float:
+        """
+        Run the task.
+
+        :return: the elapsed time in seconds.
+        """
+        start = time.perf_counter()
+        sources = [(partition, reader()) for partition, reader in self.sources]
+        write_relation(self.relation_dir, self.relation, sources, self.prefixes)
+        return time.perf_counter() - start
+
+
+Task = Union[GenerationTask, StoreTask]
+
+
+def _run_task(task: Task) -> float:
+    return task.run()
+
+
+def run_tasks(tasks: List[Task], workers: int = 1) -> None:
+    """
+    Run the generation tasks, printing the progress and the time of each task.
+
+    :param tasks: the tasks.
+    :param workers: the number of worker processes; with one worker, the
+      tasks are run in the current process, in order.
+    """
+    start = time.perf_counter()
+    if workers <= 1:
+        for index, task in enumerate(tasks, start=1):
+            _print_progress(index, len(tasks), task, task.run())
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(_run_task, task): task for task in tasks}
+            for index, future in enumerate(as_completed(futures), start=1):
+                _print_progress(index, len(tasks), futures[future], future.result())
+    print(f"ran {len(tasks)} tasks in {time.perf_counter() - start:.2f}s")
+
+
+def _print_progress(index: int, total: int, task: Task, elapsed: float):
+    print(f"[{index}/{total}] {task.description}: {elapsed:.2f}s")
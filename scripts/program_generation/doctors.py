@@ -14,6 +14,7 @@ DOCTORS_DIR = ROOT_DIR / Path("third_party/original_programs/doctors")
 program_handler: Dict[ToolID, Callable] = {
     ToolID.VADALOG: process_program_for_vadalog,
     ToolID.DLV: process_program_for_dlv,
+    ToolID.NATIVE: process_program_for_vadalog,
 }
 
 partition_names = [
@@ -24,7 +25,21 @@ partition_names = [
 ]
 
 
-def generate_doctors(input_dir: Path, output_dir: Path, force: bool):
+def generate_doctors(
+    input_dir: Path,
+    output_dir: Path,
+    force: bool,
+    sliced: bool = True,
+    magic: bool = False,
+):
+    """
+    Generate the programs of the doctors queries, for each tool and partition.
+
+    The original programs have the rules of all the queries, with a single
+    output; if sliced is set, only the rules this output depends on are kept,
+    so that a run only evaluates its own query. If magic is set, they are
+    rewritten with magic sets, for goal-directed evaluation.
+    """
     # remove all previous programs
     for old_program_dir in output_dir.glob(input_dir.name + "-q*"):
         shutil.rmtree(old_program_dir, ignore_errors=True)
@@ -43,6 +58,8 @@ def generate_doctors(input_dir: Path, output_dir: Path, force: bool):
             )
             current_partition_output_dir.mkdir()
             for tool in ToolID:
-                output_content = program_handler[tool](program.read_text())
+                output_content = program_handler[tool](
+                    program.read_text(), sliced, magic
+                )
                 output_file = current_partition_output_dir / (tool.value + ".txt")
                 output_file.write_text(output_content)
@@ -1,6 +1,13 @@
 import re
+from itertools import islice
 from pathlib import Path
-from typing import List
+from typing import IO, Iterable, Iterator, List, Optional, Sequence
+
+# size of the chunks read, of the write buffers, and number of lines joined
+# before each write
+READ_CHUNK_SIZE = 1 << 20
+WRITE_BUFFER_SIZE = 1 << 20
+LINES_PER_CHUNK = 1 << 12
 
 
 def max_digits(dataset_partition_filenames):
@@ -44,10 +51,98 @@ def quote_csv_file(input_content: str) -> str:
     return "\n".join(map(quote_csv_line, input_content.splitlines(keepends=False)))
 
 
+def read_lines(input_file: Path) -> Iterator[str]:
+    """
+    Read the lines of a file lazily, without line terminators.
+
+    The lines are the same as the ones of str.splitlines(), but the file is
+    never loaded in memory.
+    """
+    with input_file.open(newline="") as f:
+        partial_line = ""
+        for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), ""):
+            data = partial_line + chunk
+            # a newline cannot be part of a longer line terminator, so the
+            # lines up to the last one are complete
+            cut = data.rfind("\n") + 1
+            partial_line = data[cut:]
+            yield from data[:cut].splitlines()
+        yield from partial_line.splitlines()
+
+
+def to_atoms(lines: Iterable[str], predicate_name: str) -> Iterator[str]:
+    """Transform CSV lines into facts, e.g. 'a,b' into 'p("a","b").'."""
+    for line in lines:
+        yield f"{predicate_name}(" + quote_csv_line(line) + ")."
+
+
+class LineWriter:
+    """
+    Write lines to a file through a buffer, in constant memory.
+
+    The lines are separated by a newline, without a trailing one; if a header
+    is given, it is written first, always followed by a newline. The text is
+    encoded in UTF-8, and the number of bytes written is tracked, so that the
+    file can be truncated to any number of lines.
+    """
+
+    def __init__(self, output_file: Path, header: Optional[str] = None) -> None:
+        self.output_file = output_file
+        self.header = header
+        self.bytes_written = 0
+        self._file: Optional[IO[bytes]] = None
+        self._nb_lines = 0
+
+    def __enter__(self) -> "LineWriter":
+        self._file = self.output_file.open("wb", buffering=WRITE_BUFFER_SIZE)
+        if self.header is not None:
+            self._write(self.header + "\n")
+        return self
+
+    def __exit__(self, *_) -> None:
+        self._file.close()
+
+    def _write(self, text: str) -> None:
+        data = text.encode("utf-8")
+        self._file.write(data)
+        self.bytes_written += len(data)
+
+    def write_all(
+        self, lines: Iterable[str], line_counts: Sequence[int] = ()
+    ) -> List[int]:
+        """
+        Write the lines, joining them in chunks to reduce the write calls.
+
+        :param lines: the lines.
+        :param line_counts: numbers of lines, in increasing order.
+        :return: for each number of lines n, the size in bytes of the file
+          made of the first n lines (or of all of them, if fewer).
+        """
+        lines = iter(lines)
+        offsets = []
+        pending_counts = list(line_counts)
+        while True:
+            chunk_size = LINES_PER_CHUNK
+            if pending_counts:
+                chunk_size = min(chunk_size, pending_counts[0] - self._nb_lines)
+            chunk = list(islice(lines, chunk_size))
+            if chunk:
+                if self._nb_lines > 0:
+                    self._write("\n")
+                self._write("\n".join(chunk))
+                self._nb_lines += len(chunk)
+            while pending_counts and (
+                pending_counts[0] <= self._nb_lines or len(chunk) < chunk_size
+            ):
+                offsets.append(self.bytes_written)
+                pending_counts.pop(0)
+            if len(chunk) < chunk_size:
+                return offsets
+
+
 def transform_dataset_file(input_file: Path, output_file: Path, predicate_name: str):
-    lines = input_file.read_text().splitlines(keepends=False)
-    atoms = map(lambda line: f"{predicate_name}(" + quote_csv_line(line) + ").", lines)
-    output_file.write_text("\n".join(atoms))
+    with LineWriter(output_file) as writer:
+        writer.write_all(to_atoms(read_lines(input_file), predicate_name))
 
 
 def normalize_name(file_name: str, min_digits: int):
@@ -57,36 +152,46 @@ def normalize_name(file_name: str, min_digits: int):
 
 
 def transform_dataset_file_with_header(
-    header: str, lines: List[str], output_file: Path, predicate_name: str
-):
-    atoms = map(lambda line: f"{predicate_name}(" + quote_csv_line(line) + ").", lines)
-    output_file.write_text((header + "\n" if header else "") + "\n".join(atoms))
-
-
-def write_lines_for_vadalog(header: str, lines: List[str], output_file: Path, *_):
-    output_file.write_text(header + "\n" + "\n".join(lines))
-
-
-def normalize(lines: List[str], nb_https: int):
+    header: str,
+    lines: Iterable[str],
+    output_file: Path,
+    predicate_name: str,
+    line_counts: Sequence[int] = (),
+) -> List[int]:
+    with LineWriter(output_file, header if header else None) as writer:
+        return writer.write_all(to_atoms(lines, predicate_name), line_counts)
+
+
+def write_lines_for_vadalog(
+    header: str,
+    lines: Iterable[str],
+    output_file: Path,
+    _predicate_name: str = "",
+    line_counts: Sequence[int] = (),
+) -> List[int]:
+    with LineWriter(output_file, header) as writer:
+        return writer.write_all(lines, line_counts)
+
+
+def normalize(lines: Iterable[str], nb_https: int) -> Iterator[str]:
     assert nb_https > 0
-    new_lines = []
+    pattern = re.compile(",".join(["(http.*)"] * nb_https))
     for line in lines:
-        match = re.search(",".join(["(http.*)"] * nb_https), line)
+        match = pattern.search(line)
         groups = [match.group(i + 1) for i in range(nb_https)]
         normalized_groups = [group.replace(",", "_") for group in groups]
-        new_line = ",".join(normalized_groups)
-        new_lines.append(new_line)
-    return new_lines
+        yield ",".join(normalized_groups)
 
 
-def normalize_person_dataset(lines: List[str]):
-    new_lines = []
+def normalize_person_dataset(lines: Iterable[str]) -> Iterator[str]:
+    pattern = re.compile("(.*),.*,.*,.*,.*")
     for line in lines:
-        match = re.search("(.*),.*,.*,.*,.*", line)
+        match = pattern.search(line)
         new_line = match.group(1)
-        new_lines.append(new_line.replace(",", "_"))
-    return new_lines
+        yield new_line.replace(",", "_")
 
 
 def get_nb_columns_from_csv(input_file: Path) -> int:
-    return len(input_file.read_text().split("\n", maxsplit=1)[0].split(","))
+    with input_file.open() as f:
+        first_line = f.readline().rstrip("\n")
+    return len(first_line.split(","))